@@ -0,0 +1,298 @@
+""" Load benchmark of the WSGI server modes.
+
+Every mode serves grin_wsgi.test_project in a child process,
+client processes hit it over loopback for a fixed time
+at each concurrency level. Results are printed as a table
+and written as JSON, e.g.::
+
+    python benchmarks/bench_servers.py --duration 5 --output bench.json
+    python benchmarks/bench_servers.py --modes eventloop prefork \
+        --concurrency 1 64 --path /hello/alex/page1
+"""
+import argparse
+import datetime
+import json
+import multiprocessing
+import os
+import platform
+import signal
+import socket
+import sys
+import threading
+import time
+
+from grin_wsgi import __version__
+from grin_wsgi.wsgi import make_server
+
+HOST = '127.0.0.1'
+CONNECT_TIMEOUT = 5
+RESPONSE_TIMEOUT = 10
+
+# make_server() arguments of every mode
+MODES = {
+    'simple': {},
+    'threading': {'threading': True},
+    'eventloop': {'eventloop': True},
+    'eventloop-executor': {'eventloop': True, 'executor_threads': 8},
+    'processing': {'multiprocessing': True},
+    'prefork': {'workers': os.cpu_count() or 1},
+    'wsgiref': {'wsgiref': True},
+}
+
+
+def serve(mode: str, port: int) -> None:
+    """ Run a server of the mode in a child process. """
+    from grin_wsgi.test_project import project
+
+    sys.stderr = open(os.devnull, 'w')  # wsgiref logs every request
+    signal.signal(signal.SIGTERM, lambda *args: sys.exit(0))
+    make_server(HOST, port, project, **MODES[mode]).serve_forever()
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind((HOST, 0))
+        return sock.getsockname()[1]
+
+
+def read_response(sock: socket.socket) -> bool:
+    """ Read a response, tell if the connection stays open. """
+    data = b''
+    while b'\r\n\r\n' not in data:
+        chunk = sock.recv(65536)
+        if not chunk:
+            raise ConnectionError('Connection closed')
+        data += chunk
+    head, _, body = data.partition(b'\r\n\r\n')
+    lines = head.decode('latin-1').split('\r\n')
+    headers = dict(
+        (name.strip().lower(), value.strip())
+        for name, _, value in (line.partition(':') for line in lines[1:])
+    )
+    if not lines[0].split(' ')[1].startswith('2'):
+        raise ConnectionError(lines[0])
+
+    length = headers.get('content-length')
+    if length is None:  # the body ends with the connection
+        while sock.recv(65536):
+            pass
+        return False
+    while len(body) < int(length):
+        chunk = sock.recv(65536)
+        if not chunk:
+            raise ConnectionError('Connection closed')
+        body += chunk
+    connection = headers.get('connection', '').lower()
+    if lines[0].startswith('HTTP/1.1'):
+        return connection != 'close'
+    return connection == 'keep-alive'
+
+
+def client_thread(
+    port: int,
+    path: str,
+    keep_alive: bool,
+    deadline: float,
+    latencies: list,
+    errors: list
+) -> None:
+    connection = '' if keep_alive else 'Connection: close\r\n'
+    request = (
+        f'GET {path} HTTP/1.1\r\nHost: {HOST}:{port}\r\n{connection}\r\n'
+    ).encode('latin-1')
+    sock = None
+    while time.monotonic() < deadline:
+        started = time.perf_counter()
+        try:
+            if sock is None:
+                sock = socket.create_connection(
+                    (HOST, port), timeout=CONNECT_TIMEOUT
+                )
+                sock.settimeout(RESPONSE_TIMEOUT)
+            sock.sendall(request)
+            if not read_response(sock):
+                sock.close()
+                sock = None
+            latencies.append(time.perf_counter() - started)
+        except OSError:
+            errors.append(1)
+            if sock is not None:
+                sock.close()
+                sock = None
+    if sock is not None:
+        sock.close()
+
+
+def client_process(
+    port: int,
+    path: str,
+    connections: int,
+    keep_alive: bool,
+    duration: float,
+    results: multiprocessing.Queue
+) -> None:
+    """ Run connections client threads, report their latencies. """
+    latencies, errors = [], []
+    deadline = time.monotonic() + duration
+    threads = [
+        threading.Thread(
+            target=client_thread,
+            args=(port, path, keep_alive, deadline, latencies, errors)
+        )
+        for _ in range(connections)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    results.put((latencies, len(errors)))
+
+
+def percentile(latencies: list, fraction: float) -> float:
+    if not latencies:
+        return 0.0
+    return latencies[round(fraction * (len(latencies) - 1))]
+
+
+def wait_for_server(port: int, path: str) -> None:
+    deadline = time.monotonic() + CONNECT_TIMEOUT
+    while True:
+        try:
+            with socket.create_connection((HOST, port), timeout=1) as sock:
+                sock.sendall(
+                    f'GET {path} HTTP/1.0\r\n\r\n'.encode('latin-1')
+                )
+                read_response(sock)
+                return
+        except OSError:
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.05)
+
+
+def run_load(
+    port: int,
+    path: str,
+    concurrency: int,
+    keep_alive: bool,
+    duration: float
+) -> dict:
+    processes_count = min(concurrency, os.cpu_count() or 1)
+    results = multiprocessing.Queue()
+    share, rest = divmod(concurrency, processes_count)
+    processes = [
+        multiprocessing.Process(target=client_process, args=(
+            port, path, share + (i < rest), keep_alive, duration, results
+        ))
+        for i in range(processes_count)
+    ]
+    for process in processes:
+        process.start()
+    latencies, errors = [], 0
+    for _ in processes:
+        process_latencies, process_errors = results.get()
+        latencies += process_latencies
+        errors += process_errors
+    for process in processes:
+        process.join()
+
+    latencies.sort()
+    return {
+        'concurrency': concurrency,
+        'path': path,
+        'keep_alive': keep_alive,
+        'duration': duration,
+        'requests': len(latencies),
+        'errors': errors,
+        'rps': round(len(latencies) / duration, 1),
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 3),
+        'p95_ms': round(percentile(latencies, 0.95) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 3),
+    }
+
+
+def benchmark(mode: str, args: argparse.Namespace) -> list:
+    port = free_port()
+    server = multiprocessing.Process(target=serve, args=(mode, port))
+    server.start()
+    try:
+        wait_for_server(port, args.path)
+        return [
+            dict(mode=mode, **run_load(
+                port, args.path, concurrency,
+                not args.close, args.duration
+            ))
+            for concurrency in args.concurrency
+        ]
+    finally:
+        server.terminate()
+        server.join()
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument(
+        '--modes', nargs='+', choices=MODES, default=list(MODES),
+        help='Server modes to benchmark.'
+    )
+    parser.add_argument(
+        '--concurrency', nargs='+', type=int, default=[1, 8, 32],
+        help='Numbers of concurrent client connections.'
+    )
+    parser.add_argument(
+        '--duration', type=float, default=3,
+        help='Seconds of load at every concurrency level.'
+    )
+    parser.add_argument(
+        '--path', default='/hello/alex/page1',
+        help='test_project url to request.'
+    )
+    parser.add_argument(
+        '--close', action='store_true',
+        help='Open a new connection for every request.'
+    )
+    parser.add_argument(
+        '--output',
+        help='JSON results file path, stdout if it is not given.'
+    )
+    return parser.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+    results = []
+    print(
+        f'{"mode":<20}{"conns":>6}{"req/s":>10}{"p50 ms":>9}'
+        f'{"p95 ms":>9}{"p99 ms":>9}{"errors":>8}',
+        file=sys.stderr
+    )
+    for mode in args.modes:
+        for result in benchmark(mode, args):
+            results.append(result)
+            print(
+                f'{mode:<20}{result["concurrency"]:>6}{result["rps"]:>10}'
+                f'{result["p50_ms"]:>9}{result["p95_ms"]:>9}'
+                f'{result["p99_ms"]:>9}{result["errors"]:>8}',
+                file=sys.stderr
+            )
+
+    report = {
+        'version': __version__,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'date': datetime.datetime.now(datetime.timezone.utc).isoformat(
+            timespec='seconds'
+        ),
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+
+if __name__ == '__main__':
+    main()
@@ -5,9 +5,36 @@ CHDIR = os.path.abspath('')
 
 HOST = 'localhost'
 PORT = 8051
+KEEPALIVE_TIMEOUT = 5
+HEADER_TIMEOUT = 10
+BODY_TIMEOUT = 30
+WRITE_TIMEOUT = 30
+MAX_REQUESTS = 100
+MAX_HEADER_SIZE = 65536
+MAX_BODY_SIZE = 0
+BODY_SPOOL_SIZE = 1048576
 THREADING = False
 PROCESSING = False
 WSGIREF = False
+THREADS = 8
+QUEUE_SIZE = 64
+EVENTLOOP = False
+EXECUTOR_THREADS = 0
+WORKERS = 0
+REUSE_PORT = False
+REVERSE_LOOKUP = True
+HOST_LOOKUP_TTL = 0
+COMPRESSION = False
+METRICS_PATH = ''
+PROFILE_DIR = ''
+PROFILE_SAMPLE_RATE = 0.0
+PROFILE_SLOW_THRESHOLD = 0.0
+PROFILE_PATH = ''
+ACCESS_LOG = ''
+ACCESS_LOG_SAMPLE_RATE = 1.0
+ACCESS_LOG_DUMPS = 0
+GRACEFUL_TIMEOUT = 30
+ASYNC_CONCURRENCY = 100
 
 TEST_FRAMEWORK = True
 TEST_FRAMEWORK_MODULE = 'grin_wsgi.test_project'
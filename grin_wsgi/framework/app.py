@@ -1,13 +1,24 @@
+import asyncio
+import functools
+import inspect
 import typing
 
-from sys import exc_info
 from traceback import format_tb
 
 from .http import HttpRequest, \
     HttpResponseServerError, HttpMethodNotAllowed, \
     HttpResponseRedirect, HttpResponseNotFound, \
+    HttpResponseBadRequest, HttpResponsePayloadTooLarge, \
     HTTP_METHODS
-from .urls import UrlRouter
+from . import exceptions as framework_exceptions
+from .urls import UrlRouter, RouteCache
+from .cache import CachedView, ResponseCache
+
+# environ key a server reads to label the request metrics by route
+ROUTE_ENVIRON_KEY = 'grin_wsgi.route'
+# environ keys of the server running the coroutines of async views
+ASYNC_RUNNER_ENVIRON_KEY = 'grin_wsgi.async_runner'
+PENDING_ENVIRON_KEY = 'grin_wsgi.pending'
 
 
 class App:
@@ -15,10 +26,12 @@ class App:
     def __init__(
         self,
         name: typing.Optional[str]='GrinApp',
-        url_prefix: typing.Optional[str]=''
+        url_prefix: typing.Optional[str]='',
+        route_cache: typing.Optional[RouteCache]=None
     ) -> None:
         self._name = name
         self._url_router = UrlRouter(url_prefix)
+        self._route_cache = route_cache
 
     @property
     def name(self) -> str:
@@ -31,14 +44,44 @@ class App:
     def route(
         self,
         url_pattern: str,
-        required_methods: typing.Optional=None
+        required_methods: typing.Optional=None,
+        cache_ttl: typing.Optional[float]=None,
+        cache_vary: typing.Optional[typing.Iterable[str]]=()
     ) -> typing.Callable:
+        """ Register a view for the url pattern.
+
+        With cache_ttl responses of the view are served from
+        the Project response cache for cache_ttl seconds,
+        cache_vary names the request headers they depend on.
+
+        A view may be an ``async def`` one, it is awaited on
+        the event loop of the server process.
+        """
         if required_methods is None:
             required_methods = HTTP_METHODS
 
         def view_decorator(view):
-            self._url_router.append(url_pattern, view)
+            if cache_ttl:
+                self._url_router.append(
+                    url_pattern, CachedView(view, cache_ttl, cache_vary)
+                )
+            else:
+                self._url_router.append(url_pattern, view)
+            if self._route_cache is not None:
+                self._route_cache.clear()
 
+            # Wrappers keep the view name, it labels the route metrics
+            if inspect.iscoroutinefunction(view):
+                @functools.wraps(view)
+                async def async_view_wrapper(request, *args, **kwargs):
+                    if request.method not in required_methods:
+                        return HttpMethodNotAllowed(
+                            f'Sorry, method {request.method} is not allowed'
+                        )
+                    return await view(request, *args, **kwargs)
+                return async_view_wrapper
+
+            @functools.wraps(view)
             def view_wrapper(request, *args, **kwargs):
                 if request.method not in required_methods:
                     return HttpMethodNotAllowed(
@@ -50,9 +93,46 @@ class App:
 
 
 class Project:
+    """ Registry of the Apps served together.
+
+    App url prefixes are indexed when an app is registered:
+    a url is dispatched to the app with the longest prefix
+    matching its leading path segments (``api/v1`` for
+    ``api/v1/users``), or to the apps without a prefix.
 
-    def __init__(self) -> None:
+    Resolved urls, including not found ones, are kept in
+    an LRU cache of route_cache_size entries (0 disables it).
+
+    Responses of the views routed with cache_ttl are kept in
+    a response cache of response_cache_size entries and
+    response_cache_bytes body bytes. A cached response has an ETag
+    and a Last-Modified header, a conditional GET matching them
+    is answered with 304 Not Modified.
+
+    The name of the view a request is dispatched to is set in
+    the environ, so the server metrics are labelled by route.
+
+    dispatch() returns a coroutine for an async view. It is run
+    by the async runner of the server if the environ has one:
+    the response body waits for it and the future is set in
+    the environ, so an event loop server sends the response
+    once it is done. Otherwise it is run with asyncio.run().
+    """
+
+    def __init__(
+        self,
+        route_cache_size: typing.Optional[int]=1024,
+        response_cache_size: typing.Optional[int]=1024,
+        response_cache_bytes: typing.Optional[int]=33554432
+    ) -> None:
         self._dispatcher = {}
+        self._route_cache = RouteCache(route_cache_size)
+        self._response_cache = ResponseCache(
+            response_cache_size, response_cache_bytes
+        )
+        self._prefix_index = {}  # {url prefix: UrlRouter}
+        self._prefix_depth = 0  # most segments in a prefix
+        self._root_routers = []
 
     def __contains__(
         self,
@@ -60,43 +140,128 @@ class Project:
     ) -> bool:
         return app.name in self._dispatcher
 
+    @property
+    def route_cache(self) -> RouteCache:
+        return self._route_cache
+
+    @property
+    def response_cache(self) -> ResponseCache:
+        return self._response_cache
+
     def register_app(self, *args, **kwargs) -> App:
-        app = App(*args, **kwargs)
-        if app not in self:
-            self._dispatcher[app.name] = app.url_router
-            return app
-        app_name = app.name
-        del app
-        raise Exception(f'App {app_name} has already been registered')
+        app = App(*args, route_cache=self._route_cache, **kwargs)
+        url_prefix = app.url_router.url_prefix.strip('/')
+        if app in self:
+            app_name = app.name
+            del app
+            raise Exception(f'App {app_name} has already been registered')
+        if url_prefix in self._prefix_index:
+            del app
+            raise Exception(f'Url prefix {url_prefix} is already in use')
+
+        self._dispatcher[app.name] = app.url_router
+        if url_prefix:
+            self._prefix_index[url_prefix] = app.url_router
+            self._prefix_depth = max(
+                self._prefix_depth, url_prefix.count('/') + 1
+            )
+        else:
+            self._root_routers.append(app.url_router)
+        self._route_cache.clear()
+        return app
+
+    def _routers(
+        self,
+        url: str
+    ) -> typing.List[UrlRouter]:
+        """ Routers the url may be dispatched to. """
+        if self._prefix_depth:
+            segments = url.split('/', self._prefix_depth)
+            for depth in range(min(len(segments), self._prefix_depth), 0, -1):
+                router = self._prefix_index.get('/'.join(segments[:depth]))
+                if router is not None:
+                    return [router]
+        return self._root_routers
+
+    def resolve(
+        self,
+        url: str
+    ) -> typing.Tuple[typing.Optional[typing.Callable], typing.Dict, bool]:
+        resolved = self._route_cache.get(url)
+        if resolved is None:
+            resolved = None, {}, False
+            for router in self._routers(url):
+                resolved = router.resolve(url)
+                if resolved[0] is not None or resolved[2]:
+                    break
+            self._route_cache.set(url, resolved)
+        return resolved
 
     def dispatch(
         self,
         url: str,
         request: HttpRequest
     ) -> typing.Any:
-        try:
-            url_prefix = url.split('/')[0]
-        except IndexError:
-            url_prefix = ''
-
-        routers = [
-            router for router in self._dispatcher.values() if
-            router.url_prefix == url_prefix
-        ]
-        if len(routers) != 1:
-            routers = (
-                router for router in self._dispatcher.values() if
-                router.url_prefix == ''
+        view, view_kwargs, redirect = self.resolve(url)
+        if request is not None:
+            request.environ[ROUTE_ENVIRON_KEY] = _route_name(view, redirect)
+        if redirect:
+            # Redirect to the prime resource
+            return HttpResponseRedirect(f'{url}/')
+        if view is None:
+            return HttpResponseNotFound()
+        if isinstance(view, CachedView) and request is not None and \
+                request.method in ('GET', 'HEAD'):
+            return self._dispatch_cached(url, request, view, view_kwargs)
+        return view(request, **view_kwargs)
+
+    def _dispatch_cached(
+        self,
+        url: str,
+        request: HttpRequest,
+        view: CachedView,
+        view_kwargs: typing.Dict[str, typing.Any]
+    ) -> typing.Any:
+        """ Serve a cached response, the view is called on a miss. """
+        key = self._response_cache.key(request, url, view)
+        cached = self._response_cache.get(key)
+        if cached is None:
+            response = view(request, **view_kwargs)
+            if inspect.isawaitable(response):
+                return self._cache_awaited(key, request, view, response)
+            cached = self._response_cache.set(
+                key, response, view.ttl, view.vary_header
             )
+            if cached is None:
+                return response
+        return self._conditional(request, cached)
 
-        for router in routers:
-            view, redirect = router.dispatch(url)
-            if redirect:
-                # Redirect to the prime resource
-                return HttpResponseRedirect(f'{url}/')
-            if view is not None:
-                return view(request)
-        return HttpResponseNotFound()
+    async def _cache_awaited(
+        self,
+        key: typing.Tuple,
+        request: HttpRequest,
+        view: CachedView,
+        response: typing.Awaitable
+    ) -> typing.Any:
+        response = await response
+        cached = self._response_cache.set(
+            key, response, view.ttl, view.vary_header
+        )
+        if cached is None:
+            return response
+        return self._conditional(request, cached)
+
+    @staticmethod
+    def _conditional(
+        request: HttpRequest,
+        cached: typing.Any
+    ) -> typing.Any:
+        headers = request.headers
+        if cached.not_modified(
+            headers.get('if-none-match'), headers.get('if-modified-since')
+        ):
+            return cached.not_modified_response()
+        return cached
 
     def __call__(
         self,
@@ -107,12 +272,59 @@ class Project:
             request = HttpRequest(environ)
             url = request.path_info.lstrip('/')
             response = self.dispatch(url, request)
-        except Exception:
-            e_type, e_value, tb = exc_info()
-            traceback = ['Traceback (most recent call last):']
-            traceback += format_tb(tb)
-            traceback.append(f'{e_type.__name__}: {e_value}')
-            response = HttpResponseServerError('\n'.join(traceback))
+            if inspect.isawaitable(response):
+                runner = environ.get(ASYNC_RUNNER_ENVIRON_KEY)
+                if runner is not None:
+                    future = runner.submit(response)
+                    environ[PENDING_ENVIRON_KEY] = future
+                    return self._awaited_body(future, start_response)
+                response = asyncio.run(response)
+        except framework_exceptions.RequestInputError:
+            raise  # answered by the server, e.g. with 408 Request Timeout
+        except Exception as e:
+            response = _exception_response(e)
 
         start_response(response.status, response.headers)
         return [response.body]
+
+    @staticmethod
+    def _awaited_body(
+        future: typing.Any,
+        start_response: typing.Callable
+    ) -> typing.Iterator[bytes]:
+        """ Body of an async view response, WSGI allows
+        start_response() to be called once it is iterated.
+        """
+        try:
+            response = future.result()
+        except framework_exceptions.RequestInputError:
+            raise
+        except Exception as e:
+            response = _exception_response(e)
+        start_response(response.status, response.headers)
+        yield response.body
+
+
+def _exception_response(e: Exception) -> typing.Any:
+    if isinstance(e, framework_exceptions.RequestDataTooLarge):
+        return HttpResponsePayloadTooLarge(f'Sorry, {e}')
+    if isinstance(e, framework_exceptions.MultipartError):
+        return HttpResponseBadRequest(f'Sorry, {e}')
+    traceback = ['Traceback (most recent call last):']
+    traceback += format_tb(e.__traceback__)
+    traceback.append(f'{type(e).__name__}: {e}')
+    return HttpResponseServerError('\n'.join(traceback))
+
+
+def _route_name(
+    view: typing.Optional[typing.Callable],
+    redirect: bool
+) -> str:
+    """ Bounded metrics label of a dispatched request. """
+    if redirect:
+        return 'redirect'
+    if view is None:
+        return 'not_found'
+    if isinstance(view, CachedView):
+        view = view.view
+    return getattr(view, '__qualname__', type(view).__name__)
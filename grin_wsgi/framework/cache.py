@@ -0,0 +1,246 @@
+import collections
+import hashlib
+import threading
+import time
+import typing
+
+from email.utils import formatdate, parsedate_to_datetime
+
+from .urls import CacheInfo
+
+# Codings a compression middleware appends to an ETag, e.g. "abc-gzip"
+ETAG_CODINGS = ('-br"', '-gzip"', '-deflate"')
+
+
+class CachedView:
+    """ A view whose responses are kept in the Project response cache.
+
+    ttl
+        seconds a response is served from the cache
+
+    vary
+        request headers, e.g. ('Accept-Language',), whose values
+        select different responses of the same url, they are
+        named in the Vary header of the responses
+    """
+
+    __slots__ = ('view', 'ttl', 'vary', 'vary_header')
+
+    def __init__(
+        self,
+        view: typing.Callable,
+        ttl: float,
+        vary: typing.Optional[typing.Iterable[str]]=()
+    ) -> None:
+        vary = tuple(vary)
+        self.view = view
+        self.ttl = ttl
+        self.vary = tuple(header.lower() for header in vary)
+        self.vary_header = ', '.join(vary)
+
+    def __call__(self, request: typing.Any, *args, **kwargs) -> typing.Any:
+        return self.view(request, *args, **kwargs)
+
+
+class CachedResponse:
+    """ A response kept in the cache with its validators. """
+
+    __slots__ = (
+        'status', 'headers', 'body', 'etag', 'last_modified', 'expires'
+    )
+
+    def __init__(
+        self,
+        response: typing.Any,
+        ttl: float,
+        vary: typing.Optional[str]=''
+    ) -> None:
+        now = time.time()
+        headers = list(response.headers)
+        header_names = {name.lower() for name, _ in headers}
+        if vary:
+            headers = _vary(headers, vary)
+        if 'etag' not in header_names:
+            digest = hashlib.blake2b(response.body, digest_size=12)
+            headers.append(('ETag', f'"{digest.hexdigest()}"'))
+        if 'last-modified' not in header_names:
+            headers.append(('Last-Modified', formatdate(now, usegmt=True)))
+
+        self.status = response.status
+        self.headers = headers
+        self.body = response.body
+        self.etag = _header(headers, 'etag')
+        self.last_modified = _parse_date(_header(headers, 'last-modified'))
+        self.expires = time.monotonic() + ttl
+
+    def not_modified(
+        self,
+        if_none_match: typing.Optional[str],
+        if_modified_since: typing.Optional[str]
+    ) -> bool:
+        """ Do the request validators match the cached response. """
+        if if_none_match:
+            return any(
+                tag == '*' or _strip_etag(tag) == _strip_etag(self.etag)
+                for tag in if_none_match.split(',')
+            )
+        if if_modified_since and self.last_modified is not None:
+            since = _parse_date(if_modified_since)
+            return since is not None and self.last_modified <= since
+        return False
+
+    def not_modified_response(self) -> 'NotModified':
+        """ 304 with the validators and the Vary header of the 200. """
+        return NotModified([
+            (name, value) for name, value in self.headers
+            if name.lower() not in ('content-length', 'content-type')
+        ])
+
+
+class NotModified:
+    """ 304 Response without a body. """
+
+    __slots__ = ('status', 'headers', 'body')
+
+    def __init__(
+        self,
+        headers: typing.List[typing.Tuple[str, str]]
+    ) -> None:
+        self.status = '304 NOT MODIFIED'
+        self.headers = headers
+        self.body = b''
+
+
+class ResponseCache:
+    """ Bounded LRU cache of view responses.
+
+    At most maxsize responses of max_bytes body bytes in total
+    are kept, each one for the ttl of its view.
+    Only 200 responses to GET and HEAD requests are cached.
+    """
+
+    def __init__(
+        self,
+        maxsize: typing.Optional[int]=1024,
+        max_bytes: typing.Optional[int]=33554432
+    ) -> None:
+        self.maxsize = maxsize
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._responses = collections.OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._responses)
+
+    @staticmethod
+    def key(
+        request: typing.Any,
+        url: str,
+        view: CachedView
+    ) -> typing.Tuple:
+        headers = request.headers
+        return (url, request.query_string) + tuple(
+            headers.get(header, '') for header in view.vary
+        )
+
+    def get(self, key: typing.Tuple) -> typing.Optional[CachedResponse]:
+        with self._lock:
+            response = self._responses.get(key)
+            if response is None or response.expires <= time.monotonic():
+                if response is not None:
+                    self._remove(key)
+                self.misses += 1
+                return None
+            self._responses.move_to_end(key)
+            self.hits += 1
+            return response
+
+    def set(
+        self,
+        key: typing.Tuple,
+        response: typing.Any,
+        ttl: float,
+        vary: typing.Optional[str]=''
+    ) -> typing.Optional[CachedResponse]:
+        """ Cache a response, returns None if it can not be cached.
+
+        vary is the Vary header value the response is sent with.
+        """
+        if not self.maxsize or not response.status.startswith('200') or \
+                len(response.body) > self.max_bytes:
+            return None
+        cached = CachedResponse(response, ttl, vary)
+        with self._lock:
+            if key in self._responses:
+                self._remove(key)
+            self._responses[key] = cached
+            self._bytes += len(cached.body)
+            while len(self._responses) > self.maxsize or \
+                    self._bytes > self.max_bytes:
+                self._remove(next(iter(self._responses)))
+        return cached
+
+    def _remove(self, key: typing.Tuple) -> None:
+        self._bytes -= len(self._responses.pop(key).body)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._responses.clear()
+            self._bytes = 0
+
+    def info(self) -> CacheInfo:
+        return CacheInfo(self.hits, self.misses, self.maxsize, len(self))
+
+
+def _header(
+    headers: typing.List[typing.Tuple[str, str]],
+    name: str
+) -> typing.Optional[str]:
+    for header_name, value in headers:
+        if header_name.lower() == name:
+            return value
+    return None
+
+
+def _vary(
+    headers: typing.List[typing.Tuple[str, str]],
+    vary: str
+) -> typing.List[typing.Tuple[str, str]]:
+    """ Add the request headers a response depends on to its Vary. """
+    value = _header(headers, 'vary')
+    if value is None:
+        return headers + [('Vary', vary)]
+    if value.strip() == '*':
+        return headers
+    present = {name.strip().lower() for name in value.split(',')}
+    missing = [
+        name for name in vary.split(', ') if name.lower() not in present
+    ]
+    if not missing:
+        return headers
+    value = ', '.join([value] + missing)
+    return [
+        (name, value if name.lower() == 'vary' else header_value)
+        for name, header_value in headers
+    ]
+
+
+def _parse_date(value: typing.Optional[str]) -> typing.Optional[float]:
+    try:
+        return parsedate_to_datetime(value).timestamp()
+    except (TypeError, ValueError):
+        return None
+
+
+def _strip_etag(tag: str) -> str:
+    """ Weak comparison, an encoded representation matches as well. """
+    tag = tag.strip()
+    if tag.startswith('W/'):
+        tag = tag[2:]
+    for coding in ETAG_CODINGS:
+        if tag.endswith(coding):
+            return tag[:-len(coding)] + '"'
+    return tag
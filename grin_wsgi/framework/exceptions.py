@@ -0,0 +1,12 @@
+class MultipartError(Exception):
+    """ Malformed multipart/form-data request body """
+
+
+class RequestDataTooLarge(MultipartError):
+    """ Form field, file or the whole form is over the size limit """
+
+
+class RequestInputError(Exception):
+    """ Request body could not be read, e.g. the client is too slow.
+    The server answers it, so it is not rendered as a server error.
+    """
@@ -1,13 +1,16 @@
 import typing
-import collections
+
+from urllib.parse import unquote_plus
+
+from .multipart import MultipartParser
+from . import exceptions as framework_exceptions
 
 
-StringIO = typing.TypeVar('StringIO')
 HTTP_METHODS = {'GET', 'POST', 'PUT', 'UPDATE'}
 
 
-class QueryDict(collections.UserDict):
-    """ A specialized UserDict which represents a query string.
+class QueryDict(dict):
+    """ A multi-value dictionary which represents a query string.
 
     A QueryDict can be used to represent GET or POST data.
 
@@ -17,82 +20,201 @@ class QueryDict(collections.UserDict):
 
     """
 
+    __slots__ = ()
+
+    @classmethod
+    def parse(cls, query_string: str) -> 'QueryDict':
+        """ a=1&b=x%20y&a=2 -> {'a': ['1', '2'], 'b': ['x y']} """
+        query_dict = cls()
+        for key_value_pair in query_string.split('&'):
+            key, equals, value = key_value_pair.partition('=')
+            if not equals:
+                # key_value_pair does not exist (index url)
+                continue
+            key = _unquote(key)
+            value = _unquote(value)
+            values = dict.get(query_dict, key)
+            if values is None:
+                query_dict[key] = [value]
+            else:
+                values.append(value)
+        return query_dict
+
     def get(
         self,
         key: typing.Any,
         default: typing.Optional[typing.Any]=None
     ) -> typing.Any:
-        try:
-            value = self[key]
-            if isinstance(value, list) and len(value) == 1:
-                return value[0]
-            return value
-        except KeyError:
+        value = dict.get(self, key)
+        if value is None:
             return default
+        if len(value) == 1:
+            return value[0]
+        return value
 
+    def getlist(self, key: typing.Any) -> typing.List[str]:
+        return dict.get(self, key, [])
 
-class HttpRequest:
-    """ A basic HTTP Request.
 
-    QueryDict is generating from a WSGI environ dictionary
-    """
+def _unquote(text: str) -> str:
+    """ Percent-decode text, most of it needs no decoding. """
+    if '%' in text or '+' in text:
+        return unquote_plus(text)
+    return text
 
-    def __init__(
-        self,
-        environ: typing.Dict[str, typing.Any]
-    ) -> None:
-        for k, v in environ.items():
-            if 'wsgi.' not in k:  # exclude wsgi env variables
-                setattr(self, k.lower(), v)
 
-        self.data = self._get_request_data(environ['wsgi.input'])
+class RequestInput:
+    """ wsgi.input whose read errors are RequestInputError. """
 
-    def _get_request_data(
-        self,
-        wsgi_input: StringIO
-    ) -> QueryDict:
+    __slots__ = ('stream',)
+
+    def __init__(self, stream: typing.Any) -> None:
+        self.stream = stream
+
+    def read(self, size: typing.Optional[int]=-1) -> bytes:
         try:
-            request_body_size = int(self.content_length)
-        except (AttributeError, ValueError):
-            request_body_size = 0
+            return self.stream.read(size)
+        except Exception as e:
+            raise framework_exceptions.RequestInputError(e) from e
 
-        request_body = self.query_string if self.method == 'GET' else \
-            wsgi_input.read(request_body_size)
 
-        return self._parse_request_query_string(str(request_body))
+class HttpRequest:
+    """ A basic HTTP Request.
 
-    def _parse_request_query_string(
-        self,
-        query_string: str
-    ) -> QueryDict:
-        request_dict = QueryDict()
-        for k, v in self._request_query_string_as_list_of_tuples(query_string):
-            if k in request_dict:
-                request_dict[k].extend(v)
-            else:
-                request_dict[k] = v
+    Request attributes are read from a WSGI environ dictionary
+    and parsed only when a view uses them, e.g. a view which
+    never uses request.data does not read the request body.
+    Other environ variables are available as lowercased
+    attributes, e.g. request.server_name.
+
+    A multipart/form-data body is parsed as it is read,
+    uploaded files are kept in request.files. The limits
+    of a form are set with the MAX_FIELD_SIZE, MAX_FILE_SIZE
+    and MAX_DATA_SIZE class attributes, 0 means no limit.
+    """
+
+    __slots__ = ('environ', '_args', '_data', '_files', '_headers')
 
-        return request_dict
+    MAX_FIELD_SIZE = 1048576
+    MAX_FILE_SIZE = 0
+    MAX_DATA_SIZE = 0
 
-    # TODO: realize unquote() -> '%20' = ' '
-    def _request_query_string_as_list_of_tuples(
+    def __init__(
         self,
-        query_string: str
-    ) -> typing.List[typing.Tuple[str, typing.List[str]]]:
-        key_value_pairs = []
-
-        request_string_key_value_pairs = query_string.split('&')
-        for key_value_pair in request_string_key_value_pairs:
-            try:
-                key, value_set = key_value_pair.split('=')
-                key_value_pairs.append((key,
-                                        value_set.replace('+', ' ').split(';')
-                                        ))
-            except ValueError:
-                # key_value_pair does not exist (index url)
-                pass
+        environ: typing.Dict[str, typing.Any]
+    ) -> None:
+        self.environ = environ
+        self._args = None
+        self._data = None
+        self._files = None
+        self._headers = None
+
+    def __getattr__(self, name: str) -> typing.Any:
+        if name == 'environ' or name.startswith('_'):
+            raise AttributeError(name)
+        try:
+            return self.environ[name.upper()]
+        except KeyError:
+            raise AttributeError(name) from None
+
+    @property
+    def method(self) -> str:
+        return self.environ.get('REQUEST_METHOD', 'GET')
+
+    @property
+    def path_info(self) -> str:
+        return self.environ.get('PATH_INFO', '')
+
+    @property
+    def query_string(self) -> str:
+        return self.environ.get('QUERY_STRING', '')
+
+    @property
+    def content_type(self) -> str:
+        return self.environ.get('CONTENT_TYPE', '')
+
+    @property
+    def content_length(self) -> str:
+        return self.environ.get('CONTENT_LENGTH', '')
+
+    @property
+    def headers(self) -> typing.Dict[str, str]:
+        """ Request headers with lowercased names. """
+        if self._headers is None:
+            self._headers = {
+                key[5:].replace('_', '-').lower(): value
+                for key, value in self.environ.items()
+                if key.startswith('HTTP_')
+            }
+            if self.content_type:
+                self._headers['content-type'] = self.content_type
+            if self.content_length:
+                self._headers['content-length'] = self.content_length
+        return self._headers
+
+    @property
+    def args(self) -> QueryDict:
+        """ Query string arguments. """
+        if self._args is None:
+            self._args = QueryDict.parse(self.query_string)
+        return self._args
+
+    @property
+    def data(self) -> QueryDict:
+        """ Query string arguments of a GET request,
+        form fields of the others.
+        """
+        if self._data is None:
+            if self.method == 'GET':
+                self._data = self.args
+            elif self.content_type.startswith('multipart/form-data'):
+                self._parse_multipart()
+            else:
+                self._data = QueryDict.parse(
+                    self._read_body().decode('utf-8')
+                )
+        return self._data
+
+    @property
+    def files(self) -> QueryDict:
+        """ UploadedFiles of a multipart/form-data request. """
+        if self._files is None:
+            if self.method != 'GET' and \
+                    self.content_type.startswith('multipart/form-data'):
+                self._parse_multipart()
+            else:
+                self._files = QueryDict()
+        return self._files
+
+    @property
+    def input(self) -> RequestInput:
+        return RequestInput(self.environ['wsgi.input'])
+
+    def _parse_multipart(self) -> None:
+        self._data = QueryDict()
+        self._files = QueryDict()
+        parser = MultipartParser.from_content_type(
+            self.input, self.content_type,
+            max_field_size=self.MAX_FIELD_SIZE,
+            max_file_size=self.MAX_FILE_SIZE,
+            max_data_size=self.MAX_DATA_SIZE
+        )
+        for part in parser:
+            if isinstance(part, tuple):
+                name, value = part
+                self._data.setdefault(name, []).append(value)
+            else:
+                self._files.setdefault(part.name, []).append(part)
 
-        return key_value_pairs
+    def _read_body(self) -> bytes:
+        wsgi_input = self.input
+        try:
+            return wsgi_input.read(int(self.content_length))
+        except ValueError:
+            # A chunked body is read until the end of the input
+            if self.environ.get('wsgi.input_terminated'):
+                return wsgi_input.read()
+            return b''
 
 
 class HttpResponse:
@@ -107,11 +229,11 @@ class HttpResponse:
         charset: typing.Optional[str]='utf-8'
     ) -> None:
         self.status = '{} {}'.format(status, reason)
+        self.body = content.encode(charset)
         self.headers = [
             ('Content-Type', content_type),
-            ('Content-Length', str(len(content)))
+            ('Content-Length', str(len(self.body)))
         ]
-        self.body = content.encode(charset)
 
 
 class HttpResponseRedirect(HttpResponse):
@@ -131,6 +253,34 @@ class HttpResponseRedirect(HttpResponse):
         self.headers.append(('Location', redirect_url))
 
 
+class HttpResponseBadRequest(HttpResponse):
+    """ 400 Response """
+
+    def __init__(
+        self,
+        content: typing.Optional[str]='Sorry, Bad Request',
+        content_type: typing.Optional[str]='text/plain',
+        status: typing.Optional[int]=400,
+        reason: typing.Optional[str]='BAD REQUEST',
+        charset: typing.Optional[str]='utf-8'
+    ) -> None:
+        super().__init__(content, content_type, status, reason, charset)
+
+
+class HttpResponsePayloadTooLarge(HttpResponse):
+    """ 413 Response """
+
+    def __init__(
+        self,
+        content: typing.Optional[str]='Sorry, Payload Too Large',
+        content_type: typing.Optional[str]='text/plain',
+        status: typing.Optional[int]=413,
+        reason: typing.Optional[str]='PAYLOAD TOO LARGE',
+        charset: typing.Optional[str]='utf-8'
+    ) -> None:
+        super().__init__(content, content_type, status, reason, charset)
+
+
 class HttpResponseNotFound(HttpResponse):
     """ 404 Response """
 
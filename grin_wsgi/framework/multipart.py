@@ -0,0 +1,233 @@
+import re
+import tempfile
+import typing
+
+from . import exceptions as framework_exceptions
+
+
+# name="value" or name=value parameters of a header, e.g. Content-Type
+HEADER_PARAM_PATTERN = re.compile(
+    r';\s*([\w-]+)\s*=\s*(?:"((?:[^"\\]|\\.)*)"|([^;\s]*))'
+)
+
+
+def header_params(header: str) -> typing.Dict[str, str]:
+    """
+    Example: form-data; name="upload"; filename="a.txt"
+        -> {'name': 'upload', 'filename': 'a.txt'}
+    """
+    return {
+        name.lower(): quoted.replace('\\"', '"') if token == '' else token
+        for name, quoted, token in HEADER_PARAM_PATTERN.findall(header)
+    }
+
+
+class UploadedFile:
+    """ A file part of a multipart/form-data request.
+
+    name
+        form field name
+
+    filename
+        file name sent by the client
+
+    content_type
+        Content-Type of the part
+
+    file
+        temporary file holding the content, a small one
+        is kept in memory
+
+    size
+        content size in bytes
+    """
+
+    __slots__ = ('name', 'filename', 'content_type', 'file', 'size')
+
+    def __init__(
+        self,
+        name: str,
+        filename: str,
+        content_type: str,
+        file: typing.BinaryIO,
+        size: int
+    ) -> None:
+        self.name = name
+        self.filename = filename
+        self.content_type = content_type
+        self.file = file
+        self.size = size
+
+    def __repr__(self) -> str:
+        return f'<UploadedFile {self.name} {self.filename} {self.size}>'
+
+    def read(self, size: typing.Optional[int]=-1) -> bytes:
+        return self.file.read(size)
+
+    def close(self) -> None:
+        self.file.close()
+
+
+class MultipartParser:
+    """ Streaming multipart/form-data parser.
+
+    Parts are read from a stream by blocks and yielded
+    one by one as they are complete: a field as a (name, value)
+    tuple and a file as an UploadedFile. Field values are kept
+    in memory, file contents are written to temporary files,
+    so the whole body is never held in memory.
+
+    max_field_size
+        field value size limit
+
+    max_file_size
+        file size limit, 0 means no limit
+
+    max_data_size
+        size limit of the whole body, 0 means no limit
+
+    file_spool_size
+        size of a file kept in memory
+    """
+
+    BLOCK_SIZE = 65536
+    MAX_HEADER_SIZE = 16384
+
+    def __init__(
+        self,
+        stream: typing.BinaryIO,
+        boundary: str,
+        max_field_size: typing.Optional[int]=1048576,
+        max_file_size: typing.Optional[int]=0,
+        max_data_size: typing.Optional[int]=0,
+        file_spool_size: typing.Optional[int]=65536
+    ) -> None:
+        if not boundary or len(boundary) > 70:
+            raise framework_exceptions.MultipartError('Invalid boundary')
+        self._stream = stream
+        self._delimiter = b'--' + boundary.encode('latin-1')
+        self._max_field_size = max_field_size
+        self._max_file_size = max_file_size
+        self._max_data_size = max_data_size
+        self._file_spool_size = file_spool_size
+        self._buffer = bytearray()
+        self._received = 0
+        self._eof = False
+
+    @classmethod
+    def from_content_type(
+        cls,
+        stream: typing.BinaryIO,
+        content_type: str,
+        **limits: typing.Any
+    ) -> 'MultipartParser':
+        boundary = header_params(content_type).get('boundary', '')
+        return cls(stream, boundary, **limits)
+
+    def __iter__(
+        self
+    ) -> typing.Iterator[typing.Union[typing.Tuple[str, str], UploadedFile]]:
+        # Skip the preamble up to the first delimiter
+        while self._buffer.find(self._delimiter) < 0:
+            del self._buffer[:-len(self._delimiter)]
+            self._fill()
+        start = self._buffer.find(self._delimiter) + len(self._delimiter)
+        del self._buffer[:start]
+
+        part_end = b'\r\n' + self._delimiter
+        while True:
+            while len(self._buffer) < 2:
+                self._fill()
+            if self._buffer.startswith(b'--'):
+                return  # the close delimiter, the epilogue is ignored
+            if not self._buffer.startswith(b'\r\n'):
+                raise framework_exceptions.MultipartError(
+                    'Malformed delimiter'
+                )
+            del self._buffer[:2]
+            yield self._read_part(self._read_headers(), part_end)
+
+    def _fill(self) -> None:
+        if self._eof:
+            raise framework_exceptions.MultipartError(
+                'Unexpected end of multipart data'
+            )
+        data = self._stream.read(self.BLOCK_SIZE)
+        if not data:
+            self._eof = True
+            return
+        self._received += len(data)
+        if self._max_data_size and self._received > self._max_data_size:
+            raise framework_exceptions.RequestDataTooLarge(
+                'Form data is too large'
+            )
+        self._buffer += data
+
+    def _read_headers(self) -> typing.Dict[str, str]:
+        end = self._buffer.find(b'\r\n\r\n')
+        while end < 0:
+            if len(self._buffer) > self.MAX_HEADER_SIZE:
+                raise framework_exceptions.MultipartError(
+                    'Part headers are too large'
+                )
+            self._fill()
+            end = self._buffer.find(b'\r\n\r\n')
+        head = bytes(self._buffer[:end]).decode('utf-8', 'replace')
+        del self._buffer[:end + 4]
+
+        headers = {}
+        for line in head.split('\r\n'):
+            name, colon, value = line.partition(':')
+            if colon:
+                headers[name.strip().lower()] = value.strip()
+        return headers
+
+    def _read_part(
+        self,
+        headers: typing.Dict[str, str],
+        part_end: bytes
+    ) -> typing.Union[typing.Tuple[str, str], UploadedFile]:
+        disposition = header_params(headers.get('content-disposition', ''))
+        name = disposition.get('name', '')
+        filename = disposition.get('filename')
+        if filename is None:
+            value = bytearray()
+            self._read_content(value.extend, part_end, self._max_field_size)
+            return name, value.decode('utf-8', 'replace')
+
+        file = tempfile.SpooledTemporaryFile(max_size=self._file_spool_size)
+        size = self._read_content(file.write, part_end, self._max_file_size)
+        file.seek(0)
+        return UploadedFile(
+            name, filename,
+            headers.get('content-type', 'application/octet-stream'),
+            file, size
+        )
+
+    def _read_content(
+        self,
+        write: typing.Callable[[bytes], typing.Any],
+        part_end: bytes,
+        max_size: int
+    ) -> int:
+        """ Write the part content up to the next delimiter. """
+        size = 0
+        while True:
+            end = self._buffer.find(part_end)
+            if end >= 0:
+                content = end
+            else:
+                # The tail may be the beginning of a delimiter
+                content = max(len(self._buffer) - len(part_end) + 1, 0)
+            size += content
+            if max_size and size > max_size:
+                raise framework_exceptions.RequestDataTooLarge(
+                    'Form part is too large'
+                )
+            if content:
+                write(bytes(self._buffer[:content]))
+            if end >= 0:
+                del self._buffer[:end + len(part_end)]
+                return size
+            del self._buffer[:content]
+            self._fill()
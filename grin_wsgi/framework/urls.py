@@ -1,9 +1,108 @@
 import re
+import collections
 import functools
+import threading
 import typing
 
 
+# <str:name>, for ex.
+URL_CONVERTER_PATTERN = re.compile(r'<(\w+):(\w+)>')
+URL_CONVERTERS = {
+    'str': (r'\w+', str),
+    'int': (r'\d+', int)
+}
+REGEXP_SPECIAL_CHARS = frozenset('\\.^$*+?{}[]|()')
+REGEXP_QUANTIFIERS = frozenset('*+?{')
+
+
+class Route:
+    """ Url pattern compiled once it is registered.
+
+    url_pattern
+        pattern with a trailing slash stripped, the slash
+        is only used to redirect urls missing it
+
+    regexp
+        url pattern compiled with converters expanded
+
+    converters
+        {group name: callable} converting matched values
+        to python values, e.g. int for <int:page>
+
+    prefix
+        literal text every matched url starts with
+        or None if the pattern is not anchored by ``^``
+    """
+
+    def __init__(
+        self,
+        url_pattern: str,
+        view: typing.Callable
+    ) -> None:
+        self.view = view
+        self.redirect = url_pattern != url_pattern.rstrip('/')
+        self.url_pattern = url_pattern.rstrip('/')
+        self.converters = {}
+        regexp = URL_CONVERTER_PATTERN.sub(
+            self._convert_url_pattern_to_regexp, self.url_pattern
+        )
+        self.regexp = re.compile(regexp)
+        self.prefix = self._literal_prefix(regexp)
+
+    def _convert_url_pattern_to_regexp(
+        self,
+        url_pattern: typing.Match
+    ) -> str:
+        """
+        Example: <str:name> -> (?P<name>\\w+)
+        """
+        pat_type, pat_name = url_pattern.groups()
+        regexp, converter = URL_CONVERTERS.get(
+            pat_type, URL_CONVERTERS['str']
+        )
+        self.converters[pat_name] = converter
+
+        return f'(?P<{pat_name}>{regexp})'
+
+    @staticmethod
+    def _literal_prefix(regexp: str) -> typing.Optional[str]:
+        """
+        Example: ^hello/(.+)$ -> hello/
+        """
+        # An alternation may be not anchored as a whole
+        if not regexp.startswith('^') or '|' in regexp:
+            return None
+        prefix = []
+        for char in regexp[1:]:
+            if char in REGEXP_SPECIAL_CHARS:
+                if char in REGEXP_QUANTIFIERS and prefix:
+                    prefix.pop()  # the char may repeat or be absent
+                break
+            prefix.append(char)
+        return ''.join(prefix)
+
+    def view_kwargs(
+        self,
+        groups: typing.Dict[str, str]
+    ) -> typing.Dict[str, typing.Any]:
+        return {
+            name: self.converters.get(name, str)(value)
+            if value is not None else None
+            for name, value in groups.items()
+        }
+
+
 class UrlRouter:
+    """ Url patterns of an App.
+
+    Patterns are searched in the order they were appended,
+    the first one matched wins.
+
+    Patterns anchored by ``^`` are indexed in a trie by their
+    literal prefix, so only the patterns whose prefix starts
+    the url are tried, however many routes there are.
+    """
+
     def __init__(
         self,
         url_prefix: typing.Optional[str]=''
@@ -11,6 +110,9 @@ class UrlRouter:
         self._urls = []
         self._url_patterns = set()
         self._url_prefix = url_prefix
+        # {char: node} tree, route indexes are kept under the '' key
+        self._prefix_trie = {'': []}
+        self._unanchored = []  # indexes of routes tried for any url
 
     @property
     def url_prefix(self) -> str:
@@ -25,51 +127,122 @@ class UrlRouter:
         view: typing.Callable
     ) -> None:
         if url_pattern not in self:
-            self._urls.append(
-                (f'{self.url_prefix}{url_pattern}', view)
-            )
-            self._url_patterns.add(f'{self.url_prefix}{url_pattern}')
-
-    @staticmethod
-    def _convert_url_pattern_to_regexp(url_pattern: str) -> str:
-        """
-        Example: <str:name> -> (?P<name>\w+)
-        """
-        type_mapping = {
-            'str': '\w+',
-            'int': '\d+'
-        }
+            url_pattern = f'{self.url_prefix}{url_pattern}'
+            route = Route(url_pattern, view)
+            self._index(route, len(self._urls))
+            self._urls.append(route)
+            self._url_patterns.add(url_pattern)
 
-        pat_type, pat_name = url_pattern.groups()
-        pat_type = type_mapping.get(pat_type, '\w+')
+    def _index(
+        self,
+        route: Route,
+        index: int
+    ) -> None:
+        if route.prefix is None:
+            self._unanchored.append(index)
+            return
+        node = self._prefix_trie
+        for char in route.prefix:
+            node = node.setdefault(char, {'': []})
+        node[''].append(index)
 
-        return f'(?P<{pat_name}>{pat_type})'
+    def _candidates(self, url: str) -> typing.List[int]:
+        """ Indexes of routes which may match the url, in order. """
+        node = self._prefix_trie
+        candidates = node[''] + self._unanchored
+        for char in url:
+            node = node.get(char)
+            if node is None:
+                break
+            candidates += node['']
+        candidates.sort()
+        return candidates
 
-    def dispatch(
+    def resolve(
         self,
         url: str
-    ) -> typing.Tuple[typing.Callable, bool]:
-        dispatched_view, redirect = None, False
+    ) -> typing.Tuple[typing.Optional[typing.Callable], typing.Dict, bool]:
+        """ Find a view and its kwargs or tell to redirect. """
         redirect_url = url.rstrip('/')
-        url_converter_pattern = r'<(\w+):(\w+)>'  # <str:name>, for ex.
-        for url_pattern, view in self._urls:
-            redirect_url_pattern = url_pattern.rstrip('/')
-            regex_url_pattern = re.sub(
-                url_converter_pattern,
-                self._convert_url_pattern_to_regexp,
-                redirect_url_pattern
-            )
-
-            regexp_parsed_url = re.search(regex_url_pattern, redirect_url)
+        for index in self._candidates(redirect_url):
+            route = self._urls[index]
+            regexp_parsed_url = route.regexp.search(redirect_url)
             if regexp_parsed_url is None:
                 # url_pattern didn't match, try the new one
                 continue
 
-            if url == redirect_url and url_pattern != redirect_url_pattern:
-                redirect = True
-                break
+            if url == redirect_url and route.redirect:
+                return None, {}, True
+
+            view_kwargs = route.view_kwargs(regexp_parsed_url.groupdict())
+            return route.view, view_kwargs, False  # View was found
+        return None, {}, False
+
+    def dispatch(
+        self,
+        url: str
+    ) -> typing.Tuple[typing.Callable, bool]:
+        view, view_kwargs, redirect = self.resolve(url)
+        if view is not None:
+            view = functools.partial(view, **view_kwargs)
+        return view, redirect
+
+
+CacheInfo = collections.namedtuple(
+    'CacheInfo', ['hits', 'misses', 'maxsize', 'currsize']
+)
+
+
+class RouteCache:
+    """ Bounded LRU cache of resolved urls.
+
+    Urls which were not found are cached as well,
+    so repeated 404s (e.g. scanners traffic) are cheap.
+    Use info() to see hits and misses and size the cache.
+    """
+
+    def __init__(
+        self,
+        maxsize: typing.Optional[int]=1024
+    ) -> None:
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._resolved = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._resolved)
+
+    def get(
+        self,
+        url: str
+    ) -> typing.Optional[typing.Tuple]:
+        with self._lock:
+            resolved = self._resolved.get(url)
+            if resolved is None:
+                self.misses += 1
+                return None
+            self._resolved.move_to_end(url)
+            self.hits += 1
+            return resolved
+
+    def set(
+        self,
+        url: str,
+        resolved: typing.Tuple
+    ) -> None:
+        if not self.maxsize:
+            return
+        with self._lock:
+            self._resolved[url] = resolved
+            if len(self._resolved) > self.maxsize:
+                self._resolved.popitem(last=False)
+
+    def clear(self) -> None:
+        """ Forget resolved urls, e.g. when a route is added. """
+        with self._lock:
+            self._resolved.clear()
 
-            view_kwargs = regexp_parsed_url.groupdict()
-            dispatched_view = functools.partial(view, **view_kwargs)
-            break  # View was found
-        return dispatched_view, redirect
+    def info(self) -> CacheInfo:
+        return CacheInfo(self.hits, self.misses, self.maxsize, len(self))
@@ -1,6 +1,16 @@
+import io
+import os
+import stat
+import socket
+import selectors
 import typing
 
-__all__ = ['Response', 'Request']
+from grin_wsgi.http import headers as http_headers
+
+__all__ = ['Response', 'Request', 'FileWrapper', 'send_all']
+
+# Vectored writes are limited by IOV_MAX (1024 on Linux)
+SENDMSG_MAX_PIECES = 1024
 
 
 class Response:
@@ -15,52 +25,351 @@ class Response:
 
     body
         Iterable returned by an application() UWSGI callable
+
+    keep_alive
+        Should the connection be kept open after the response
+
+    head
+        Is it a response to a HEAD request (headers only)
+
+    chunked
+        May the body be sent with chunked transfer coding
+        (the client speaks HTTP/1.1)
+
+    headers_sent
+        Have the status line and headers been serialized
+
+    server_headers
+        Encoded headers added by the server, e.g. Date and Server
+
+    on_close
+        callable called with the response and the number of bytes
+        sent once the response is sent or abandoned
+
+    pending
+        concurrent.futures.Future the body waits for, e.g. of
+        an async view; an event loop server sends the response
+        once it is done instead of blocking on it
+
+    Iterating over a response yields lists of bytes,
+    one list per item of the body iterable, so each list
+    can be written with a single vectored send.
+    A FileWrapper body backed by a regular file is yielded
+    itself after the headers to be sent with os.sendfile().
+
+    A response is created for every request, so concurrent
+    requests never share one.
     """
 
-    def __setattr__(
+    __slots__ = (
+        'status', 'headers', 'body', 'keep_alive', 'head', 'chunked',
+        'headers_sent', 'server_headers', 'on_close', 'pending'
+    )
+
+    # Responses which never have a message body
+    BODILESS_STATUSES = ('1', '204', '304')
+
+    def __init__(self) -> None:
+        self.status = None
+        self.headers = []
+        self.body = ()
+        self.keep_alive = False
+        self.head = False
+        self.chunked = False
+        self.headers_sent = False
+        self.server_headers = b''
+        self.on_close = None
+        self.pending = None
+
+    def __repr__(self) -> str:
+        return f'<Response {self.status}>'
+
+    def __iter__(
+        self
+    ) -> typing.Iterator[typing.Union[typing.List[bytes], 'FileWrapper']]:
+        """ Stream the response as the body iterable produces it. """
+        sent = 0
+        try:
+            if isinstance(self.body, FileWrapper) and \
+                    self.body.fileno() is not None:
+                group = [self._serialize_headers(self._framing())]
+                sent += len(group[0])
+                yield group
+                if self._has_body() and self.body.remaining:
+                    sent += self.body.remaining
+                    yield self.body
+                return
+
+            chunks = iter(self.body)
+            # The application may call start_response() lazily
+            first = next((chunk for chunk in chunks if chunk), b'')
+            framing = self._framing()
+            group = [self._serialize_headers(framing)]
+            if not self._has_body():
+                sent += len(group[0])
+                yield group
+                return
+            if first:
+                group.extend(self._frame(first, framing))
+            sent += sum(map(len, group))
+            yield group
+            for chunk in chunks:
+                if chunk:
+                    group = self._frame(chunk, framing)
+                    sent += sum(map(len, group))
+                    yield group
+            if framing == 'chunked':
+                sent += 5
+                yield [b'0\r\n\r\n']
+        finally:
+            if hasattr(self.body, 'close'):
+                self.body.close()  # PEP 3333
+            if self.on_close is not None:
+                self.on_close(self, sent)
+
+    def close(self) -> None:
+        """ Release a response which is not going to be sent. """
+        if hasattr(self.body, 'close'):
+            self.body.close()  # PEP 3333
+        if self.on_close is not None:
+            on_close, self.on_close = self.on_close, None
+            on_close(self, 0)
+
+    def get_response(self) -> bytes:
+        """ Generate full response bytes. """
+        return b''.join(piece for group in self for piece in group)
+
+    def send(
         self,
-        name: str,
-        value: typing.Any
+        sock: socket.socket
     ) -> None:
-        """ Set Response attributes (status, headers, body). """
-        super().__setattr__(name, value)
+        """ Write the response to a blocking socket. """
+        for group in self:
+            if isinstance(group, FileWrapper):
+                group.send_all(sock)
+            else:
+                send_all(sock, group)
 
-    def get_response(self) -> bytes:
-        """ Generate full response string """
-        response = f'HTTP/1.1 {self.status}\r\n'
-        for header in self.headers:
-            http_header_name, http_header_value = header
-            response += f'{http_header_name}: {http_header_value}\r\n'
-        response += '\r\n'
-        for data in self.body:
-            response += data.decode('utf-8')
+    def _has_body(self) -> bool:
+        return not self.head and \
+            not self.status.startswith(self.BODILESS_STATUSES)
+
+    def _framing(self) -> typing.Optional[str]:
+        """ Choose how the end of the body is marked.
+
+        The header set by an application is kept, a length is counted
+        for a list or a file body, otherwise chunked coding is used.
+        HTTP/1.0 clients get a body delimited by the connection close.
+        """
+        header_names = {name.lower() for name, _ in self.headers}
+        if 'content-length' in header_names or \
+                not self.status.startswith(self.BODILESS_STATUSES) and \
+                self._content_length() is not None:
+            return 'length'
+        if self.head or self.status.startswith(self.BODILESS_STATUSES):
+            return None
+        if self.chunked:
+            return 'chunked'
+        self.keep_alive = False
+        return None
+
+    def _serialize_headers(
+        self,
+        framing: typing.Optional[str]
+    ) -> bytes:
+        headers = []
+        has_content_length = False
+        for name, value in self.headers:
+            lower_name = name.lower()
+            if lower_name in ('connection', 'transfer-encoding'):
+                continue
+            if lower_name == 'content-length':
+                has_content_length = True
+            headers.append(f'{name}: {value}\r\n')
+        if framing == 'length' and not has_content_length:
+            headers.append(f'Content-Length: {self._content_length()}\r\n')
+        self.headers_sent = True
+        # Only the application headers are formatted per response
+        return b''.join((
+            http_headers.status_line(self.status),
+            ''.join(headers).encode('latin-1'),
+            self.server_headers,
+            http_headers.TRANSFER_ENCODING_CHUNKED
+            if framing == 'chunked' else b'',
+            http_headers.CONNECTION_KEEP_ALIVE if self.keep_alive else
+            http_headers.CONNECTION_CLOSE,
+            b'\r\n'
+        ))
+
+    def _content_length(self) -> typing.Optional[int]:
+        """ Body length if it is known without iterating the body. """
+        if isinstance(self.body, (list, tuple)):
+            return sum(len(chunk) for chunk in self.body)
+        if isinstance(self.body, FileWrapper) and \
+                self.body.fileno() is not None:
+            return self.body.remaining
+        return None
+
+    @staticmethod
+    def _frame(
+        chunk: bytes,
+        framing: typing.Optional[str]
+    ) -> typing.List[bytes]:
+        if framing == 'chunked':
+            return [f'{len(chunk):x}\r\n'.encode('latin-1'), chunk, b'\r\n']
+        return [chunk]
+
+
+class FileWrapper:
+    """ wsgi.file_wrapper implementation.
+
+    A file returned by an application in a wrapper is sent
+    with os.sendfile() from the page cache straight to the socket
+    when it is a regular file, otherwise it is read by blocks.
 
-        return response.encode('utf-8')
+    offset and length select a part of the file to be sent,
+    e.g. for a range response. The rest of the file is sent
+    if length is not given.
+    """
+
+    def __init__(
+        self,
+        filelike: typing.Any,
+        blksize: typing.Optional[int]=8192,
+        offset: typing.Optional[int]=0,
+        length: typing.Optional[int]=None
+    ) -> None:
+        self.filelike = filelike
+        self.blksize = blksize
+        self.offset = offset
+        self._fileno = self._regular_file_fileno(filelike)
+        if length is None and self._fileno is not None:
+            length = max(os.fstat(self._fileno).st_size - offset, 0)
+        self.remaining = length
+        self._sendfile = hasattr(os, 'sendfile')
+
+    @staticmethod
+    def _regular_file_fileno(filelike: typing.Any) -> typing.Optional[int]:
+        try:
+            fileno = filelike.fileno()
+            if stat.S_ISREG(os.fstat(fileno).st_mode):
+                return fileno
+        except (AttributeError, OSError, io.UnsupportedOperation):
+            pass
+        return None
+
+    def fileno(self) -> typing.Optional[int]:
+        """ Descriptor of a regular file or None. """
+        return self._fileno
+
+    def __iter__(self) -> typing.Iterator[bytes]:
+        if self.offset and hasattr(self.filelike, 'seek'):
+            self.filelike.seek(self.offset)
+        remaining = self.remaining
+        while remaining is None or remaining > 0:
+            size = self.blksize if remaining is None else \
+                min(self.blksize, remaining)
+            data = self.filelike.read(size)
+            if not data:
+                break
+            if remaining is not None:
+                remaining -= len(data)
+            yield data
+
+    def close(self) -> None:
+        if hasattr(self.filelike, 'close'):
+            self.filelike.close()
+
+    def send(
+        self,
+        sock: socket.socket
+    ) -> int:
+        """ Send the next part of the file, return number of bytes sent.
+
+        May raise BlockingIOError for a non-blocking socket.
+        """
+        count = min(self.remaining, 1 << 30)
+        if self._sendfile:
+            try:
+                sent = os.sendfile(
+                    sock.fileno(), self._fileno, self.offset, count
+                )
+            except OSError as e:
+                if isinstance(e, BlockingIOError):
+                    raise
+                self._sendfile = False  # e.g. unsupported file system
+                return 0
+        else:
+            size = min(count, self.blksize)
+            data = os.pread(self._fileno, size, self.offset)
+            sent = sock.send(data) if data else 0
+        if not sent:
+            self.remaining = 0  # the file is shorter than expected
+        self.offset += sent
+        self.remaining -= sent
+        return sent
+
+    def send_all(
+        self,
+        sock: socket.socket
+    ) -> None:
+        """ Send the file to a blocking socket (possibly with a timeout). """
+        timeout = sock.gettimeout()
+        with selectors.DefaultSelector() as selector:
+            selector.register(sock, selectors.EVENT_WRITE)
+            while self.remaining:
+                try:
+                    self.send(sock)
+                except BlockingIOError:
+                    if not selector.select(timeout):
+                        raise socket.timeout('timed out')
+
+
+def send_all(
+    sock: socket.socket,
+    pieces: typing.List[bytes]
+) -> None:
+    """ Send pieces of data with as few system calls as possible. """
+    if not hasattr(sock, 'sendmsg'):  # pragma: no cover
+        sock.sendall(b''.join(pieces))
+        return
+    pieces = [memoryview(piece) for piece in pieces if piece]
+    while pieces:
+        sent = sock.sendmsg(pieces[:SENDMSG_MAX_PIECES])
+        while sent:
+            if sent >= len(pieces[0]):
+                sent -= len(pieces.pop(0))
+            else:
+                pieces[0] = pieces[0][sent:]
+                sent = 0
 
 
 class Request:
     """ HTTPRequest class.
-    Request instance is forming from a plain request string
-    passed from a web server.
+    Request instance is created by a RequestParser
+    from the bytes received by a web server.
     Each instance constains such attributes::
 
-    plain_request
-        Plain request string passed from a web server
-
     method
         HttpRequest method: GET, POST, PUT, etc.
 
     uri
-       equest URI
+        request URI
+
+    path
+        request URI path, without the query string
 
     version
         protocol version
 
+    headers
+        dictionary of request headers with lowercased names
+
     host
-        source client host
+        Host header hostname
 
     port
-        source client port
+        Host header port
 
     content_length
         Content-Length header value
@@ -68,41 +377,55 @@ class Request:
     query_string
         query string for GET method or empty string elsewhere
 
+    keep_alive
+        does the client want the connection to be kept open
+
     body
-        empty string for GET request or Request data for a POST request
+        readable binary stream of the request body
     """
 
-    def __init__(self) -> None:
-        self._plain_request = None
-
-    @property
-    def plain_request(self) -> str:
-        """ Example: GET /hello/?name=username HTTP/1.1 """
-        return self._plain_request
+    __slots__ = (
+        'method', 'uri', 'version', 'headers', 'body',
+        'host', 'port', 'path', 'query_string'
+    )
 
-    @plain_request.setter
-    def plain_request(
+    def __init__(
         self,
-        plain_request: str
+        method: str,
+        uri: str,
+        version: str,
+        headers: typing.Dict[str, str],
+        body: typing.Optional[typing.BinaryIO]=None
     ) -> None:
-        self._parse_request(plain_request)
-        self._plain_request = plain_request
+        self.method = method
+        self.uri = uri
+        self.version = version
+        self.headers = headers
+        self.body = body if body is not None else io.BytesIO()
 
-    def _parse_request(
-        self,
-        request: str
-    ) -> None:
-        request_list = request.splitlines()
-
-        request_line = request_list[0]
-        host_header = next(filter(lambda x: 'Host:' in x, request_list), '::')
-        content_length_header = next(
-            filter(lambda x: 'Content-Length:' in x, request_list),
-            ':'
-        )
-
-        self.method, self.uri, self.version = request_line.split()
-        self.host, self.port = host_header.split(':')[1:]
-        self.content_length = content_length_header.split(':')[1]
-        self.query_string = self.uri.split('?')[1] if '?' in self.uri else ''
-        self.body = request_list[-1]
+        host = headers.get('host', '')
+        if host.endswith(']') or ':' not in host:  # no port or IPv6
+            self.host, self.port = host, '80'
+        else:
+            self.host, self.port = host.rsplit(':', 1)
+        self.path, _, self.query_string = uri.partition('?')
+
+    def __repr__(self) -> str:
+        return f'<Request {self.method} {self.uri} {self.version}>'
+
+    @property
+    def content_length(self) -> str:
+        return self.headers.get('content-length', '')
+
+    @property
+    def keep_alive(self) -> bool:
+        """ HTTP/1.1 connections are persistent unless closed,
+        HTTP/1.0 ones only when asked with Connection: keep-alive.
+        """
+        connection = {
+            token.strip().lower() for token in
+            self.headers.get('connection', '').split(',')
+        }
+        if self.version == 'HTTP/1.1':
+            return 'close' not in connection
+        return 'keep-alive' in connection
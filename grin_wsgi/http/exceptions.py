@@ -0,0 +1,32 @@
+class HttpParserError(Exception):
+    """ Request can not be parsed, answer with status and close """
+
+    status = '400 Bad Request'
+
+
+class BadRequest(HttpParserError):
+    """ Malformed request line, header or body framing """
+
+
+class RequestHeaderFieldsTooLarge(HttpParserError):
+    """ Request head is over the size or count limit """
+
+    status = '431 Request Header Fields Too Large'
+
+
+class RequestTimeout(HttpParserError):
+    """ Request head or body was not received in time """
+
+    status = '408 Request Timeout'
+
+
+class PayloadTooLarge(HttpParserError):
+    """ Request body is over the size limit """
+
+    status = '413 Payload Too Large'
+
+
+class TransferEncodingNotImplemented(HttpParserError):
+    """ Transfer-Encoding other than chunked was used """
+
+    status = '501 Not Implemented'
@@ -0,0 +1,57 @@
+import http
+import time
+import typing
+
+from email.utils import formatdate
+
+# Encoded status lines by status, seeded with the ones known to the
+# http module and filled with the statuses applications send
+STATUS_LINES = {
+    f'{status.value} {status.phrase}':
+        f'HTTP/1.1 {status.value} {status.phrase}\r\n'.encode('latin-1')
+    for status in http.HTTPStatus
+}
+# Statuses kept in STATUS_LINES, the others are encoded every time
+STATUS_LINES_LIMIT = 512
+
+TRANSFER_ENCODING_CHUNKED = b'Transfer-Encoding: chunked\r\n'
+CONNECTION_KEEP_ALIVE = b'Connection: keep-alive\r\n'
+CONNECTION_CLOSE = b'Connection: close\r\n'
+
+
+def status_line(status: str) -> bytes:
+    """ Encoded status line, e.g. 200 OK -> HTTP/1.1 200 OK\\r\\n """
+    line = STATUS_LINES.get(status)
+    if line is None:
+        line = f'HTTP/1.1 {status}\r\n'.encode('latin-1')
+        if len(STATUS_LINES) < STATUS_LINES_LIMIT:
+            STATUS_LINES[status] = line
+    return line
+
+
+class ServerHeaders:
+    """ Encoded Date and Server headers added to every response.
+
+    The Date header changes once per second, so the block is
+    formatted at most once per second whatever the request rate.
+    A block is replaced as a whole, threads never see a torn one.
+    """
+
+    def __init__(
+        self,
+        server: typing.Optional[str]='WSGIServer 0.2'
+    ) -> None:
+        self._server = f'Server: {server}\r\n'.encode('latin-1')
+        self._block = (None, b'')  # (second, headers)
+
+    def get(self) -> bytes:
+        second = int(time.time())
+        block = self._block
+        if block[0] != second:
+            block = (second, self._format(second))
+            self._block = block
+        return block[1]
+
+    def _format(self, second: int) -> bytes:
+        date = formatdate(timeval=second, localtime=False, usegmt=True)
+        return f'Date: {date}\r\n'.encode('latin-1') + self._server
@@ -0,0 +1,372 @@
+import io
+import tempfile
+import typing
+
+from grin_wsgi.http import Request, exceptions as http_exceptions
+
+
+class RequestBody(io.RawIOBase):
+    """ Request body read from a connection on demand.
+
+    receive is called for more bytes when the parser
+    has none buffered, it returns b'' if the connection is closed.
+    The body ends after Content-Length bytes or the last chunk,
+    so the next request on the connection is never read.
+
+    error is the HttpParserError the body failed with, it is
+    raised again by every later read. The server answers
+    with its status rather than with the application response.
+    """
+
+    def __init__(
+        self,
+        parser: 'RequestParser',
+        receive: typing.Callable[[], bytes]
+    ) -> None:
+        self._parser = parser
+        self._receive = receive
+        self._done = False
+        self.error = None
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer: typing.Any) -> int:
+        if self.error is not None:
+            raise self.error
+        try:
+            return self._readinto(buffer)
+        except http_exceptions.HttpParserError as e:
+            self.error = e
+            raise
+
+    def _readinto(self, buffer: typing.Any) -> int:
+        if self._done or not len(buffer):
+            return 0
+        piece = self._parser.read_body(len(buffer))
+        while piece is None:
+            data = self._receive()
+            if not data:
+                raise http_exceptions.BadRequest('Incomplete request body')
+            self._parser.feed(data)
+            piece = self._parser.read_body(len(buffer))
+        if not piece:
+            self._done = True
+            return 0
+        buffer[:len(piece)] = piece
+        return len(piece)
+
+    def drain(self) -> None:
+        """ Skip the part of the body an application has not read. """
+        while self.read(65536):
+            pass
+
+
+class RequestParser:
+    """ Incremental HTTP/1.x request parser.
+
+    Bytes received from a connection are passed to feed()
+    and complete requests are taken by next_request()
+    in the order they came, so pipelined requests are supported.
+
+    The head is scanned for the blank line only once and
+    parsed in a single pass. The body is read as exactly
+    Content-Length bytes or decoded from chunked transfer coding.
+
+    A request body is a readable binary stream. It is received
+    before the request is returned and kept in memory up to
+    body_spool_size bytes, a larger body is spooled to a temporary
+    file. If next_request() is given a receive callable, the request
+    is returned once its head is parsed and the body is read
+    from the connection only when an application reads it.
+    The unread rest of it is skipped before the next request.
+
+    max_header_size
+        request line and headers size limit
+
+    max_headers
+        number of headers limit
+
+    max_body_size
+        request body size limit, 0 means no limit
+
+    body_spool_size
+        size of a body kept in memory
+    """
+
+    HEADERS, BODY, CHUNK_SIZE, CHUNK_DATA, TRAILERS = range(5)
+
+    def __init__(
+        self,
+        max_header_size: typing.Optional[int]=65536,
+        max_headers: typing.Optional[int]=100,
+        max_body_size: typing.Optional[int]=0,
+        body_spool_size: typing.Optional[int]=1048576
+    ) -> None:
+        self._max_header_size = max_header_size
+        self._max_headers = max_headers
+        self._max_body_size = max_body_size
+        self._body_spool_size = body_spool_size
+        self._buffer = bytearray()
+        self._reset()
+
+    def _reset(self) -> None:
+        self._state = self.HEADERS
+        self._scanned = 0  # buffer bytes known not to contain a delimiter
+        self._request = None
+        self._pending = None  # body stream of a returned request
+        self._body = []
+        self._body_file = None
+        self._spooled = 0
+        self._body_size = 0
+        self._remaining = 0
+
+    @property
+    def buffered(self) -> int:
+        """ Number of received bytes not parsed yet. """
+        return len(self._buffer)
+
+    @property
+    def receiving(self) -> bool:
+        """ Has a part of the next request been received. """
+        return bool(self._buffer) or self._request is not None
+
+    @property
+    def body_error(self) -> typing.Optional[http_exceptions.HttpParserError]:
+        """ Error the lazily read body of the last request failed with. """
+        return self._pending.error if self._pending is not None else None
+
+    @property
+    def receiving_body(self) -> bool:
+        """ Has the head of the request been received, but not its body. """
+        return self._request is not None
+
+    def feed(self, data: bytes) -> None:
+        self._buffer += data
+
+    def next_request(
+        self,
+        receive: typing.Optional[typing.Callable[[], bytes]]=None
+    ) -> typing.Optional[Request]:
+        """ Return the next request or None if more data needed.
+
+        With receive the request body is read lazily.
+        """
+        if self._pending is not None:
+            self._pending.drain()
+        if self._state == self.HEADERS:
+            if not self._parse_head():
+                return None
+            request = self._request
+            if self._state == self.BODY and not self._remaining:
+                request.body = io.BytesIO()
+                self._reset()
+                return request
+            if receive is not None:
+                self._pending = RequestBody(self, receive)
+                request.body = io.BufferedReader(self._pending)
+                return request
+
+        piece = self.read_body()
+        while piece:
+            self._spool(piece)
+            piece = self.read_body()
+        if piece is None:
+            return None
+
+        request = self._request
+        if self._body_file is None:
+            request.body = io.BytesIO(b''.join(self._body))
+        else:
+            request.body = self._body_file
+            request.body.seek(0)
+        self._reset()
+        return request
+
+    def _spool(self, piece: bytes) -> None:
+        """ Keep a received body piece, in a file past the spool size. """
+        if self._body_file is not None:
+            self._body_file.write(piece)
+            return
+        self._body.append(piece)
+        self._spooled += len(piece)
+        if self._spooled > self._body_spool_size:
+            self._body_file = tempfile.TemporaryFile()
+            self._body_file.writelines(self._body)
+            self._body = []
+
+    def _find(
+        self,
+        delimiter: bytes,
+        limit: int
+    ) -> int:
+        """ Find a delimiter without rescanning bytes already seen. """
+        index = self._buffer.find(delimiter, self._scanned)
+        if index < 0:
+            if len(self._buffer) > limit:
+                raise http_exceptions.RequestHeaderFieldsTooLarge(
+                    'Request head is too large'
+                )
+            self._scanned = max(len(self._buffer) - len(delimiter) + 1, 0)
+            return index
+        self._scanned = 0
+        if index > limit:
+            raise http_exceptions.RequestHeaderFieldsTooLarge(
+                'Request head is too large'
+            )
+        return index
+
+    def _parse_head(self) -> bool:
+        # Ignore empty lines before a request line (RFC 7230, 3.5)
+        while self._buffer.startswith(b'\r\n'):
+            del self._buffer[:2]
+
+        end = self._find(b'\r\n\r\n', self._max_header_size)
+        if end < 0:
+            return False
+        head = bytes(self._buffer[:end])
+        del self._buffer[:end + 4]
+
+        lines = head.split(b'\r\n')
+        if len(lines) - 1 > self._max_headers:
+            raise http_exceptions.RequestHeaderFieldsTooLarge(
+                'Too many request headers'
+            )
+        try:
+            method, uri, version = lines[0].decode('latin-1').split(' ')
+        except ValueError:
+            raise http_exceptions.BadRequest('Malformed request line')
+        if not version.startswith('HTTP/1.'):
+            raise http_exceptions.BadRequest(f'Unsupported {version}')
+
+        headers = {}
+        for line in lines[1:]:
+            name, colon, value = line.partition(b':')
+            if not colon or not name or name != name.strip():
+                raise http_exceptions.BadRequest('Malformed request header')
+            name = name.decode('latin-1').lower()
+            value = value.strip().decode('latin-1')
+            if name in headers:
+                value = f'{headers[name]}, {value}'
+            headers[name] = value
+
+        self._request = Request(method, uri, version, headers)
+        self._start_body(headers)
+        return True
+
+    def _start_body(
+        self,
+        headers: typing.Dict[str, str]
+    ) -> None:
+        transfer_encoding = headers.get('transfer-encoding')
+        if transfer_encoding is not None:
+            codings = transfer_encoding.lower().split(',')
+            if codings[-1].strip() != 'chunked':
+                raise http_exceptions.TransferEncodingNotImplemented(
+                    f'Transfer-Encoding {transfer_encoding} is not supported'
+                )
+            self._state = self.CHUNK_SIZE
+            return
+
+        content_length = headers.get('content-length', '0')
+        if not content_length.isdigit():
+            raise http_exceptions.BadRequest('Malformed Content-Length')
+        self._remaining = int(content_length)
+        self._check_body_size(self._remaining)
+        self._state = self.BODY
+
+    def _check_body_size(
+        self,
+        size: int
+    ) -> None:
+        if self._max_body_size and size > self._max_body_size:
+            raise http_exceptions.PayloadTooLarge(
+                'Request body is too large'
+            )
+
+    def read_body(
+        self,
+        size: typing.Optional[int]=-1
+    ) -> typing.Optional[bytes]:
+        """ Take up to size bytes of the current request body,
+        all the buffered ones if size is negative.
+
+        Returns b'' once the body is complete
+        or None if more data is needed.
+        """
+        while True:
+            if self._state == self.BODY:
+                if not self._remaining:
+                    return self._end_body()
+                return self._take(size)
+            elif self._state == self.CHUNK_SIZE:
+                if not self._read_chunk_size():
+                    return None
+            elif self._state == self.CHUNK_DATA:
+                if self._remaining:
+                    return self._take(size)
+                if not self._read_chunk_end():
+                    return None
+            elif self._state == self.TRAILERS:
+                return self._read_trailers()
+            else:
+                return b''
+
+    def _read_chunk_size(self) -> bool:
+        """ Parse a chunk size line, False if it is not buffered. """
+        end = self._find(b'\r\n', self._max_header_size)
+        if end < 0:
+            return False
+        size_line = bytes(self._buffer[:end]).split(b';')[0].strip()
+        del self._buffer[:end + 2]
+        try:
+            self._remaining = int(size_line, 16)
+        except ValueError:
+            raise http_exceptions.BadRequest('Malformed chunk size')
+        if self._remaining < 0:
+            raise http_exceptions.BadRequest('Malformed chunk size')
+        self._body_size += self._remaining
+        self._check_body_size(self._body_size)
+        self._state = self.CHUNK_DATA if self._remaining else self.TRAILERS
+        return True
+
+    def _read_chunk_end(self) -> bool:
+        """ Skip the CRLF after chunk data, False if it is not buffered. """
+        if len(self._buffer) < 2:
+            return False
+        if self._buffer[:2] != b'\r\n':
+            raise http_exceptions.BadRequest('Malformed chunk')
+        del self._buffer[:2]
+        self._state = self.CHUNK_SIZE
+        return True
+
+    def _read_trailers(self) -> typing.Optional[bytes]:
+        """ Read and drop the trailers, b'' once the body is complete. """
+        while True:
+            end = self._find(b'\r\n', self._max_header_size)
+            if end < 0:
+                return None
+            del self._buffer[:end + 2]
+            if end == 0:
+                self._request.headers['content-length'] = \
+                    str(self._body_size)
+                self._request.headers.pop('transfer-encoding')
+                return self._end_body()
+
+    def _take(self, size: int) -> typing.Optional[bytes]:
+        if not self._buffer:
+            return None
+        if 0 <= size < self._remaining:
+            piece = bytes(self._buffer[:size])
+        else:
+            piece = bytes(self._buffer[:self._remaining])
+        del self._buffer[:len(piece)]
+        self._remaining -= len(piece)
+        return piece
+
+    def _end_body(self) -> bytes:
+        if self._pending is not None:
+            self._reset()  # the body stream was the last to use the request
+        else:
+            self._state = None  # next_request() takes the spooled body
+        return b''
@@ -1,13 +1,35 @@
+import os
+import signal
 import logging
+import collections
+import select
+import selectors
+import queue
 import socket
 import threading
+import time
 import multiprocessing
 import typing
 
+from concurrent.futures import ThreadPoolExecutor
+
+from grin_wsgi.http import Request, Response, FileWrapper, \
+    exceptions as http_exceptions
+from grin_wsgi.http.parser import RequestParser
+from grin_wsgi.http.timers import TimerHeap
 
 WSGIRequestHandler = typing.TypeVar('WSGIRequestHandler')
 
 
+def _error_response(status: str) -> Response:
+    """ Plain text response closing the connection. """
+    response = Response()
+    response.status = status
+    response.headers = [('Content-Type', 'text/plain')]
+    response.body = [status.encode('latin-1')]
+    return response
+
+
 class SimpleHTTPServer:
     """ TCP IPv4 socket
     binded to passed hostname and port.
@@ -18,13 +40,88 @@ class SimpleHTTPServer:
     SOCKET_TYPE = socket.SOCK_STREAM
     MULTITHREAD = False
     MULTIPROCESS = False
+    RECV_SIZE = 65536
+    # Seconds a stop or reload request may wait for the accept loop
+    POLL_INTERVAL = 0.5
+    # Seconds an idle connection waits before checking for waiting ones
+    IDLE_POLL_INTERVAL = 0.1
 
     def __init__(
         self,
         host: str,
-        port: int
+        port: int,
+        keepalive_timeout: typing.Optional[float]=5,
+        header_timeout: typing.Optional[float]=10,
+        body_timeout: typing.Optional[float]=30,
+        write_timeout: typing.Optional[float]=30,
+        max_requests: typing.Optional[int]=100,
+        max_header_size: typing.Optional[int]=65536,
+        max_body_size: typing.Optional[int]=0,
+        body_spool_size: typing.Optional[int]=1048576,
+        reverse_lookup: typing.Optional[bool]=True,
+        graceful_timeout: typing.Optional[float]=30,
+        **options: typing.Any
     ) -> None:
+        """ Options not used by the server type are ignored.
+
+        keepalive_timeout
+            seconds an idle persistent connection is kept open,
+            0 disables persistent connections
+
+        header_timeout
+            seconds a client is given to send a request line and
+            headers, from the first byte or the accept of a connection
+
+        body_timeout
+            seconds a request body may stall between two reads
+
+        write_timeout
+            seconds a response may stall between two writes
+
+        A client too slow to send a request is answered with
+        408 Request Timeout, a timeout of 0 means no limit.
+
+        max_requests
+            requests served over one connection, 0 means no limit
+
+        max_header_size
+            request line and headers size limit
+
+        max_body_size
+            request body size limit, 0 means no limit
+
+        body_spool_size
+            size of a request body kept in memory,
+            a larger one is spooled to a temporary file
+
+        reverse_lookup
+            resolve the fully qualified server_name once
+            the socket is bound, False keeps the bound host as is
+
+        graceful_timeout
+            seconds the accepted connections are given to finish
+            once the server is stopped
+
+        reload_handler
+            callable returning a new request handler once
+            a reload is requested, e.g. for a reloaded application
+        """
         self._serversock = None
+        self._keepalive_timeout = keepalive_timeout
+        self._header_timeout = header_timeout
+        self._body_timeout = body_timeout
+        self._write_timeout = write_timeout
+        self._max_requests = max_requests
+        self._max_header_size = max_header_size
+        self._max_body_size = max_body_size
+        self._body_spool_size = body_spool_size
+        self._reverse_lookup = reverse_lookup
+        self._graceful_timeout = graceful_timeout
+        self._stopping = False
+        self._reload_requested = False
+        self.reload_handler = None
+        self.server_name = host
+        self.server_port = str(port)
         self._create_serversocket(host, port)
 
     def _create_serversocket(
@@ -32,54 +129,347 @@ class SimpleHTTPServer:
         host: str,
         port: int
     ) -> None:
-        self._serversock = socket.socket(self.SOCKET_FAMILY, self.SOCKET_TYPE)
-        self._serversock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-        self._serversock.bind((host, port))
+        self._serversock = self._bind_socket(host, port)
+        host, port = self._serversock.getsockname()[:2]
+        # Resolved once here rather than for every request
+        if self._reverse_lookup:
+            self.server_name = socket.getfqdn(host)
+        self.server_port = str(port)
+
+    def _bind_socket(
+        self,
+        host: str,
+        port: int
+    ) -> socket.socket:
+        sock = socket.socket(self.SOCKET_FAMILY, self.SOCKET_TYPE)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind((host, port))
+        return sock
 
     def process_request(
         self,
         request_handler: WSGIRequestHandler
     ) -> None:
+        """ Serve connections until the server is stopped. """
         self._serversock.listen(self.CONNECTION_QUEUE_LIMIT)
-        while True:
-            self._accept(request_handler)
+        self._serversock.settimeout(self.POLL_INTERVAL)
+        self._serve(request_handler)
+        self._serversock.close()
+        self._drain(time.monotonic() + self._graceful_timeout)
+
+    def stop(self) -> None:
+        """ Stop accepting connections and let the accepted ones finish.
+
+        It is safe to call from a signal handler.
+        """
+        self._stopping = True
+
+    def reload(self) -> None:
+        """ Serve the next connections with a new request handler.
+
+        It is safe to call from a signal handler, the handler
+        is replaced by the accept loop.
+        """
+        self._reload_requested = True
+
+    def _serve(
+        self,
+        request_handler: WSGIRequestHandler
+    ) -> None:
+        while not self._stopping:
+            if self._reload_requested:
+                request_handler = self._reloaded(request_handler)
+            try:
+                self._accept(request_handler)
+            except socket.timeout:
+                pass
+
+    def _reloaded(
+        self,
+        request_handler: WSGIRequestHandler
+    ) -> WSGIRequestHandler:
+        self._reload_requested = False
+        if self.reload_handler is None:
+            return request_handler
+        try:
+            request_handler = self.reload_handler()
+        except Exception:
+            logging.exception('Reload failed, the old application is kept')
+        else:
+            logging.info('Application reloaded')
+        return request_handler
+
+    def _drain(self, deadline: float) -> None:
+        """ Wait for the accepted connections till the deadline. """
 
     def _accept(
         self,
         request_handler: WSGIRequestHandler
     ) -> typing.Any:
         clientsock, address = self._serversock.accept()
+        return self._handle(clientsock, request_handler)
+
+    def _handle(
+        self,
+        clientsock: socket.socket,
+        request_handler: WSGIRequestHandler
+    ) -> bool:
+        """ Serve requests of an accepted connection and close it.
+
+        Pipelined requests are answered in the order they came.
+        A request whose body can not be read is answered with
+        the status of the error rather than by the application.
+        """
+        parser = self._make_parser()
+        served = 0
+        response = None
         try:
-            request = clientsock.recv(1024).decode('utf-8')
-            logging.debug(f'Request: {request}')
-            if not request: raise
-            response = request_handler(request)
-            logging.debug(f'Response: {response}')
-            clientsock.sendall(response)
-        except Exception:
+            while True:
+                request = self._read_request(clientsock, parser, served)
+                if request is None:
+                    break
+                served += 1
+                response = request_handler(
+                    request, self._allow_keep_alive(served)
+                )
+                if parser.body_error is not None:
+                    response.close()
+                    raise parser.body_error
+                clientsock.settimeout(self._write_timeout or None)
+                response.send(clientsock)
+                if not response.keep_alive or self._stopping or \
+                        parser.body_error is not None:
+                    break
+                response = None
+        except Exception as e:
+            error = e if isinstance(e, http_exceptions.HttpParserError) \
+                else parser.body_error
+            if error is not None and \
+                    (response is None or not response.headers_sent):
+                self._send_error(clientsock, error)
+            return False
+        finally:
             clientsock.close()
+        return True
+
+    def _send_error(
+        self,
+        clientsock: socket.socket,
+        error: http_exceptions.HttpParserError
+    ) -> None:
+        """ Answer a request which can not be served and close. """
+        logging.debug('Bad request: %s', error)
+        try:
+            clientsock.settimeout(self._write_timeout or None)
+            _error_response(error.status).send(clientsock)
+        except OSError:
+            pass
+
+    def _make_parser(self) -> RequestParser:
+        return RequestParser(
+            max_header_size=self._max_header_size,
+            max_body_size=self._max_body_size,
+            body_spool_size=self._body_spool_size
+        )
+
+    def _allow_keep_alive(
+        self,
+        served: int
+    ) -> bool:
+        """ May a connection be kept open after it served a request.
+
+        Not while other connections wait for the server, so one
+        client can not hold it for max_requests requests.
+        """
+        if not self._keepalive_timeout or self._stopping or \
+                self._connections_waiting():
             return False
+        return not self._max_requests or served < self._max_requests
+
+    def _connections_waiting(self) -> bool:
+        """ Are connections waiting to be accepted. """
+        return bool(select.select([self._serversock], [], [], 0)[0])
+
+    def _read_request(
+        self,
+        clientsock: socket.socket,
+        parser: RequestParser,
+        served: typing.Optional[int]=0
+    ) -> typing.Optional[Request]:
+        """ Read the next request from a connection.
+
+        Returns None if the client closed the connection or stayed
+        idle for a keep-alive timeout. A request line and headers
+        not received within header_timeout raise RequestTimeout.
+        The request body is received when the application reads it.
+        """
+        def receive() -> bytes:
+            return self._receive_body(clientsock)
+
+        request = parser.next_request(receive)
+        if request is None and served and not parser.buffered:
+            # A persistent connection waits for the next request idle
+            data = self._receive_idle(clientsock)
+            if not data:
+                return None
+            parser.feed(data)
+            request = parser.next_request(receive)
+        # The head is timed from its first byte or the accept
+        deadline = self._deadline(self._header_timeout)
+        while request is None:
+            data = self._receive_head(clientsock, deadline)
+            if not data:
+                return None
+            parser.feed(data)
+            request = parser.next_request(receive)
+        return request
+
+    def _receive_idle(self, clientsock: socket.socket) -> bytes:
+        """ Receive the start of the next request, b'' if it does
+        not come within a keep-alive timeout or other connections
+        wait for the server meanwhile.
+        """
+        deadline = time.monotonic() + self._keepalive_timeout
+        while True:
+            timeout = min(
+                deadline - time.monotonic(), self.IDLE_POLL_INTERVAL
+            )
+            if timeout <= 0:
+                return b''
+            clientsock.settimeout(timeout)
+            try:
+                return clientsock.recv(self.RECV_SIZE)
+            except socket.timeout:
+                pass
+            if self._stopping or self._connections_waiting():
+                return b''
+
+    def _receive_head(
+        self,
+        clientsock: socket.socket,
+        deadline: typing.Optional[float]
+    ) -> bytes:
+        """ Receive a part of a request head not later than deadline. """
+        timeout = None
+        if deadline is not None:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                raise http_exceptions.RequestTimeout('Request head timeout')
+        clientsock.settimeout(timeout)
+        try:
+            return clientsock.recv(self.RECV_SIZE)
+        except socket.timeout:
+            raise http_exceptions.RequestTimeout('Request head timeout')
+
+    def _receive_body(self, clientsock: socket.socket) -> bytes:
+        """ Receive a part of a request body within body_timeout. """
+        timeout = clientsock.gettimeout()
+        clientsock.settimeout(self._body_timeout or None)
+        try:
+            return clientsock.recv(self.RECV_SIZE)
+        except socket.timeout:
+            raise http_exceptions.RequestTimeout('Request body timeout')
+        finally:
+            clientsock.settimeout(timeout)
+
+    @staticmethod
+    def _deadline(timeout: float) -> typing.Optional[float]:
+        return time.monotonic() + timeout if timeout else None
 
 
 class ThreadedHTTPServer(SimpleHTTPServer):
-    """ TCP IPv4 socket listening connection
-    in a multiple threads and
-    binded to passed hostname and port.
+    """ TCP IPv4 socket served by a fixed pool of
+    worker threads and binded to passed hostname and port.
+
+    Accepted connections are put into a bounded queue.
+    When the queue is full the connection is answered
+    with 503 Service Unavailable right away.
     """
 
-    CONNECTION_QUEUE_LIMIT = 5
+    CONNECTION_QUEUE_LIMIT = 128
     MULTITHREAD = True
+    SERVICE_UNAVAILABLE = _error_response(
+        '503 Service Unavailable'
+    ).get_response()
+
+    def __init__(
+        self,
+        host: str,
+        port: int,
+        threads: typing.Optional[int]=8,
+        queue_size: typing.Optional[int]=64,
+        **options: typing.Any
+    ) -> None:
+        super().__init__(host, port, **options)
+        self._threads_count = max(threads, 1)
+        self._connections = queue.Queue(maxsize=max(queue_size, 1))
+        self._threads = []
+
+    def process_request(
+        self,
+        request_handler: WSGIRequestHandler
+    ) -> None:
+        self._start_threads()
+        super().process_request(request_handler)
+
+    def _start_threads(self) -> None:
+        for i in range(self._threads_count):
+            thread = threading.Thread(
+                target=self._work,
+                name=f'gwsgi-worker-{i}',
+                daemon=True
+            )
+            thread.start()
+            self._threads.append(thread)
 
     def _accept(
         self,
         request_handler: WSGIRequestHandler
     ) -> None:
         clientsock, address = self._serversock.accept()
-        clientsock.settimeout(60)
-        threading.Thread(
-            target=request_handler,
-            args=(clientsock, address)
-        )
+        try:
+            # A connection is served by the handler it was accepted with
+            self._connections.put_nowait((clientsock, request_handler))
+        except queue.Full:
+            self._reject(clientsock)
+
+    def _connections_waiting(self) -> bool:
+        """ Are accepted connections waiting for a free thread. """
+        return not self._connections.empty()
+
+    def _drain(self, deadline: float) -> None:
+        """ Let the workers serve the queued connections and exit. """
+        for _ in self._threads:
+            try:
+                self._connections.put(
+                    None, timeout=max(deadline - time.monotonic(), 0)
+                )
+            except queue.Full:
+                return  # the workers are stuck, they are daemons
+        for thread in self._threads:
+            thread.join(max(deadline - time.monotonic(), 0))
+
+    def _reject(
+        self,
+        clientsock: socket.socket
+    ) -> None:
+        """ Answer 503 without reading the request. """
+        try:
+            clientsock.sendall(self.SERVICE_UNAVAILABLE)
+        except OSError:
+            pass
+        finally:
+            clientsock.close()
+
+    def _work(self) -> None:
+        while True:
+            connection = self._connections.get()
+            try:
+                if connection is None:
+                    return
+                self._handle(*connection)
+            finally:
+                self._connections.task_done()
 
 
 class MultiprocessingHTTPServer(SimpleHTTPServer):
@@ -97,8 +487,701 @@ class MultiprocessingHTTPServer(SimpleHTTPServer):
     ) -> None:
         clientsock, address = self._serversock.accept()
         process = multiprocessing.Process(
-            target=request_handler,
-            args=(clientsock, address)
+            target=self._handle,
+            args=(clientsock, request_handler)
         )
         process.daemon = True
         process.start()
+        clientsock.close()  # the child process owns the connection now
+
+    def _connections_waiting(self) -> bool:
+        """ Every connection has a process of its own. """
+        return False
+
+    def _drain(self, deadline: float) -> None:
+        """ Wait for the connection processes, then terminate them. """
+        for process in multiprocessing.active_children():
+            process.join(max(deadline - time.monotonic(), 0))
+            if process.is_alive():
+                process.terminate()
+
+
+class PreforkHTTPServer(ThreadedHTTPServer):
+    """ TCP IPv4 socket served by a pool of
+    long-lived pre-forked worker processes.
+
+    The master binds the socket once and forks ``workers`` processes
+    which accept connections on the shared listening socket.
+    Every worker serves its connections on a pool of ``threads``
+    threads, so e.g. async views overlap inside a worker. A worker
+    whose queue is full stops accepting from the shared socket and
+    leaves the connections to the other workers. With ``reuse_port``
+    the kernel has handed it the connections, so it answers 503.
+    With ``reuse_port`` every worker binds its own SO_REUSEPORT socket
+    instead and the kernel balances connections between them.
+    A worker that dies is respawned by the master.
+
+    On stop the workers are sent SIGTERM, they stop accepting,
+    finish their connections and exit; the ones still running
+    after graceful_timeout are killed. On reload the master gets
+    a new request handler and forks new workers, the old ones
+    finish their connections. The listening socket stays open.
+
+    exit_handler is called by a worker before it exits with
+    os._exit(), which skips atexit, e.g. to flush its logs.
+    """
+
+    CONNECTION_QUEUE_LIMIT = 128
+    MULTIPROCESS = True
+
+    def __init__(
+        self,
+        host: str,
+        port: int,
+        workers: typing.Optional[int]=None,
+        reuse_port: typing.Optional[bool]=False,
+        **options: typing.Any
+    ) -> None:
+        if not hasattr(os, 'fork'):
+            raise RuntimeError('Prefork server requires os.fork()')
+        self._workers_count = workers or os.cpu_count() or 1
+        self._reuse_port = reuse_port and hasattr(socket, 'SO_REUSEPORT')
+        self._workers = set()
+        self._retiring = set()  # old workers finishing their connections
+        self.exit_handler = None
+        super().__init__(host, port, **options)
+        self.MULTITHREAD = self._threads_count > 1
+
+    def _bind_socket(
+        self,
+        host: str,
+        port: int
+    ) -> socket.socket:
+        if not self._reuse_port:
+            return super()._bind_socket(host, port)
+        sock = socket.socket(self.SOCKET_FAMILY, self.SOCKET_TYPE)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        sock.bind((host, port))
+        return sock
+
+    def process_request(
+        self,
+        request_handler: WSGIRequestHandler
+    ) -> None:
+        if not self._reuse_port:
+            # Workers inherit the listening socket
+            self._serversock.listen(self.CONNECTION_QUEUE_LIMIT)
+            self._serversock.settimeout(self.POLL_INTERVAL)
+        signal.signal(signal.SIGTERM, lambda *args: self.stop())
+        try:
+            for _ in range(self._workers_count):
+                self._spawn_worker(request_handler)
+            while not self._stopping:
+                if self._reload_requested:
+                    request_handler = self._reloaded(request_handler)
+                    self._roll_workers(request_handler)
+                self._reap_workers(request_handler)
+                time.sleep(self.POLL_INTERVAL)
+        finally:
+            self._stop_workers(time.monotonic() + self._graceful_timeout)
+
+    def _spawn_worker(
+        self,
+        request_handler: WSGIRequestHandler
+    ) -> None:
+        pid = os.fork()
+        if pid:
+            self._workers.add(pid)
+            return
+
+        # Worker process: serve until stopped, never return to the master
+        exit_code = 0
+        try:
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            signal.signal(signal.SIGTERM, lambda *args: self.stop())
+            signal.signal(signal.SIGHUP, signal.SIG_IGN)  # for the master
+            self._workers.clear()
+            self._retiring.clear()
+            if self._reuse_port:
+                # The master keeps its socket bound for the life of the
+                # pool, so the port it resolved, e.g. for port 0, is kept
+                address = self._serversock.getsockname()[:2]
+                self._serversock.close()
+                self._serversock = self._bind_socket(*address)
+                self._serversock.listen(self.CONNECTION_QUEUE_LIMIT)
+                self._serversock.settimeout(self.POLL_INTERVAL)
+            self._reload_requested = False
+            self._start_threads()
+            self._serve(request_handler)
+            self._serversock.close()
+            self._drain(time.monotonic() + self._graceful_timeout)
+        except BaseException:
+            logging.exception(f'Worker {os.getpid()} failed')
+            exit_code = 1
+        finally:
+            self._exit_worker(exit_code)
+
+    def _accept(
+        self,
+        request_handler: WSGIRequestHandler
+    ) -> None:
+        if not self._reuse_port and self._connections.full():
+            # Only this thread fills the queue, it can not fill up
+            # between the check and the put of the accepted connection
+            time.sleep(self.IDLE_POLL_INTERVAL)
+            return
+        super()._accept(request_handler)
+
+    def _exit_worker(self, exit_code: int) -> None:
+        try:
+            if self.exit_handler is not None:
+                self.exit_handler()
+        except BaseException:
+            logging.exception(f'Worker {os.getpid()} exit handler failed')
+        finally:
+            os._exit(exit_code)
+
+    def _roll_workers(
+        self,
+        request_handler: WSGIRequestHandler
+    ) -> None:
+        """ Replace the workers with ones forked with the handler. """
+        old_workers = set(self._workers)
+        self._workers.clear()
+        for _ in range(self._workers_count):
+            self._spawn_worker(request_handler)
+        self._signal_workers(old_workers, signal.SIGTERM)
+        self._retiring |= old_workers
+
+    def _reap_workers(
+        self,
+        request_handler: WSGIRequestHandler
+    ) -> None:
+        """ Collect exited workers and fork replacements. """
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if not pid:
+                return
+            if pid in self._retiring:
+                self._retiring.discard(pid)
+            elif pid in self._workers:
+                self._workers.discard(pid)
+                logging.warning(
+                    f'Worker {pid} exited with status {status}, respawn'
+                )
+                self._spawn_worker(request_handler)
+
+    @staticmethod
+    def _signal_workers(
+        workers: typing.Set[int],
+        signum: int
+    ) -> None:
+        for pid in workers:
+            try:
+                os.kill(pid, signum)
+            except ProcessLookupError:
+                pass
+
+    def _stop_workers(self, deadline: float) -> None:
+        workers = self._workers | self._retiring
+        self._signal_workers(workers, signal.SIGTERM)
+        while workers and time.monotonic() < deadline:
+            for pid in list(workers):
+                try:
+                    if os.waitpid(pid, os.WNOHANG)[0]:
+                        workers.discard(pid)
+                except ChildProcessError:
+                    workers.discard(pid)
+            time.sleep(0.05)
+        self._signal_workers(workers, signal.SIGKILL)
+        for pid in workers:
+            try:
+                os.waitpid(pid, 0)
+            except ChildProcessError:
+                pass
+        self._workers.clear()
+        self._retiring.clear()
+
+
+class _Connection:
+    """ Event loop connection state.
+
+    phase is what the connection waits for: a request 'head'
+    or 'body', the next request being 'idle', the application
+    being 'busy' or the client to read the response on 'write'.
+    events are the selector events the socket is registered for,
+    0 while the application is busy, so a client is not read
+    until it has its response. eof is set once the client has
+    shut down its side, its buffered requests are still answered.
+    """
+
+    __slots__ = (
+        'sock', 'parser', 'outbuf', 'busy', 'response', 'chunks',
+        'file', 'served', 'phase', 'deadline', 'timer', 'events',
+        'eof'
+    )
+
+    def __init__(
+        self,
+        sock: socket.socket,
+        parser: RequestParser
+    ) -> None:
+        self.sock = sock
+        self.parser = parser
+        self.outbuf = b''
+        self.busy = False
+        self.response = None
+        self.chunks = None  # response body groups not sent yet
+        self.file = None  # FileWrapper being sent with os.sendfile()
+        self.served = 0
+        self.phase = None
+        self.deadline = None  # set by TimerHeap
+        self.timer = None
+        self.events = 0
+        self.eof = False
+
+
+class EventLoopHTTPServer(SimpleHTTPServer):
+    """ TCP IPv4 socket multiplexing all the connections
+    in a single selectors (epoll/kqueue) event loop and
+    binded to passed hostname and port.
+
+    Sockets are non-blocking: requests are read as data arrives
+    and the application is called once a request is complete,
+    either inline or on a pool of ``executor_threads`` threads.
+    A response pending on a future, e.g. of an async view,
+    is sent once the future is done, the loop goes on meanwhile.
+
+    Every connection has a deadline for its current phase,
+    all of them are kept in one timer heap and the loop
+    wakes up for the earliest one.
+    """
+
+    CONNECTION_QUEUE_LIMIT = 1024
+    SELECT_TIMEOUT = 1.0
+    REQUEST_TIMEOUT = _error_response('408 Request Timeout').get_response()
+
+    def __init__(
+        self,
+        host: str,
+        port: int,
+        executor_threads: typing.Optional[int]=0,
+        **options: typing.Any
+    ) -> None:
+        super().__init__(host, port, **options)
+        self._executor_threads = executor_threads
+        self.MULTITHREAD = executor_threads > 0
+        self._executor = None
+        self._selector = selectors.DefaultSelector()
+        self._finished = collections.deque()  # filled by executor threads
+        self._ready = collections.deque()  # kept alive after a response
+        self._clients = set()
+        self._timers = TimerHeap()
+        self._waker, self._wakeup_sock = socket.socketpair()
+
+    def process_request(
+        self,
+        request_handler: WSGIRequestHandler
+    ) -> None:
+        self._serversock.listen(self.CONNECTION_QUEUE_LIMIT)
+        self._serversock.setblocking(False)
+        self._waker.setblocking(False)
+        self._wakeup_sock.setblocking(False)
+        self._selector.register(
+            self._serversock, selectors.EVENT_READ, self._on_accept
+        )
+        self._selector.register(
+            self._waker, selectors.EVENT_READ, self._on_wakeup
+        )
+        if self._executor_threads:
+            self._executor = ThreadPoolExecutor(self._executor_threads)
+        deadline = None
+        try:
+            while True:
+                if self._reload_requested:
+                    request_handler = self._reloaded(request_handler)
+                if self._stopping:
+                    if deadline is None:
+                        deadline = self._stop_accepting()
+                    if self._drained(deadline):
+                        break
+                self._poll(request_handler)
+        finally:
+            for connection in self._connections():
+                self._close(connection)
+            if self._executor is not None:
+                self._executor.shutdown(wait=False)
+
+    def _connections_waiting(self) -> bool:
+        """ Idle connections cost the event loop nothing. """
+        return False
+
+    def _poll(
+        self,
+        request_handler: WSGIRequestHandler
+    ) -> None:
+        """ Handle the ready sockets and the missed deadlines. """
+        for _ in range(len(self._ready)):
+            connection = self._ready.popleft()
+            if connection.sock.fileno() >= 0:
+                self._process(connection, request_handler)
+        events = self._selector.select(self._select_timeout())
+        for key, mask in events:
+            if isinstance(key.data, _Connection):
+                self._dispatch(key.data, mask, request_handler)
+            else:
+                key.data(key.fileobj, mask, request_handler)
+        for connection in self._timers.expired(time.monotonic()):
+            self._expire(connection)
+
+    def _stop_accepting(self) -> float:
+        """ Close the listening socket, returns the drain deadline. """
+        self._selector.unregister(self._serversock)
+        self._serversock.close()
+        return time.monotonic() + self._graceful_timeout
+
+    def _drained(self, deadline: float) -> bool:
+        """ Have the connections finished or the deadline passed. """
+        self._close_finished()
+        return not self._connections() or time.monotonic() >= deadline
+
+    def _on_accept(
+        self,
+        serversock: socket.socket,
+        mask: int,
+        request_handler: WSGIRequestHandler
+    ) -> None:
+        try:
+            clientsock, address = serversock.accept()
+        except (BlockingIOError, InterruptedError):
+            return
+        clientsock.setblocking(False)
+        connection = _Connection(clientsock, self._make_parser())
+        self._clients.add(connection)
+        self._watch(connection, selectors.EVENT_READ)
+        self._await_request(connection)
+
+    def _on_wakeup(
+        self,
+        waker: socket.socket,
+        mask: int,
+        request_handler: WSGIRequestHandler
+    ) -> None:
+        try:
+            waker.recv(4096)
+        except BlockingIOError:
+            pass
+        while self._finished:
+            connection, response = self._finished.popleft()
+            self._respond(connection, response, request_handler)
+
+    def _dispatch(
+        self,
+        connection: _Connection,
+        mask: int,
+        request_handler: WSGIRequestHandler
+    ) -> None:
+        if mask & selectors.EVENT_READ:
+            self._on_read(connection, request_handler)
+        elif mask & selectors.EVENT_WRITE:
+            self._on_write(connection, request_handler)
+
+    def _on_read(
+        self,
+        connection: _Connection,
+        request_handler: WSGIRequestHandler
+    ) -> None:
+        try:
+            data = connection.sock.recv(self.RECV_SIZE)
+        except (BlockingIOError, InterruptedError):
+            return
+        except OSError:
+            data = b''
+        if not data:
+            connection.eof = True
+            self._watch(connection, 0)
+            self._process(connection, request_handler)
+            return
+        connection.parser.feed(data)
+        self._process(connection, request_handler)
+
+    def _process(
+        self,
+        connection: _Connection,
+        request_handler: WSGIRequestHandler
+    ) -> None:
+        """ Handle the next buffered request of a connection. """
+        if connection.busy:
+            return  # pipelined requests wait for the current response
+
+        try:
+            request = connection.parser.next_request()
+        except http_exceptions.HttpParserError as e:
+            logging.debug('Bad request: %s', e)
+            connection.busy = True
+            self._respond(
+                connection, _error_response(e.status), request_handler
+            )
+            return
+        if request is None:
+            if connection.eof:
+                self._close(connection)
+            else:
+                self._await_request(connection)  # wait for the rest of it
+            return
+
+        connection.busy = True
+        connection.phase = 'busy'
+        self._timers.set(connection, None)
+        connection.served += 1
+        keep_alive = self._allow_keep_alive(connection.served)
+        if self._executor is None:
+            self._respond(
+                connection,
+                self._call(request_handler, request, keep_alive),
+                request_handler
+            )
+        else:
+            self._watch(connection, 0)
+            future = self._executor.submit(
+                self._call, request_handler, request, keep_alive
+            )
+            future.add_done_callback(
+                lambda f: self._wakeup(connection, f.result())
+            )
+
+    @staticmethod
+    def _call(
+        request_handler: WSGIRequestHandler,
+        request: Request,
+        keep_alive: bool
+    ) -> typing.Optional[Response]:
+        try:
+            return request_handler(request, keep_alive)
+        except Exception:
+            logging.exception('Request handler failed')
+            return None
+
+    def _wakeup(
+        self,
+        connection: _Connection,
+        response: typing.Optional[Response]
+    ) -> None:
+        """ Pass an executor result back to the event loop thread. """
+        self._finished.append((connection, response))
+        try:
+            self._wakeup_sock.send(b'\0')
+        except BlockingIOError:
+            pass  # the loop has pending wakeups already
+
+    def _respond(
+        self,
+        connection: _Connection,
+        response: typing.Optional[Response],
+        request_handler: WSGIRequestHandler
+    ) -> None:
+        if connection.sock.fileno() < 0:
+            # The client has gone while the request was handled
+            if response is not None:
+                response.close()
+            return
+        if response is None:
+            self._close(connection)
+            return
+        if response.pending is not None and not response.pending.done():
+            self._watch(connection, 0)
+            response.pending.add_done_callback(
+                lambda future: self._wakeup(connection, response)
+            )
+            return
+        connection.response = response
+        connection.chunks = iter(response)
+        connection.phase = 'write'
+        self._timers.set(connection, self._deadline(self._write_timeout))
+        self._watch(connection, selectors.EVENT_WRITE)
+        self._on_write(connection, request_handler)
+
+    def _on_write(
+        self,
+        connection: _Connection,
+        request_handler: WSGIRequestHandler
+    ) -> None:
+        """ Send the response as the socket accepts data.
+
+        The next part of the body is produced only when
+        the previous one has been sent.
+        """
+        while True:
+            if connection.file is not None:
+                if not self._send_file(connection):
+                    return
+                continue
+            if not connection.outbuf:
+                try:
+                    group = next(connection.chunks, None)
+                except Exception:
+                    logging.exception('Response iterable failed')
+                    self._close(connection)
+                    return
+                if group is None:
+                    break  # the response has been sent
+                if isinstance(group, FileWrapper):
+                    connection.file = group
+                    continue
+                connection.outbuf = memoryview(b''.join(group))
+            if not self._send_outbuf(connection):
+                return
+        self._response_sent(connection, request_handler)
+
+    def _send_file(
+        self,
+        connection: _Connection
+    ) -> bool:
+        """ Send a file with os.sendfile(), False if it must wait
+        for the socket or the connection has been closed.
+        """
+        try:
+            connection.file.send(connection.sock)
+        except (BlockingIOError, InterruptedError):
+            return False
+        except OSError:
+            self._close(connection)
+            return False
+        self._timers.set(connection, self._deadline(self._write_timeout))
+        if not connection.file.remaining:
+            connection.file = None
+        return True
+
+    def _send_outbuf(
+        self,
+        connection: _Connection
+    ) -> bool:
+        """ Send the buffered bytes, False if a part of them must
+        wait for the socket or the connection has been closed.
+        """
+        try:
+            sent = connection.sock.send(connection.outbuf)
+        except (BlockingIOError, InterruptedError):
+            return False
+        except OSError:
+            self._close(connection)
+            return False
+        connection.outbuf = connection.outbuf[sent:]
+        self._timers.set(connection, self._deadline(self._write_timeout))
+        return not connection.outbuf
+
+    def _response_sent(
+        self,
+        connection: _Connection,
+        request_handler: WSGIRequestHandler
+    ) -> None:
+        """ Close the connection or wait for the next request. """
+        keep_alive = connection.response.keep_alive
+        connection.response = connection.chunks = None
+        if not keep_alive:
+            self._close(connection)
+            return
+
+        connection.busy = False
+        self._watch(
+            connection, 0 if connection.eof else selectors.EVENT_READ
+        )
+        # Pipelined requests are taken on the next poll, not
+        # from here, or every one of them would nest a call
+        self._ready.append(connection)
+
+    def _connections(self) -> typing.List[_Connection]:
+        return list(self._clients)
+
+    def _watch(
+        self,
+        connection: _Connection,
+        events: int
+    ) -> None:
+        """ Register the socket of a connection for the events. """
+        if events == connection.events:
+            return
+        if not events:
+            self._selector.unregister(connection.sock)
+        elif not connection.events:
+            self._selector.register(connection.sock, events, connection)
+        else:
+            self._selector.modify(connection.sock, events, connection)
+        connection.events = events
+
+    def _close_finished(self) -> None:
+        """ Close connections between requests once stopped. """
+        for connection in self._connections():
+            if not connection.busy and not connection.parser.receiving:
+                self._close(connection)
+
+    def _select_timeout(self) -> float:
+        """ Wait for events not later than the earliest deadline. """
+        if self._ready:
+            return 0
+        deadline = self._timers.next_deadline()
+        if deadline is None:
+            return self.SELECT_TIMEOUT
+        return max(min(deadline - time.monotonic(), self.SELECT_TIMEOUT), 0)
+
+    def _await_request(
+        self,
+        connection: _Connection
+    ) -> None:
+        """ Set the deadline of a connection waiting for a request.
+
+        The head deadline is counted from the first byte of a request
+        (or the accept of a connection) and is not extended, the body
+        and idle ones are counted from the last byte received.
+        """
+        parser = connection.parser
+        if parser.receiving_body:
+            connection.phase = 'body'
+            timeout = self._body_timeout
+        elif parser.receiving or not connection.served:
+            if connection.phase == 'head':
+                return
+            connection.phase = 'head'
+            timeout = self._header_timeout
+        else:
+            connection.phase = 'idle'
+            timeout = self._keepalive_timeout
+        self._timers.set(connection, self._deadline(timeout))
+
+    def _expire(
+        self,
+        connection: _Connection
+    ) -> None:
+        """ Close a connection which missed its deadline.
+
+        A client too slow to send a request is answered with
+        408 Request Timeout, if its socket accepts it at once.
+        """
+        if connection.sock.fileno() < 0:
+            return
+        if connection.phase in ('head', 'body'):
+            logging.debug('Request timeout in the %s', connection.phase)
+            try:
+                connection.sock.send(self.REQUEST_TIMEOUT)
+            except OSError:
+                pass
+        self._close(connection)
+
+    def _close(
+        self,
+        connection: _Connection
+    ) -> None:
+        if connection.chunks is not None:
+            connection.chunks.close()  # release the application iterable
+            connection.response = connection.chunks = None
+            connection.file = None
+        self._timers.set(connection, None)
+        if connection.events:
+            self._selector.unregister(connection.sock)
+            connection.events = 0
+        self._clients.discard(connection)
+        connection.sock.close()
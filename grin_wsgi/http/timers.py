@@ -0,0 +1,59 @@
+import heapq
+import itertools
+import typing
+
+
+class TimerHeap:
+    """ Deadlines of many objects, e.g. event loop connections.
+
+    An object keeps its deadline in a ``deadline`` attribute and
+    the earliest deadline it has in the heap in a ``timer`` one.
+    Moving a deadline later only changes the attribute: the heap
+    entry is moved when it comes due, so a connection receiving
+    data costs nothing however often its deadline is extended.
+    Only an earlier deadline is pushed, in O(log n).
+    """
+
+    def __init__(self) -> None:
+        self._heap = []  # [(deadline, sequence, object)]
+        self._sequence = itertools.count()  # objects are not compared
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def set(
+        self,
+        item: typing.Any,
+        deadline: typing.Optional[float]
+    ) -> None:
+        """ Set the deadline of an object, None cancels it. """
+        item.deadline = deadline
+        if deadline is not None and \
+                (item.timer is None or deadline < item.timer):
+            item.timer = deadline
+            heapq.heappush(self._heap, (deadline, next(self._sequence), item))
+
+    def next_deadline(self) -> typing.Optional[float]:
+        """ The earliest deadline, it may have been moved later. """
+        return self._heap[0][0] if self._heap else None
+
+    def expired(self, now: float) -> typing.List[typing.Any]:
+        """ Pop the objects whose deadlines have passed. """
+        expired = []
+        heap = self._heap
+        while heap and heap[0][0] <= now:
+            timer, _, item = heapq.heappop(heap)
+            if timer != item.timer:
+                continue  # an earlier entry of the object is in the heap
+            item.timer = None
+            if item.deadline is None:
+                continue
+            if item.deadline > now:
+                item.timer = item.deadline
+                heapq.heappush(
+                    heap, (item.deadline, next(self._sequence), item)
+                )
+                continue
+            item.deadline = None
+            expired.append(item)
+        return expired
@@ -1,15 +1,28 @@
 import sys
+import signal
+import shutil
 import socket
+import functools
+import tempfile
+import time
 import typing
 
-from io import StringIO
-from email.utils import formatdate
+from urllib.parse import unquote
 
-from grin_wsgi.http import Request, Response, server as http_server
+from grin_wsgi.http import Request, Response, FileWrapper, \
+    headers as http_headers, server as http_server
+from grin_wsgi.wsgi.metrics import Metrics, ROUTE_ENVIRON_KEY, \
+    CONTENT_TYPE as METRICS_CONTENT_TYPE
+from grin_wsgi.wsgi.profiling import Profiler
+from grin_wsgi.wsgi.access_log import AccessLog
+from grin_wsgi.wsgi.async_runner import AsyncRunner, \
+    ASYNC_RUNNER_ENVIRON_KEY, PENDING_ENVIRON_KEY
 
 
 __all__ = ['make_server', 'WSGIRequestHandler', 'WSGIServer']
 
+SERVER_SOFTWARE = 'WSGIServer 0.2'
+
 
 def make_server(
     host: str,
@@ -17,52 +30,203 @@ def make_server(
     application: typing.Callable,
     threading: typing.Optional[bool]=False,
     multiprocessing: typing.Optional[bool]=False,
-    wsgiref: typing.Optional[bool]=False
+    wsgiref: typing.Optional[bool]=False,
+    **server_options: typing.Any
 ) -> typing.Any:  # pragma: no cover
     """
     Create a new WSGI listening on host and port,
     accepting connections for application.
     You may create either SimpleHTTPServer or
-    Threading or Multiprocessing HTTPServer.
+    Threading, EventLoop, Multiprocessing or Prefork HTTPServer.
+    Extra server_options are passed to the HTTP server.
     """
     if wsgiref:
         from wsgiref.simple_server import make_server as wsgi_server
-    else:
-        wsgi_server = WSGIServer
+        return wsgi_server(host, port, application)
+
+    return WSGIServer(
+        host, port, application, threading, multiprocessing,
+        **server_options
+    )
+
+
+class HostNameCache:
+    """ Fully qualified names of Host header hostnames.
+
+    A name is looked up once and kept for ttl seconds.
+    Hostnames come from clients, so at most maxsize
+    of them are kept.
+    """
+
+    def __init__(
+        self,
+        ttl: float,
+        maxsize: typing.Optional[int]=1024
+    ) -> None:
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._names = {}  # {host: (name, expires at)}
 
-    return wsgi_server(host, port, application, threading, multiprocessing)
+    def get(self, host: str) -> str:
+        now = time.monotonic()
+        cached = self._names.get(host)
+        if cached is not None and cached[1] > now:
+            return cached[0]
+        name = socket.getfqdn(host)
+        if len(self._names) >= self.maxsize:
+            self._names.clear()
+        self._names[host] = (name, now + self.ttl)
+        return name
 
 
 class WSGIRequestHandler:  # pragma: no cover
     """
     Create an HTTP handler for the given request,
     client_address (a (host,port) tuple), and server (WSGIServer instance).
+
+    SERVER_NAME is the name the server resolved when it was bound.
+    With host_lookup_ttl the name the Host header hostname
+    resolves to is used instead, looked up once per ttl seconds;
+    without reverse_lookup the Host header hostname is used as is.
+
+    With metrics every request is counted and timed, the metrics
+    are served at metrics_path in Prometheus text format.
+
+    With profiler the application calls are profiled,
+    the profiler is configured at profile_path.
+
+    With access_log every response is logged once it is sent.
+
+    With async_runner the application may run coroutines, e.g. of
+    async views, on the event loop of the process. It finds the
+    runner in the environ and sets the future its response body
+    waits for, so an event loop server does not block on it.
     """
 
     def __init__(
         self,
         application: typing.Callable,
         server_multithread: typing.Optional[bool]=False,
-        server_multiprocess: typing.Optional[bool]=False
+        server_multiprocess: typing.Optional[bool]=False,
+        server_name: typing.Optional[str]='localhost',
+        server_port: typing.Optional[str]='80',
+        reverse_lookup: typing.Optional[bool]=True,
+        host_lookup_ttl: typing.Optional[float]=0,
+        metrics: typing.Optional[Metrics]=None,
+        metrics_path: typing.Optional[str]='',
+        profiler: typing.Optional[Profiler]=None,
+        profile_path: typing.Optional[str]='',
+        access_log: typing.Optional[AccessLog]=None,
+        async_runner: typing.Optional[AsyncRunner]=None
     ) -> None:
 
         self._application = application
-        self._response = Response()
-        self._request = Request()
 
         self._server_multithread = server_multithread
         self._server_multiprocess = server_multiprocess
 
+        # Shared by every thread serving requests
+        self._server_headers = http_headers.ServerHeaders(SERVER_SOFTWARE)
+
+        self._server_name = server_name
+        self._server_port = server_port
+        self._reverse_lookup = reverse_lookup
+        self._host_names = None
+        if reverse_lookup and host_lookup_ttl:
+            self._host_names = HostNameCache(host_lookup_ttl)
+
+        self._metrics = metrics
+        self._metrics_path = metrics_path
+        self._profiler = profiler
+        self._profile_path = profile_path
+        self._access_log = access_log
+        self._async_runner = async_runner
+
     def __call__(
         self,
-        request: str
-    ) -> bytes:
-        """ Process the HTTP request. """
-        self._request.plain_request = request
-        env = self._get_environ(self._request)
-        response_body = self._application(env, self._start_response)
+        request: Request,
+        keep_alive: typing.Optional[bool]=False
+    ) -> Response:
+        """ Process the HTTP request.
+
+        keep_alive tells if the server allows the connection
+        to stay open. The returned response streams
+        the application body when it is iterated
+        and tells whether the connection should be kept open.
+        """
+        response = Response()
+        env = self._get_environ(request)
+        if self._profile_path and request.path == self._profile_path:
+            return self._text_response(
+                request, keep_alive,
+                *self._profiler.admin(request.query_string)
+            )
+        if self._metrics is not None:
+            if request.path == self._metrics_path:
+                return self._text_response(
+                    request, keep_alive, '200 OK',
+                    self._metrics.exposition(), METRICS_CONTENT_TYPE
+                )
+            self._metrics.started()
+        if self._metrics is not None or self._access_log is not None:
+            response.on_close = functools.partial(
+                self._request_finished, request, env, time.perf_counter()
+            )
+        start_response = functools.partial(self._start_response, response)
+        try:
+            if self._profiler is not None:
+                response.body = self._profiler.call(
+                    env, self._application, env, start_response
+                )
+            else:
+                response.body = self._application(env, start_response)
+        except BaseException:
+            if response.on_close is not None:
+                response.on_close(response, 0)
+            raise
+        response.keep_alive = keep_alive and request.keep_alive
+        response.head = request.method == 'HEAD'
+        response.chunked = request.version == 'HTTP/1.1'
+        response.pending = env.get(PENDING_ENVIRON_KEY)
+        return response
+
+    def _text_response(
+        self,
+        request: Request,
+        keep_alive: bool,
+        status: str,
+        body: typing.Union[str, bytes],
+        content_type: typing.Optional[str]='text/plain; charset=utf-8'
+    ) -> Response:
+        """ Response of the server itself, e.g. the metrics. """
+        if isinstance(body, str):
+            body = body.encode('utf-8')
+        response = Response()
+        response.status = status
+        response.headers = [('Content-Type', content_type)]
+        response.body = [body]
+        response.server_headers = self._server_headers.get()
+        response.keep_alive = keep_alive and request.keep_alive
+        response.head = request.method == 'HEAD'
+        return response
 
-        return self._finish_response(response_body)
+    def _request_finished(
+        self,
+        request: Request,
+        env: typing.Dict[str, typing.Any],
+        started: float,
+        response: Response,
+        bytes_out: int
+    ) -> None:
+        duration = time.perf_counter() - started
+        if self._metrics is not None:
+            self._metrics.finished(
+                (response.status or '500')[:3],
+                env.get(ROUTE_ENVIRON_KEY, ''),
+                int(request.content_length or 0), bytes_out, duration
+            )
+        if self._access_log is not None:
+            self._access_log.log(request, response, bytes_out, duration)
 
     def _get_environ(
         self,
@@ -76,49 +240,76 @@ class WSGIRequestHandler:  # pragma: no cover
         # Required UWSGI variables
         env['wsgi.version'] = (1, 0)
         env['wsgi.url_scheme'] = 'http'
-        env['wsgi.input'] = StringIO(request.body)
+        env['wsgi.input'] = request.body
+        env['wsgi.input_terminated'] = True
         env['wsgi.errors'] = sys.stderr
         env['wsgi.multithread'] = self._server_multithread
         env['wsgi.multiprocess'] = self._server_multiprocess
         env['wsgi.run_once'] = False
+        env['wsgi.file_wrapper'] = FileWrapper
+        if self._async_runner is not None:
+            env[ASYNC_RUNNER_ENVIRON_KEY] = self._async_runner
 
         # Required CGI variables
-        env['METHOD'] = request.method
-        env['PATH_INFO'] = request.uri
-        env['SERVER_NAME'] = socket.getfqdn(request.host)
-        env['SERVER_PORT'] = request.port
+        env['REQUEST_METHOD'] = request.method
+        env['METHOD'] = request.method  # kept for older applications
+        env['SCRIPT_NAME'] = ''
+        # Percent-decoded like wsgiref does, the query string is apart
+        env['PATH_INFO'] = unquote(request.path, 'latin-1') \
+            if '%' in request.path else request.path
+        env['SERVER_NAME'] = self._get_server_name(request)
+        env['SERVER_PORT'] = self._server_port
         env['QUERY_STRING'] = request.query_string
         env['CONTENT_LENGTH'] = request.content_length
+        env['CONTENT_TYPE'] = request.headers.get('content-type', '')
+        for name, value in request.headers.items():
+            if name not in ('content-type', 'content-length'):
+                env[f'HTTP_{name.upper().replace("-", "_")}'] = value
 
         return env
 
+    def _get_server_name(self, request: Request) -> str:
+        """ SERVER_NAME without a DNS lookup per request. """
+        if not self._reverse_lookup:
+            return request.host or self._server_name
+        if self._host_names is not None and request.host:
+            return self._host_names.get(request.host)
+        return self._server_name
+
     def _start_response(
         self,
+        response: Response,
         status: str,
         response_headers: typing.List[typing.Tuple[str, str]],
         exc_info: typing.Optional=None
     ) -> None:
-        server_headers = [
-            ('Date', formatdate(timeval=None, localtime=False, usegmt=True)),
-            ('Server', 'WSGIServer 0.2')
-        ]
+        if exc_info is not None and response.headers_sent:
+            raise exc_info[1].with_traceback(exc_info[2])
 
-        self._response.status = status
-        self._response.headers = response_headers + server_headers
-
-    def _finish_response(self, response_body):
-        self._response.body = response_body
-        return self._response.get_response()
+        response.status = status
+        response.headers = response_headers
+        response.server_headers = self._server_headers.get()
 
 
 class WSGIServer:
     """
     Create a WSGIServer instance.
+
+    SIGTERM stops the server gracefully: no new connections are
+    accepted and the accepted ones are given graceful_timeout
+    seconds to finish. SIGHUP reloads the application with
+    reloader, if it is given, and serves the next connections
+    with it; pre-forked workers are replaced by new ones.
+
+    Coroutines of async views run on an event loop of every
+    process, async_concurrency of them at once.
     """
     http_server_factory = {
         'simple': http_server.SimpleHTTPServer,
         'threading': http_server.ThreadedHTTPServer,
-        'processing': http_server.MultiprocessingHTTPServer
+        'eventloop': http_server.EventLoopHTTPServer,
+        'processing': http_server.MultiprocessingHTTPServer,
+        'prefork': http_server.PreforkHTTPServer
     }
 
     def __init__(
@@ -126,29 +317,124 @@ class WSGIServer:
         host: str,
         port: int,
         application: typing.Callable,
-        threads: typing.Optional[bool]=False,
-        multiprocs: typing.Optional[bool]=False
+        threading: typing.Optional[bool]=False,
+        processing: typing.Optional[bool]=False,
+        reloader: typing.Optional[typing.Callable[[], typing.Callable]]=None,
+        **server_options: typing.Any
     ) -> None:
-        self._server = self._make_server(host, port, threads, multiprocs)
+        self._server = self._make_server(
+            host, port, threading, processing, server_options
+        )
         self._application = application
+        self._reloader = reloader
+        self._reverse_lookup = server_options.get('reverse_lookup', True)
+        self._host_lookup_ttl = server_options.get('host_lookup_ttl', 0)
+        self._metrics_path = server_options.get('metrics_path', '')
+        self._profile_dir = server_options.get('profile_dir', '')
+        self._profile_sample_rate = \
+            server_options.get('profile_sample_rate', 0.0)
+        self._profile_slow_threshold = \
+            server_options.get('profile_slow_threshold', 0.0)
+        self._profile_path = server_options.get('profile_path', '')
+        self._access_log = server_options.get('access_log', '')
+        self._access_log_sample_rate = \
+            server_options.get('access_log_sample_rate', 1.0)
+        self._access_log_dumps = server_options.get('access_log_dumps', 0)
+        self._async_concurrency = \
+            server_options.get('async_concurrency', 100)
 
     def _make_server(
         self,
         host: str,
         port: int,
-        threads: bool,
-        processing: bool
+        threading: bool,
+        processing: bool,
+        server_options: typing.Dict[str, typing.Any]
     ) -> typing.Any:
         server_type = 'simple'
-        if threads: server_type = 'threading'
+        if threading: server_type = 'threading'
+        if server_options.get('eventloop'): server_type = 'eventloop'
         if processing: server_type = 'processing'
+        if server_options.get('workers'): server_type = 'prefork'
 
-        return self.http_server_factory[server_type](host, port)
+        return self.http_server_factory[server_type](
+            host, port, **server_options
+        )
 
     def serve_forever(self) -> None:
-        """ Handle requests until an explicit shutdown() request. """
-        request_handler = WSGIRequestHandler(
-            self._application,
+        """ Handle requests until the server is stopped with SIGTERM. """
+        metrics = metrics_directory = None
+        if self._metrics_path:
+            if self._server.MULTIPROCESS:
+                # Workers share their counters through files
+                metrics_directory = tempfile.mkdtemp(prefix='gwsgi-metrics-')
+            metrics = Metrics(
+                metrics_directory,
+                # A process per connection exits after the last request
+                dump_interval=0 if isinstance(
+                    self._server, http_server.MultiprocessingHTTPServer
+                ) else 1.0
+            )
+        profiler = None
+        if self._profile_dir:
+            profiler = Profiler(
+                self._profile_dir,
+                self._profile_sample_rate, self._profile_slow_threshold
+            )
+            # Forked processes inherit the handler
+            signal.signal(signal.SIGUSR1, lambda *args: profiler.toggle())
+        access_log = None
+        if self._access_log:
+            access_log = AccessLog(
+                self._access_log,
+                self._access_log_sample_rate, self._access_log_dumps,
+                # A process per connection exits after the last request
+                background=not isinstance(
+                    self._server, http_server.MultiprocessingHTTPServer
+                )
+            )
+            signal.signal(signal.SIGUSR2, lambda *args: access_log.dump())
+        make_handler = functools.partial(
+            WSGIRequestHandler,
             server_multithread=self._server.MULTITHREAD,
-            server_multiprocess=self._server.MULTIPROCESS)
-        self._server.process_request(request_handler)
+            server_multiprocess=self._server.MULTIPROCESS,
+            server_name=self._server.server_name,
+            server_port=self._server.server_port,
+            reverse_lookup=self._reverse_lookup,
+            host_lookup_ttl=self._host_lookup_ttl,
+            metrics=metrics,
+            metrics_path=self._metrics_path,
+            profiler=profiler,
+            profile_path=self._profile_path if profiler else '',
+            access_log=access_log,
+            # The loop thread is started by the first async view
+            async_runner=AsyncRunner(self._async_concurrency))
+        self._server.reload_handler = \
+            lambda: make_handler(self._reload_application())
+        if isinstance(self._server, http_server.PreforkHTTPServer):
+            self._server.exit_handler = functools.partial(
+                self._exit_worker, metrics, access_log
+            )
+        signal.signal(signal.SIGTERM, lambda *args: self._server.stop())
+        signal.signal(signal.SIGHUP, lambda *args: self._server.reload())
+        try:
+            self._server.process_request(make_handler(self._application))
+        finally:
+            if metrics_directory is not None:
+                shutil.rmtree(metrics_directory, ignore_errors=True)
+
+    @staticmethod
+    def _exit_worker(
+        metrics: typing.Optional[Metrics],
+        access_log: typing.Optional[AccessLog]
+    ) -> None:
+        """ Keep what a pre-forked worker has in memory. """
+        if access_log is not None:
+            access_log.close()
+        if metrics is not None:
+            metrics.dump()
+
+    def _reload_application(self) -> typing.Callable:
+        if self._reloader is not None:
+            self._application = self._reloader()
+        return self._application
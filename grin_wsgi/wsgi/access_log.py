@@ -0,0 +1,164 @@
+import atexit
+import collections
+import os
+import random
+import sys
+import threading
+import time
+import typing
+
+
+__all__ = ['AccessLog']
+
+# time "method uri version" status bytes seconds
+LINE_FORMAT = '{} "{} {} {}" {} {} {:.6f}\n'.format
+
+
+class AccessLog:
+    """ Access log written by a background thread.
+
+    A request only appends a record to a queue, the writer
+    thread formats the queued records and writes them at once
+    every FLUSH_INTERVAL seconds. At most queue_size records
+    wait for the writer, the oldest ones are dropped if it
+    falls behind.
+
+    path
+        log file path, ``-`` is the standard output
+
+    sample_rate
+        fraction of the requests logged, server errors
+        are always logged
+
+    dumps
+        number of the last requests, sampled or not, kept in
+        memory with their headers and the beginning of the
+        response body, they are written to the log by dump()
+
+    background
+        False writes every record at once, e.g. in a process
+        exiting after its connection
+    """
+
+    FLUSH_INTERVAL = 0.1
+    DUMP_BODY_SIZE = 1024
+
+    def __init__(
+        self,
+        path: str,
+        sample_rate: typing.Optional[float]=1.0,
+        dumps: typing.Optional[int]=0,
+        queue_size: typing.Optional[int]=65536,
+        background: typing.Optional[bool]=True
+    ) -> None:
+        self.path = path
+        self.sample_rate = sample_rate
+        self.background = background
+        self._file = sys.stdout if path == '-' else \
+            open(path, 'a', encoding='utf-8')
+        self._records = collections.deque(maxlen=queue_size)
+        self._dumps = collections.deque(maxlen=dumps) if dumps else None
+        self._write_lock = threading.Lock()
+        self._writer = None
+        self._second = (None, '')  # (second, formatted time)
+        os.register_at_fork(after_in_child=self._reset)
+        atexit.register(self.flush)
+
+    def _reset(self) -> None:
+        """ A forked process starts its own writer. """
+        self._records.clear()
+        if self._dumps is not None:
+            self._dumps.clear()
+        self._write_lock = threading.Lock()
+        self._writer = None
+
+    def log(
+        self,
+        request: typing.Any,
+        response: typing.Any,
+        bytes_sent: int,
+        duration: float
+    ) -> None:
+        now = time.time()
+        if self._dumps is not None:
+            self._dumps.append((now, request, response))
+        status = response.status or '500'
+        if self.sample_rate < 1.0 and not status.startswith('5') and \
+                random.random() >= self.sample_rate:
+            return
+        self._records.append((
+            now, request.method, request.uri, request.version,
+            status[:3], bytes_sent, duration
+        ))
+        if not self.background:
+            self.flush()
+        elif self._writer is None:
+            self._start_writer()
+
+    def _start_writer(self) -> None:
+        with self._write_lock:
+            if self._writer is None:
+                self._writer = threading.Thread(
+                    target=self._write_forever, daemon=True
+                )
+                self._writer.start()
+
+    def _write_forever(self) -> None:  # pragma: no cover
+        while True:
+            time.sleep(self.FLUSH_INTERVAL)
+            self.flush()
+
+    def flush(self) -> None:
+        """ Write the queued records. """
+        lines = []
+        records = self._records
+        while True:
+            try:
+                record = records.popleft()
+            except IndexError:
+                break
+            lines.append(LINE_FORMAT(self._time(record[0]), *record[1:]))
+        if lines:
+            self._write(''.join(lines))
+
+    def close(self) -> None:
+        """ Write the queued records and close the log file. """
+        self.flush()
+        if self._file is not sys.stdout:
+            self._file.close()
+
+    def dump(self) -> None:
+        """ Write the requests kept in memory, e.g. on a signal. """
+        if self._dumps is None:
+            return
+        dumps = list(self._dumps)
+        self._dumps.clear()
+        text = []
+        for now, request, response in dumps:
+            text.append(
+                f'--- {self._time(now)} {request.method} {request.uri} '
+                f'{request.version}\n'
+            )
+            text += (
+                f'{name}: {value}\n' for name, value in request.headers.items()
+            )
+            text.append(f'--- {response.status}\n')
+            text += (f'{name}: {value}\n' for name, value in response.headers)
+            if isinstance(response.body, (list, tuple)):
+                body = b''.join(response.body)[:self.DUMP_BODY_SIZE]
+                text.append(f'\n{body.decode("utf-8", "replace")}\n')
+        self._write(''.join(text))
+
+    def _write(self, text: str) -> None:
+        with self._write_lock:
+            self._file.write(text)
+            self._file.flush()
+
+    def _time(self, timestamp: float) -> str:
+        second = int(timestamp)
+        if self._second[0] != second:
+            self._second = (
+                second,
+                time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(second))
+            )
+        return self._second[1]
@@ -0,0 +1,76 @@
+import asyncio
+import concurrent.futures
+import os
+import threading
+import typing
+
+
+__all__ = ['AsyncRunner']
+
+# environ key an application finds the runner of its coroutines at
+ASYNC_RUNNER_ENVIRON_KEY = 'grin_wsgi.async_runner'
+# environ key an application sets to the future its response waits for
+PENDING_ENVIRON_KEY = 'grin_wsgi.pending'
+
+
+class AsyncRunner:
+    """ Event loop of a process running the coroutines of async views.
+
+    The loop runs in a daemon thread started with the first
+    coroutine, a forked process starts its own one. So the
+    coroutines of the requests served by one process overlap
+    while they wait for I/O.
+
+    concurrency
+        coroutines run at once, the others wait for
+        a free slot, 0 means no limit
+    """
+
+    def __init__(
+        self,
+        concurrency: typing.Optional[int]=100
+    ) -> None:
+        self.concurrency = concurrency
+        self._lock = threading.Lock()
+        self._loop = None
+        self._semaphore = None
+        os.register_at_fork(after_in_child=self._reset)
+
+    def _reset(self) -> None:
+        """ The loop thread does not survive a fork. """
+        self._lock = threading.Lock()
+        self._loop = None
+        self._semaphore = None
+
+    def submit(
+        self,
+        coroutine: typing.Awaitable
+    ) -> concurrent.futures.Future:
+        """ Schedule a coroutine, the future is done with its result. """
+        loop = self._loop or self._start()
+        return asyncio.run_coroutine_threadsafe(self._run(coroutine), loop)
+
+    def run(self, coroutine: typing.Awaitable) -> typing.Any:
+        """ Run a coroutine and wait for its result. """
+        return self.submit(coroutine).result()
+
+    async def _run(self, coroutine: typing.Awaitable) -> typing.Any:
+        if not self.concurrency:
+            return await coroutine
+        if self._semaphore is None:
+            # Created on the loop thread, so it is bound to the loop
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        async with self._semaphore:
+            return await coroutine
+
+    def _start(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(
+                    target=loop.run_forever,
+                    name='gwsgi-asyncio',
+                    daemon=True
+                ).start()
+                self._loop = loop
+        return self._loop
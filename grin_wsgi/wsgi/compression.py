@@ -0,0 +1,340 @@
+import collections
+import threading
+import typing
+import zlib
+
+from grin_wsgi.http import FileWrapper
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover
+    brotli = None
+
+
+__all__ = ['CompressionMiddleware']
+
+# Content codings in the order of preference
+ENCODINGS = ('br', 'gzip', 'deflate') if brotli is not None else \
+    ('gzip', 'deflate')
+COMPRESSIBLE_TYPES = (
+    'text/', 'application/json', 'application/javascript',
+    'application/xml', 'application/xhtml+xml', 'image/svg+xml'
+)
+# Streamed event by event, buffering them in a compressor breaks clients
+STREAMED_TYPES = ('text/event-stream',)
+
+
+class _BrotliCompressor:
+    """ Brotli compressor with the zlib compressobj interface. """
+
+    def __init__(self, quality: int) -> None:
+        self._compressor = brotli.Compressor(quality=quality)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.process(data)
+
+    def flush(self) -> bytes:
+        return self._compressor.finish()
+
+
+class CompressionMiddleware:
+    """ Compress responses of a WSGI application.
+
+    The content coding is negotiated with Accept-Encoding:
+    br (if the brotli package is installed), gzip or deflate.
+    Only textual content types are compressed, responses
+    shorter than min_size bytes or already encoded ones are sent
+    as they are.
+
+    A list body is compressed at once, any other iterable
+    is compressed as it is produced. Compressed bodies of
+    responses with an ETag, e.g. static files, are kept in
+    an LRU cache of cache_size entries up to max_cached_size
+    bytes each, so they are compressed only once.
+    """
+
+    def __init__(
+        self,
+        application: typing.Callable,
+        min_size: typing.Optional[int]=1024,
+        level: typing.Optional[int]=6,
+        cache_size: typing.Optional[int]=256,
+        max_cached_size: typing.Optional[int]=1048576
+    ) -> None:
+        self.application = application
+        self.min_size = min_size
+        self.level = level
+        self.max_cached_size = max_cached_size
+        self._cache = _CompressedCache(cache_size)
+        self._negotiated = {}  # {Accept-Encoding: content coding}
+
+    def __call__(
+        self,
+        environ: typing.Dict[str, typing.Any],
+        start_response: typing.Callable
+    ) -> typing.Iterable[bytes]:
+        encoding = None
+        if environ.get('REQUEST_METHOD') != 'HEAD':
+            encoding = self._negotiate(environ.get('HTTP_ACCEPT_ENCODING'))
+        response = []  # status, headers and exc_info of the application
+
+        def capture_response(status, headers, exc_info=None):
+            response[:] = [status, headers, exc_info]
+
+        body = self.application(environ, capture_response)
+        if not response:
+            return self._compress_stream(body, response, encoding,
+                                         start_response)
+
+        status, headers, exc_info = response
+        if status.startswith('304') and encoding is not None:
+            headers = _not_modified(
+                headers, encoding, environ.get('HTTP_IF_NONE_MATCH')
+            )
+        if not self._compressible(status, headers):
+            start_response(status, headers, exc_info)
+            return body  # a file is still sent with os.sendfile()
+        if encoding is None:
+            start_response(status, _vary(headers), exc_info)
+            return body
+        if isinstance(body, (list, tuple)) or \
+                isinstance(body, FileWrapper) and \
+                _header(headers, 'etag') is not None and \
+                body.remaining is not None and \
+                body.remaining <= self.max_cached_size:
+            return self._compress_body(body, response, encoding,
+                                       start_response)
+        return self._compress_stream(body, response, encoding,
+                                     start_response)
+
+    def _negotiate(
+        self,
+        accept_encoding: typing.Optional[str]
+    ) -> typing.Optional[str]:
+        """ The preferred content coding a client accepts. """
+        if not accept_encoding:
+            return None
+        try:
+            return self._negotiated[accept_encoding]
+        except KeyError:
+            pass
+        qvalues = {}
+        for coding in accept_encoding.lower().split(','):
+            coding, _, params = coding.partition(';')
+            qvalue = 1.0
+            params = params.strip()
+            if params.startswith('q='):
+                try:
+                    qvalue = float(params[2:])
+                except ValueError:
+                    qvalue = 0.0
+            qvalues[coding.strip()] = qvalue
+        encoding = max(
+            (encoding for encoding in ENCODINGS
+             if qvalues.get(encoding, qvalues.get('*', 0.0)) > 0),
+            key=lambda encoding: qvalues.get(encoding, qvalues.get('*')),
+            default=None
+        )
+        if len(self._negotiated) < 1024:  # headers come from clients
+            self._negotiated[accept_encoding] = encoding
+        return encoding
+
+    def _compress_body(
+        self,
+        body: typing.Iterable[bytes],
+        response: typing.List,
+        encoding: typing.Optional[str],
+        start_response: typing.Callable
+    ) -> typing.Iterable[bytes]:
+        """ Compress a body known in advance. """
+        status, headers, exc_info = response
+        headers = _vary(headers)
+        etag = _header(headers, 'etag')
+        cached = None
+        if etag is not None:
+            cached = self._cache.get((etag, encoding))
+        if cached is not None:
+            if hasattr(body, 'close'):
+                body.close()
+            start_response(
+                status, _encoded(headers, encoding), exc_info
+            )
+            return [cached]
+
+        try:
+            data = b''.join(body)
+        finally:
+            if hasattr(body, 'close'):
+                body.close()
+        if len(data) < self.min_size:
+            start_response(status, headers, exc_info)
+            return [data]
+
+        compressor = self._compressor(encoding)
+        compressed = compressor.compress(data) + compressor.flush()
+        if etag is not None and len(compressed) <= self.max_cached_size:
+            self._cache.set((etag, encoding), compressed)
+        start_response(status, _encoded(headers, encoding), exc_info)
+        return [compressed]
+
+    def _compress_stream(
+        self,
+        body: typing.Iterable[bytes],
+        response: typing.List,
+        encoding: typing.Optional[str],
+        start_response: typing.Callable
+    ) -> typing.Iterator[bytes]:
+        """ Compress a body as the application produces it. """
+        chunks = iter(body)
+        try:
+            # The application may call start_response() lazily
+            first = next((chunk for chunk in chunks if chunk), b'')
+            if not response:
+                raise RuntimeError('start_response() was not called')
+            status, headers, exc_info = response
+            if not self._compressible(status, headers):
+                start_response(status, headers, exc_info)
+                yield first
+                yield from chunks
+                return
+
+            headers = _vary(headers)
+            length = _header(headers, 'content-length')
+            if encoding is None or \
+                    length is not None and int(length) < self.min_size:
+                start_response(status, headers, exc_info)
+                yield first
+                yield from chunks
+                return
+
+            compressor = self._compressor(encoding)
+            start_response(status, _encoded(headers, encoding), exc_info)
+            yield compressor.compress(first)
+            for chunk in chunks:
+                yield compressor.compress(chunk)
+            yield compressor.flush()
+        finally:
+            if hasattr(body, 'close'):
+                body.close()
+
+    @staticmethod
+    def _compressible(
+        status: str,
+        headers: typing.List[typing.Tuple[str, str]]
+    ) -> bool:
+        if not status.startswith('2') or status.startswith('204'):
+            return False
+        content_type = (_header(headers, 'content-type') or '').lower()
+        if not content_type.startswith(COMPRESSIBLE_TYPES) or \
+                content_type.startswith(STREAMED_TYPES):
+            return False
+        if _header(headers, 'content-encoding') is not None:
+            return False
+        return 'no-transform' not in \
+            (_header(headers, 'cache-control') or '').lower()
+
+    def _compressor(self, encoding: str) -> typing.Any:
+        if encoding == 'br':
+            return _BrotliCompressor(quality=self.level)
+        if encoding == 'gzip':
+            return zlib.compressobj(self.level, zlib.DEFLATED, 31)
+        return zlib.compressobj(self.level)
+
+
+class _CompressedCache:
+    """ Bounded LRU cache of compressed bodies. """
+
+    def __init__(self, maxsize: int) -> None:
+        self.maxsize = maxsize
+        self._bodies = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: typing.Tuple[str, str]) -> typing.Optional[bytes]:
+        with self._lock:
+            body = self._bodies.get(key)
+            if body is not None:
+                self._bodies.move_to_end(key)
+            return body
+
+    def set(self, key: typing.Tuple[str, str], body: bytes) -> None:
+        if not self.maxsize:
+            return
+        with self._lock:
+            self._bodies[key] = body
+            if len(self._bodies) > self.maxsize:
+                self._bodies.popitem(last=False)
+
+
+def _header(
+    headers: typing.List[typing.Tuple[str, str]],
+    name: str
+) -> typing.Optional[str]:
+    for header_name, value in headers:
+        if header_name.lower() == name:
+            return value
+    return None
+
+
+def _vary(
+    headers: typing.List[typing.Tuple[str, str]]
+) -> typing.List[typing.Tuple[str, str]]:
+    """ Tell caches the response depends on Accept-Encoding. """
+    vary = _header(headers, 'vary')
+    if vary is None:
+        return headers + [('Vary', 'Accept-Encoding')]
+    if 'accept-encoding' in vary.lower() or vary.strip() == '*':
+        return headers
+    return [
+        (name, f'{value}, Accept-Encoding' if name.lower() == 'vary'
+         else value)
+        for name, value in headers
+    ]
+
+
+def _encoded(
+    headers: typing.List[typing.Tuple[str, str]],
+    encoding: str
+) -> typing.List[typing.Tuple[str, str]]:
+    """ Headers of a compressed response.
+
+    Content-Length is dropped as the length changes and an ETag
+    gets the coding appended, as it is another representation.
+    """
+    encoded = []
+    for name, value in headers:
+        lower_name = name.lower()
+        if lower_name == 'content-length':
+            continue
+        if lower_name == 'etag':
+            value = _encoded_etag(value, encoding)
+        encoded.append((name, value))
+    encoded.append(('Content-Encoding', encoding))
+    return encoded
+
+
+def _encoded_etag(etag: str, encoding: str) -> str:
+    """ ETag of a representation, e.g. "abc" -> "abc-gzip" """
+    if not etag.endswith('"'):
+        return etag
+    return f'{etag[:-1]}-{encoding}"'
+
+
+def _not_modified(
+    headers: typing.List[typing.Tuple[str, str]],
+    encoding: str,
+    if_none_match: typing.Optional[str]
+) -> typing.List[typing.Tuple[str, str]]:
+    """ Headers of a 304 to a client holding a compressed representation.
+
+    The ETag is the one the client has got with the compressed 200.
+    """
+    etag = _header(headers, 'etag')
+    if etag is None or not if_none_match:
+        return headers
+    encoded_etag = _encoded_etag(etag, encoding)
+    if encoded_etag == etag or encoded_etag not in if_none_match:
+        return headers
+    return _vary([
+        (name, encoded_etag if name.lower() == 'etag' else value)
+        for name, value in headers
+    ])
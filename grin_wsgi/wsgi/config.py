@@ -1,10 +1,12 @@
+import sys
 import typing
 
 from configparser import ConfigParser
-from importlib import import_module
+from importlib import import_module, invalidate_caches
 
 from grin_wsgi import const
 from grin_wsgi.wsgi import exceptions as gwsgi_exceptions
+from grin_wsgi.wsgi.compression import CompressionMiddleware
 
 
 Namespace = typing.TypeVar('Namespace')
@@ -36,10 +38,62 @@ class WSGIConfig:
     port
         port to run WSGI server upon
 
+    keepalive_timeout
+        seconds an idle persistent HTTP/1.1 connection is
+        kept open. Persistent connections are disabled if it is 0
+
+    header_timeout
+        seconds a client is given to send a request line and
+        headers, counted from the first byte of the request or
+        from the accept of a connection. A client that is too
+        slow is answered with 408 Request Timeout, 0 means no limit
+
+    body_timeout
+        seconds a request body may stall between two reads
+        before the client is answered with 408, 0 means no limit
+
+    write_timeout
+        seconds a response may stall between two writes
+        before the connection is closed, 0 means no limit
+
+    max_requests
+        number of requests served over one persistent
+        connection. There is no limit if it is 0
+
+    max_header_size
+        request line and headers size limit in bytes.
+        Larger requests are answered with 431 status
+
+    max_body_size
+        request body size limit in bytes, 0 means no limit.
+        Larger requests are answered with 413 status
+
+    body_spool_size
+        request body size kept in memory. A larger body
+        is spooled to a temporary file
+
     threading
         if argument is passed, WSGI server would accept
         data in a number of threads
 
+    threads
+        number of worker threads in a threading mode,
+        and of every worker process in a prefork mode
+
+    queue_size
+        number of accepted connections waiting for a free
+        worker thread. Connections over the limit are
+        answered with 503 Service Unavailable
+
+    eventloop
+        if argument is passed, WSGI server would multiplex
+        all the connections in a single event loop
+
+    executor_threads
+        number of threads running the application in an
+        event loop mode. The application is called inline
+        in the event loop if it is 0
+
     processing
         if argument is passed, WSGI server would accept
         data in a number of processes
@@ -48,6 +102,72 @@ class WSGIConfig:
         if argument is passed, wsgiref WSGI server would
         be running instead og GWSGI server
 
+    workers
+        number of pre-forked worker processes.
+        If it is greater than zero, WSGI server would
+        run in a prefork mode
+
+    reuse_port
+        if argument is passed, each pre-forked worker would
+        bind its own SO_REUSEPORT socket
+
+    reverse_lookup
+        SERVER_NAME is the fully qualified server name
+        resolved once the socket is bound.
+        If it is false, no DNS lookups are made and
+        the Host header hostname is used as is
+
+    host_lookup_ttl
+        if it is greater than zero, SERVER_NAME is the name
+        the Host header hostname resolves to, cached for that
+        many seconds
+
+    compression
+        if argument is passed, responses are compressed
+        according to the Accept-Encoding request header
+
+    metrics_path
+        path serving request metrics in Prometheus text format,
+        e.g. /metrics. Requests are not measured if it is empty
+
+    profile_dir
+        directory profiles of requests are dumped to as pstats
+        files. Requests are not profiled if it is empty.
+        SIGUSR1 toggles profiling on and off
+
+    profile_sample_rate
+        fraction of requests profiled, e.g. 0.01
+
+    profile_slow_threshold
+        seconds a request takes to be slow, the next request
+        to a slow path is profiled. 0 disables it
+
+    profile_path
+        path configuring the profiler at runtime, e.g.
+        /_profile?enable=1&sample_rate=0.01&slow_threshold=0.5.
+        Keep it away from public traffic
+
+    access_log
+        access log file path, - is the standard output.
+        Responses are not logged if it is empty
+
+    access_log_sample_rate
+        fraction of requests logged, server errors
+        are always logged
+
+    access_log_dumps
+        number of the last requests kept in memory with their
+        headers and the beginning of the response body.
+        SIGUSR2 writes them to the access log
+
+    graceful_timeout
+        seconds the accepted connections are given to finish
+        once SIGTERM stops the server
+
+    async_concurrency
+        number of async views run at once on the event loop
+        of a server process, 0 means no limit
+
     ini config file example
     -----------------------
     .. note:: always use [gwsgi] section
@@ -56,40 +176,149 @@ class WSGIConfig:
         module = project_name.app
         host = localhost
         port = 8051
+        keepalive_timeout = 5
+        header_timeout = 10
+        body_timeout = 30
+        write_timeout = 30
+        max_requests = 100
+        max_header_size = 65536
+        max_body_size = 0
+        body_spool_size = 1048576
         threading = false
+        threads = 8
+        queue_size = 64
+        eventloop = false
+        executor_threads = 0
         processing = false
         wsgiref = false
+        workers = 0
+        reuse_port = false
+        reverse_lookup = true
+        host_lookup_ttl = 0
+        compression = false
+        metrics_path = /metrics
+        profile_dir =
+        profile_sample_rate = 0
+        profile_slow_threshold = 0
+        profile_path =
+        access_log =
+        access_log_sample_rate = 1
+        access_log_dumps = 0
+        graceful_timeout = 30
+        async_concurrency = 100
     """
 
+    # (option name, ConfigParser getter, default value)
+    OPTIONS = (
+        ('chdir', 'get', const.CHDIR),
+        ('module', 'get', const.TEST_FRAMEWORK_MODULE),
+        ('host', 'get', const.HOST),
+        ('port', 'getint', const.PORT),
+        ('keepalive_timeout', 'getfloat', const.KEEPALIVE_TIMEOUT),
+        ('header_timeout', 'getfloat', const.HEADER_TIMEOUT),
+        ('body_timeout', 'getfloat', const.BODY_TIMEOUT),
+        ('write_timeout', 'getfloat', const.WRITE_TIMEOUT),
+        ('max_requests', 'getint', const.MAX_REQUESTS),
+        ('max_header_size', 'getint', const.MAX_HEADER_SIZE),
+        ('max_body_size', 'getint', const.MAX_BODY_SIZE),
+        ('body_spool_size', 'getint', const.BODY_SPOOL_SIZE),
+        ('threading', 'getboolean', const.THREADING),
+        ('threads', 'getint', const.THREADS),
+        ('queue_size', 'getint', const.QUEUE_SIZE),
+        ('eventloop', 'getboolean', const.EVENTLOOP),
+        ('executor_threads', 'getint', const.EXECUTOR_THREADS),
+        ('processing', 'getboolean', const.PROCESSING),
+        ('wsgiref', 'getboolean', const.WSGIREF),
+        ('workers', 'getint', const.WORKERS),
+        ('reuse_port', 'getboolean', const.REUSE_PORT),
+        ('reverse_lookup', 'getboolean', const.REVERSE_LOOKUP),
+        ('host_lookup_ttl', 'getfloat', const.HOST_LOOKUP_TTL),
+        ('compression', 'getboolean', const.COMPRESSION),
+        ('metrics_path', 'get', const.METRICS_PATH),
+        ('profile_dir', 'get', const.PROFILE_DIR),
+        ('profile_sample_rate', 'getfloat', const.PROFILE_SAMPLE_RATE),
+        ('profile_slow_threshold', 'getfloat', const.PROFILE_SLOW_THRESHOLD),
+        ('profile_path', 'get', const.PROFILE_PATH),
+        ('access_log', 'get', const.ACCESS_LOG),
+        ('access_log_sample_rate', 'getfloat', const.ACCESS_LOG_SAMPLE_RATE),
+        ('access_log_dumps', 'getint', const.ACCESS_LOG_DUMPS),
+        ('graceful_timeout', 'getfloat', const.GRACEFUL_TIMEOUT),
+        ('async_concurrency', 'getint', const.ASYNC_CONCURRENCY),
+    )
+    # Options read again when the application is reloaded
+    RELOADED_OPTIONS = ('chdir', 'module', 'compression')
+    # Options passed to make_server() as keyword arguments
+    SERVER_OPTIONS = (
+        'keepalive_timeout', 'header_timeout', 'body_timeout',
+        'write_timeout', 'max_requests', 'max_header_size',
+        'max_body_size', 'body_spool_size',
+        'threads', 'queue_size',
+        'eventloop', 'executor_threads',
+        'workers', 'reuse_port', 'reverse_lookup', 'host_lookup_ttl',
+        'metrics_path', 'profile_dir', 'profile_sample_rate',
+        'profile_slow_threshold', 'profile_path',
+        'access_log', 'access_log_sample_rate', 'access_log_dumps',
+        'graceful_timeout', 'async_concurrency',
+    )
+
     def configure_gwsgi(
         self,
         conf_args: Namespace
     ) -> None:  # pragma: no cover
-        ini = conf_args.ini
-        if ini:
-            (
-                chdir, module,
-                host, port,
-                threading, processing,
-                wsgiref
-            ) = self._parse_ini(ini)
+        self.ini = conf_args.ini
+        if self.ini:
+            values = self._parse_ini(self.ini)
         else:
-            chdir = conf_args.chdir
-            module = conf_args.module
-            host = conf_args.host
-            port = conf_args.port
-            threading = conf_args.threading
-            processing = conf_args.processing
-            wsgiref = conf_args.wsgiref
-
-        self.application = self._get_application(
-            chdir, module
-        )
-        self.host = host
-        self.port = port
-        self.threading = threading
-        self.processing = processing
-        self.wsgiref = wsgiref
+            values = tuple(
+                getattr(conf_args, name) for name, _, _ in self.OPTIONS
+            )
+
+        for (name, _, _), value in zip(self.OPTIONS, values):
+            setattr(self, name, value)
+        self.application = self._load_application()
+
+    def reload_application(self) -> typing.Callable:  # pragma: no cover
+        """ Import the application module again, e.g. on SIGHUP.
+
+        The application settings of an ini file (chdir, module
+        and compression) are read again, the other ones need
+        a restart.
+        """
+        if self.ini:
+            values = dict(zip(
+                (name for name, _, _ in self.OPTIONS),
+                self._parse_ini(self.ini)
+            ))
+            for name in self.RELOADED_OPTIONS:
+                setattr(self, name, values[name])
+        self._forget_modules(self.module)
+        self.application = self._load_application()
+        return self.application
+
+    def _load_application(self) -> typing.Callable:
+        application = self._get_application(self.chdir, self.module)
+        if self.compression:
+            application = CompressionMiddleware(application)
+        return application
+
+    @staticmethod
+    def _forget_modules(module: str) -> None:
+        """ Drop the module and its package modules to import them anew.
+
+        The server own package is kept, only the module is dropped.
+        """
+        package = module.split('.')[0]
+        if package == __name__.split('.')[0]:
+            package = module
+        for name in list(sys.modules):
+            if name in (module, package) or \
+                    name.startswith((f'{module}.', f'{package}.')):
+                del sys.modules[name]
+        invalidate_caches()
+
+    @property
+    def server_options(self) -> typing.Dict[str, typing.Any]:
+        return {name: getattr(self, name) for name in self.SERVER_OPTIONS}
 
     def _parse_ini(
         self,
@@ -109,15 +338,11 @@ class WSGIConfig:
                 'Please set [gwsgi] section in an ini file'
             )
 
-        return (
-            gwsgi_conf.get('chdir') or const.CHDIR,
-            gwsgi_conf.get('module') or const.TEST_FRAMEWORK_MODULE,
-            gwsgi_conf.get('host') or const.HOST,
-            gwsgi_conf.getint('port') or const.PORT,
-            gwsgi_conf.getboolean('threading') or const.THREADING,
-            gwsgi_conf.getboolean('processing') or const.PROCESSING,
-            gwsgi_conf.getboolean('wsgiref') or const.WSGIREF,
-        )
+        values = []
+        for name, getter, default in self.OPTIONS:
+            value = getattr(gwsgi_conf, getter)(name)
+            values.append(default if value in (None, '') else value)
+        return tuple(values)
 
     def _get_application(
         self,
@@ -0,0 +1,270 @@
+import bisect
+import fcntl
+import json
+import os
+import threading
+import time
+import typing
+import uuid
+
+
+__all__ = ['Metrics']
+
+# environ key a framework sets to the name of the route it dispatched to
+ROUTE_ENVIRON_KEY = 'grin_wsgi.route'
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+ARCHIVE_FILE = 'archive.json'
+LOCK_FILE = '.lock'
+
+
+class _Counters:
+    """ Counters of one thread, only the thread changes them. """
+
+    __slots__ = ('requests', 'in_flight', 'bytes_in', 'bytes_out',
+                 'durations')
+
+    def __init__(self) -> None:
+        self.requests = {}  # {status code: count}
+        self.in_flight = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        # {route: [count per bucket..., count over buckets, sum]}
+        self.durations = {}
+
+
+class Metrics:
+    """ Request metrics in Prometheus text format.
+
+    Every thread counts its requests in its own counters, so
+    nothing is locked per request; the counters are summed up
+    when the metrics are collected.
+
+    In a multiprocess mode every process writes its counters
+    to a file in directory, once per dump_interval seconds
+    by a background thread, or after every request if it is 0.
+    The files of all the processes are summed up on collection,
+    those of exited processes are merged into an archive.
+    """
+
+    BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+    def __init__(
+        self,
+        directory: typing.Optional[str]=None,
+        dump_interval: typing.Optional[float]=1.0
+    ) -> None:
+        self.directory = directory
+        self.dump_interval = dump_interval
+        self._reset()
+        os.register_at_fork(after_in_child=self._reset)
+
+    def _reset(self) -> None:
+        """ A forked process starts its own counters. """
+        self._local = threading.local()
+        self._counters = []
+        self._lock = threading.Lock()
+        self._dumper = None
+        self._file = None
+        if self.directory is not None:
+            self._file = os.path.join(
+                self.directory, f'{os.getpid()}-{uuid.uuid4().hex[:8]}.json'
+            )
+
+    def counters(self) -> _Counters:
+        """ Counters of the calling thread. """
+        try:
+            return self._local.counters
+        except AttributeError:
+            pass
+        counters = _Counters()
+        with self._lock:
+            self._counters.append(counters)
+            if self._file is not None and self.dump_interval and \
+                    self._dumper is None:
+                self._dumper = threading.Thread(
+                    target=self._dump_forever, daemon=True
+                )
+                self._dumper.start()
+        self._local.counters = counters
+        return counters
+
+    def started(self) -> None:
+        self.counters().in_flight += 1
+
+    def finished(
+        self,
+        status: str,
+        route: str,
+        bytes_in: int,
+        bytes_out: int,
+        duration: float
+    ) -> None:
+        counters = self.counters()
+        counters.in_flight -= 1
+        counters.requests[status] = counters.requests.get(status, 0) + 1
+        counters.bytes_in += bytes_in
+        counters.bytes_out += bytes_out
+        histogram = counters.durations.get(route)
+        if histogram is None:
+            histogram = counters.durations[route] = \
+                [0] * (len(self.BUCKETS) + 1) + [0.0]
+        histogram[bisect.bisect_left(self.BUCKETS, duration)] += 1
+        histogram[-1] += duration
+        if self._file is not None and not self.dump_interval:
+            self.dump()
+
+    def snapshot(self) -> typing.Dict[str, typing.Any]:
+        """ Counters of this process. """
+        snapshot = _empty()
+        with self._lock:
+            counters = list(self._counters)
+        for thread_counters in counters:
+            _merge(snapshot, {
+                # Copied at once, threads keep counting meanwhile
+                'requests': thread_counters.requests.copy(),
+                'in_flight': thread_counters.in_flight,
+                'bytes_in': thread_counters.bytes_in,
+                'bytes_out': thread_counters.bytes_out,
+                'durations': {
+                    route: list(histogram) for route, histogram in
+                    thread_counters.durations.copy().items()
+                },
+            })
+        return snapshot
+
+    def dump(self) -> None:
+        """ Write the counters of this process to its file. """
+        temp_file = f'{self._file}.tmp'
+        with open(temp_file, 'w') as f:
+            json.dump(self.snapshot(), f)
+        os.replace(temp_file, self._file)
+
+    def _dump_forever(self) -> None:  # pragma: no cover
+        while True:
+            time.sleep(self.dump_interval)
+            try:
+                self.dump()
+            except OSError:
+                return  # the directory is removed on server exit
+
+    def collect(self) -> typing.Dict[str, typing.Any]:
+        """ Counters of all the processes. """
+        snapshot = self.snapshot()
+        if self.directory is None:
+            return snapshot
+        with open(os.path.join(self.directory, LOCK_FILE), 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            archive_file = os.path.join(self.directory, ARCHIVE_FILE)
+            archive = _load(archive_file) or _empty()
+            archived = []
+            for name in os.listdir(self.directory):
+                path = os.path.join(self.directory, name)
+                if not name.endswith('.json') or \
+                        path in (archive_file, self._file):
+                    continue
+                process_snapshot = _load(path)
+                if process_snapshot is None:
+                    continue
+                if _alive(int(name.split('-', 1)[0])):
+                    _merge(snapshot, process_snapshot)
+                else:
+                    process_snapshot['in_flight'] = 0
+                    _merge(archive, process_snapshot)
+                    archived.append(path)
+            if archived:
+                with open(f'{archive_file}.tmp', 'w') as f:
+                    json.dump(archive, f)
+                os.replace(f'{archive_file}.tmp', archive_file)
+                for path in archived:
+                    os.remove(path)
+        _merge(snapshot, archive)
+        return snapshot
+
+    def exposition(self) -> bytes:
+        """ Collected metrics in Prometheus text format. """
+        snapshot = self.collect()
+        lines = [
+            '# HELP grin_requests_total Requests served by status code.',
+            '# TYPE grin_requests_total counter',
+        ]
+        for status, count in sorted(snapshot['requests'].items()):
+            lines.append(
+                f'grin_requests_total{{status="{_label(status)}"}} {count}'
+            )
+        lines += [
+            '# HELP grin_requests_in_flight Requests being served.',
+            '# TYPE grin_requests_in_flight gauge',
+            f'grin_requests_in_flight {snapshot["in_flight"]}',
+            '# HELP grin_request_bytes_total Request body bytes received.',
+            '# TYPE grin_request_bytes_total counter',
+            f'grin_request_bytes_total {snapshot["bytes_in"]}',
+            '# HELP grin_response_bytes_total Response bytes sent.',
+            '# TYPE grin_response_bytes_total counter',
+            f'grin_response_bytes_total {snapshot["bytes_out"]}',
+            '# HELP grin_request_duration_seconds Request latency by route.',
+            '# TYPE grin_request_duration_seconds histogram',
+        ]
+        name = 'grin_request_duration_seconds'
+        for route, histogram in sorted(snapshot['durations'].items()):
+            route = _label(route)
+            cumulative = 0
+            for bound, count in zip(self.BUCKETS + ('+Inf',), histogram):
+                cumulative += count
+                lines.append(
+                    f'{name}_bucket{{route="{route}",le="{bound}"}} '
+                    f'{cumulative}'
+                )
+            lines.append(f'{name}_sum{{route="{route}"}} {histogram[-1]}')
+            lines.append(f'{name}_count{{route="{route}"}} {cumulative}')
+        lines.append('')
+        return '\n'.join(lines).encode('utf-8')
+
+
+def _empty() -> typing.Dict[str, typing.Any]:
+    return {
+        'requests': {}, 'in_flight': 0, 'bytes_in': 0, 'bytes_out': 0,
+        'durations': {}
+    }
+
+
+def _merge(
+    snapshot: typing.Dict[str, typing.Any],
+    other: typing.Dict[str, typing.Any]
+) -> None:
+    """ Add the other snapshot counters to the snapshot. """
+    for status, count in other['requests'].items():
+        snapshot['requests'][status] = \
+            snapshot['requests'].get(status, 0) + count
+    for name in ('in_flight', 'bytes_in', 'bytes_out'):
+        snapshot[name] += other[name]
+    for route, histogram in other['durations'].items():
+        total = snapshot['durations'].get(route)
+        if total is None:
+            snapshot['durations'][route] = list(histogram)
+        else:
+            snapshot['durations'][route] = [
+                a + b for a, b in zip(total, histogram)
+            ]
+
+
+def _load(path: str) -> typing.Optional[typing.Dict[str, typing.Any]]:
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _label(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"') \
+        .replace('\n', '\\n')
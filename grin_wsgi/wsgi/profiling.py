@@ -0,0 +1,177 @@
+import cProfile
+import json
+import os
+import random
+import re
+import time
+import typing
+
+from urllib.parse import parse_qs
+
+from grin_wsgi.wsgi.metrics import ROUTE_ENVIRON_KEY
+
+
+__all__ = ['Profiler']
+
+UNSAFE_FILENAME_CHARS = re.compile(r'[^\w.-]+')
+
+
+class Profiler:
+    """ Profile the application calls with cProfile.
+
+    sample_rate
+        fraction of the requests profiled, e.g. 0.01
+
+    slow_threshold
+        seconds a request takes to be slow. Once a request to
+        a path is slow, the next request to the path is profiled
+        and its profile is kept if it is slow as well, at most
+        once per SLOW_PROFILE_INTERVAL seconds per path
+
+    Profiles are dumped to directory as pstats files, each one
+    with a .json file holding the request method, path, route
+    and duration. Profiling is toggled at runtime with
+    toggle(), e.g. on a signal, or with configure().
+    """
+
+    SLOW_PROFILE_INTERVAL = 60
+    MAX_PATHS = 1024
+
+    def __init__(
+        self,
+        directory: str,
+        sample_rate: typing.Optional[float]=0.0,
+        slow_threshold: typing.Optional[float]=0.0
+    ) -> None:
+        self.directory = directory
+        self.sample_rate = sample_rate
+        self.slow_threshold = slow_threshold
+        self.enabled = bool(sample_rate or slow_threshold)
+        self._armed = set()  # paths of the requests found slow
+        self._slow_profiles = {}  # {path: last slow profile time}
+        os.makedirs(directory, exist_ok=True)
+
+    def toggle(self) -> bool:
+        self.enabled = not self.enabled
+        return self.enabled
+
+    def configure(
+        self,
+        enabled: typing.Optional[bool]=None,
+        sample_rate: typing.Optional[float]=None,
+        slow_threshold: typing.Optional[float]=None
+    ) -> None:
+        if sample_rate is not None:
+            self.sample_rate = sample_rate
+        if slow_threshold is not None:
+            self.slow_threshold = slow_threshold
+        if enabled is not None:
+            self.enabled = enabled
+
+    def status(self) -> str:
+        return (
+            f'enabled={int(self.enabled)} sample_rate={self.sample_rate} '
+            f'slow_threshold={self.slow_threshold}\n'
+        )
+
+    def admin(self, query_string: str) -> typing.Tuple[str, str]:
+        """ Configure the profiler from query arguments.
+
+        Example: enable=1&sample_rate=0.01&slow_threshold=0.5
+        -> ('200 OK', 'enabled=1 sample_rate=0.01 slow_threshold=0.5')
+        """
+        args = {
+            name: values[-1] for name, values in parse_qs(query_string).items()
+        }
+        try:
+            self.configure(
+                enabled=args['enable'] not in ('0', 'false')
+                if 'enable' in args else None,
+                sample_rate=float(args['sample_rate'])
+                if 'sample_rate' in args else None,
+                slow_threshold=float(args['slow_threshold'])
+                if 'slow_threshold' in args else None
+            )
+        except ValueError as e:
+            return '400 Bad Request', f'{e}\n'
+        return '200 OK', self.status()
+
+    def call(
+        self,
+        environ: typing.Dict[str, typing.Any],
+        application: typing.Callable,
+        *args: typing.Any
+    ) -> typing.Any:
+        """ Call the application, profiling it if the request is chosen. """
+        if not self.enabled:
+            return application(*args)
+        path = environ['PATH_INFO']
+        reason = None
+        if self.sample_rate and random.random() < self.sample_rate:
+            reason = 'sampled'
+        elif path in self._armed:
+            self._armed.discard(path)
+            reason = 'slow'
+
+        started = time.perf_counter()
+        if reason is None:
+            result = application(*args)
+            if self.slow_threshold and \
+                    time.perf_counter() - started >= self.slow_threshold:
+                self._arm(path)
+            return result
+
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:  # pragma: no cover
+            # Another profiler is active, e.g. on another thread
+            return application(*args)
+        try:
+            return application(*args)
+        finally:
+            profile.disable()
+            duration = time.perf_counter() - started
+            if reason == 'sampled' or duration >= self.slow_threshold:
+                self._dump(profile, environ, reason, duration)
+
+    def _arm(self, path: str) -> None:
+        """ Profile the next request to a slow path. """
+        now = time.monotonic()
+        if now - self._slow_profiles.get(path, -self.SLOW_PROFILE_INTERVAL) \
+                < self.SLOW_PROFILE_INTERVAL:
+            return
+        if len(self._slow_profiles) >= self.MAX_PATHS:
+            self._slow_profiles.clear()  # paths come from clients
+        if len(self._armed) >= self.MAX_PATHS:
+            self._armed.clear()
+        self._slow_profiles[path] = now
+        self._armed.add(path)
+
+    def _dump(
+        self,
+        profile: cProfile.Profile,
+        environ: typing.Dict[str, typing.Any],
+        reason: str,
+        duration: float
+    ) -> None:
+        route = environ.get(ROUTE_ENVIRON_KEY, '')
+        name = UNSAFE_FILENAME_CHARS.sub(
+            '_', route or environ['PATH_INFO']
+        ).strip('_')[:64]
+        path = os.path.join(
+            self.directory,
+            f'{time.time():.6f}-{os.getpid()}-{name}-'
+            f'{duration * 1000:.0f}ms.prof'
+        )
+        profile.dump_stats(path)
+        with open(f'{path[:-len(".prof")]}.json', 'w') as f:
+            json.dump({
+                'method': environ.get('REQUEST_METHOD'),
+                'path': environ['PATH_INFO'],
+                'route': route,
+                'reason': reason,
+                'duration': duration,
+                'time': time.time(),
+                'pid': os.getpid(),
+            }, f)
@@ -30,10 +30,64 @@ def parse_args() -> typing.Callable:
         '--port', type=int, default=const.PORT,
         help='Server port.'
     )
+    parser.add_argument(
+        '--keepalive-timeout', type=float, default=const.KEEPALIVE_TIMEOUT,
+        help='Seconds to keep an idle connection open (0 disables it).'
+    )
+    parser.add_argument(
+        '--header-timeout', type=float, default=const.HEADER_TIMEOUT,
+        help='Seconds a client is given to send a request line and headers '
+             '(0 means no limit).'
+    )
+    parser.add_argument(
+        '--body-timeout', type=float, default=const.BODY_TIMEOUT,
+        help='Seconds a request body may stall between two reads '
+             '(0 means no limit).'
+    )
+    parser.add_argument(
+        '--write-timeout', type=float, default=const.WRITE_TIMEOUT,
+        help='Seconds a response may stall between two writes '
+             '(0 means no limit).'
+    )
+    parser.add_argument(
+        '--max-requests', type=int, default=const.MAX_REQUESTS,
+        help='Requests served over one connection (0 means no limit).'
+    )
+    parser.add_argument(
+        '--max-header-size', type=int, default=const.MAX_HEADER_SIZE,
+        help='Request line and headers size limit in bytes.'
+    )
+    parser.add_argument(
+        '--max-body-size', type=int, default=const.MAX_BODY_SIZE,
+        help='Request body size limit in bytes (0 means no limit).'
+    )
+    parser.add_argument(
+        '--body-spool-size', type=int, default=const.BODY_SPOOL_SIZE,
+        help='Request body size kept in memory, '
+             'larger bodies are spooled to a temporary file.'
+    )
     parser.add_argument(
         '--threading', action='store_true',
         help='Do you want to run server in many threads?'
     )
+    parser.add_argument(
+        '--threads', type=int, default=const.THREADS,
+        help='Number of worker threads in a threading mode '
+             'and per worker process in a prefork mode.'
+    )
+    parser.add_argument(
+        '--queue-size', type=int, default=const.QUEUE_SIZE,
+        help='Accepted connections waiting for a worker thread.'
+    )
+    parser.add_argument(
+        '--eventloop', action='store_true',
+        help='Do you want to run server in a single event loop?'
+    )
+    parser.add_argument(
+        '--executor-threads', type=int, default=const.EXECUTOR_THREADS,
+        help='Threads running the application in an event loop mode '
+             '(0 runs it inline).'
+    )
     parser.add_argument(
         '--processing', action='store_true',
         help='Do you want to run server in many processes?'
@@ -42,6 +96,74 @@ def parse_args() -> typing.Callable:
         '--wsgiref', action='store_true',
         help='Do you want to run wsgiref WSGIServer?'
     )
+    parser.add_argument(
+        '--workers', type=int, default=const.WORKERS,
+        help='Number of pre-forked worker processes (0 disables prefork).'
+    )
+    parser.add_argument(
+        '--reuse-port', action='store_true',
+        help='Bind a SO_REUSEPORT socket in each pre-forked worker.'
+    )
+    parser.add_argument(
+        '--no-reverse-lookup', dest='reverse_lookup', action='store_false',
+        help='Do not resolve SERVER_NAME with DNS lookups.'
+    )
+    parser.add_argument(
+        '--host-lookup-ttl', type=float, default=const.HOST_LOOKUP_TTL,
+        help='Seconds a name resolved from the Host header is cached '
+             '(0 uses the server name resolved once on bind).'
+    )
+    parser.add_argument(
+        '--compression', action='store_true',
+        help='Compress responses with gzip, deflate or brotli.'
+    )
+    parser.add_argument(
+        '--metrics-path', default=const.METRICS_PATH,
+        help='Path serving Prometheus metrics, e.g. /metrics '
+             '(metrics are disabled if it is empty).'
+    )
+    parser.add_argument(
+        '--profile-dir', default=const.PROFILE_DIR,
+        help='Directory profiles of requests are dumped to '
+             '(profiling is disabled if it is empty).'
+    )
+    parser.add_argument(
+        '--profile-sample-rate', type=float,
+        default=const.PROFILE_SAMPLE_RATE,
+        help='Fraction of requests profiled.'
+    )
+    parser.add_argument(
+        '--profile-slow-threshold', type=float,
+        default=const.PROFILE_SLOW_THRESHOLD,
+        help='Seconds a request takes to have its path profiled '
+             '(0 disables it).'
+    )
+    parser.add_argument(
+        '--profile-path', default=const.PROFILE_PATH,
+        help='Path configuring the profiler, e.g. /_profile?enable=1.'
+    )
+    parser.add_argument(
+        '--access-log', default=const.ACCESS_LOG,
+        help='Access log file path, - is stdout (disabled if it is empty).'
+    )
+    parser.add_argument(
+        '--access-log-sample-rate', type=float,
+        default=const.ACCESS_LOG_SAMPLE_RATE,
+        help='Fraction of requests logged, server errors are always logged.'
+    )
+    parser.add_argument(
+        '--access-log-dumps', type=int, default=const.ACCESS_LOG_DUMPS,
+        help='Last requests kept in memory with their headers, '
+             'written to the access log on SIGUSR2.'
+    )
+    parser.add_argument(
+        '--graceful-timeout', type=float, default=const.GRACEFUL_TIMEOUT,
+        help='Seconds connections are given to finish on SIGTERM.'
+    )
+    parser.add_argument(
+        '--async-concurrency', type=int, default=const.ASYNC_CONCURRENCY,
+        help='Async views run at once in a process (0 means no limit).'
+    )
     def _parse_args(args):
         return parser.parse_args(args)
 
@@ -0,0 +1,214 @@
+import asyncio
+
+import pytest
+
+from grin_wsgi.framework.app import Project
+from grin_wsgi.framework.http import HttpResponse
+
+
+@pytest.fixture
+def project():
+    project = Project()
+    root = project.register_app('root')
+    api = project.register_app('api', url_prefix='api')
+    api_v2 = project.register_app('api_v2', url_prefix='api/v2')
+
+    @root.route(r'^(.*)$')
+    def index(request, *args):
+        return HttpResponse('root')
+
+    @api.route(r'/(.*)$')
+    def api_view(request, *args):
+        return HttpResponse('api')
+
+    @api_v2.route(r'/users$')
+    def users(request):
+        return HttpResponse('api v2')
+
+    return project
+
+
+@pytest.mark.parametrize('url, body', [
+    ('', b'root'),
+    ('blog/post', b'root'),
+    ('api/users', b'api'),
+    ('api/v1/users', b'api'),
+    ('api/v2/users', b'api v2'),
+    ('apiv2/users', b'root'),
+])
+def test_dispatch_selects_app_by_longest_url_prefix(project, url, body):
+    assert project.dispatch(url, None).body == body
+
+
+def test_dispatch_does_not_fall_back_from_prefixed_app(project):
+    assert project.dispatch('api/v2/groups', None).status == \
+        '404 NOT FOUND'
+
+
+def test_register_app_with_used_url_prefix(project):
+    with pytest.raises(Exception):
+        project.register_app('api_v2_copy', url_prefix='api/v2/')
+
+
+def test_resolved_urls_are_cached(project):
+    project.dispatch('api/users', None)
+    project.dispatch('api/users', None)
+    project.dispatch('api/v2/groups', None)
+    project.dispatch('api/v2/groups', None)
+
+    info = project.route_cache.info()
+    assert (info.hits, info.misses, info.currsize) == (2, 2, 2)
+
+
+def test_route_cache_is_invalidated_by_new_route():
+    project = Project()
+    app = project.register_app('app')
+    assert project.dispatch('groups', None).status == '404 NOT FOUND'
+
+    @app.route(r'^groups$')
+    def groups(request):
+        return HttpResponse('groups')
+
+    assert len(project.route_cache) == 0
+    assert project.dispatch('groups', None).body == b'groups'
+
+
+def test_route_cache_is_bounded():
+    from grin_wsgi.framework.urls import RouteCache
+
+    cache = RouteCache(maxsize=2)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    cache.get('a')
+    cache.set('c', 3)
+
+    assert cache.get('b') is None
+    assert cache.get('a') == 1
+
+
+def make_request(**headers):
+    from grin_wsgi.framework.http import HttpRequest
+
+    environ = {'REQUEST_METHOD': 'GET', 'QUERY_STRING': ''}
+    environ.update(
+        (f'HTTP_{name.upper()}', value) for name, value in headers.items()
+    )
+    return HttpRequest(environ)
+
+
+@pytest.fixture
+def cached_project():
+    project = Project(response_cache_bytes=10)
+    app = project.register_app('app')
+    calls = []
+
+    @app.route(r'^hello$', cache_ttl=60, cache_vary=['Accept-Language'])
+    def hello(request):
+        calls.append(request)
+        return HttpResponse(request.headers.get('accept-language', 'en'))
+
+    project.calls = calls
+    return project
+
+
+def test_cached_view_is_called_once(cached_project):
+    first = cached_project.dispatch('hello', make_request())
+    second = cached_project.dispatch('hello', make_request())
+    german = cached_project.dispatch('hello', make_request(
+        accept_language='de'
+    ))
+
+    assert len(cached_project.calls) == 2
+    assert second is first
+    assert (first.body, german.body) == (b'en', b'de')
+    assert dict(first.headers)['ETag'].startswith('"')
+
+
+def test_cached_view_answers_conditional_get(cached_project):
+    response = cached_project.dispatch('hello', make_request())
+    etag = dict(response.headers)['ETag']
+    last_modified = dict(response.headers)['Last-Modified']
+
+    for request in (make_request(if_none_match=f'"x", W/{etag}'),
+                    make_request(if_modified_since=last_modified)):
+        not_modified = cached_project.dispatch('hello', request)
+        assert not_modified.status.startswith('304')
+        assert not_modified.body == b''
+        assert dict(not_modified.headers)['Vary'] == 'Accept-Language'
+    assert dict(response.headers)['Vary'] == 'Accept-Language'
+    assert len(cached_project.calls) == 1
+
+
+def test_response_cache_expires_and_is_bounded(cached_project, monkeypatch):
+    from grin_wsgi.framework import cache
+
+    now = [1000.0]
+    monkeypatch.setattr(cache.time, 'monotonic', lambda: now[0])
+    cached_project.dispatch('hello', make_request())
+    now[0] += 61
+    cached_project.dispatch('hello', make_request())
+    assert len(cached_project.calls) == 2
+
+    for language in ('de', 'fr', 'it', 'es', 'pl', 'uk'):
+        cached_project.dispatch('hello', make_request(
+            accept_language=language
+        ))
+    assert len(cached_project.response_cache) == 5  # 10 body bytes
+
+
+@pytest.fixture
+def async_project():
+    project = Project()
+    app = project.register_app('app')
+
+    @app.route(r'^hello$')
+    async def hello(request):
+        await asyncio.sleep(0)
+        return HttpResponse(f'hello {request.data.get("name")}')
+
+    @app.route(r'^broken$')
+    async def broken(request):
+        raise ValueError('broken')
+
+    return project
+
+
+def call(project, path, **environ):
+    environ.update(REQUEST_METHOD='GET', PATH_INFO=path, QUERY_STRING='')
+    status = []
+    body = project(environ, lambda *args: status.append(args[0]))
+    return environ, status, b''.join(body)
+
+
+def test_async_view_is_run_without_an_async_runner(async_project):
+    environ, status, body = call(async_project, '/hello')
+    assert (status, body) == (['200 OK'], b'hello None')
+
+    environ, status, body = call(async_project, '/broken')
+    assert status == ['500 SERVER Error']
+    assert body.endswith(b'ValueError: broken')
+
+
+def test_async_view_response_waits_for_the_async_runner(async_project):
+    from grin_wsgi.wsgi.async_runner import AsyncRunner
+
+    runner = AsyncRunner(concurrency=1)
+    environ, status, body = call(
+        async_project, '/hello', **{'grin_wsgi.async_runner': runner}
+    )
+    assert environ['grin_wsgi.pending'].done()
+    assert (status, body) == (['200 OK'], b'hello None')
+
+
+def test_route_of_a_stacked_view_is_labelled_by_the_view_name():
+    project = Project()
+    app = project.register_app('app')
+
+    @app.route(r'^hello$')
+    @app.route(r'^hi$')
+    def hello(request):
+        return HttpResponse('hello')
+
+    for path in ('/hello', '/hi'):
+        environ, status, body = call(project, path)
+        assert environ['grin_wsgi.route'].endswith('.hello')
@@ -0,0 +1,59 @@
+import io
+
+from grin_wsgi.framework.http import HttpRequest, QueryDict
+
+
+def make_environ(method='GET', query_string='', body=b'', **environ):
+    environ.update({
+        'REQUEST_METHOD': method,
+        'PATH_INFO': '/',
+        'QUERY_STRING': query_string,
+        'CONTENT_LENGTH': str(len(body)),
+        'wsgi.input': io.BytesIO(body),
+    })
+    return environ
+
+
+def test_query_dict_percent_decodes_and_keeps_every_value():
+    query_dict = QueryDict.parse('name=J%C3%BCrgen+M&tag=a&tag=b%3Bc&flag')
+
+    assert query_dict.get('name') == 'Jürgen M'
+    assert query_dict.get('tag') == ['a', 'b;c']
+    assert query_dict.getlist('name') == ['Jürgen M']
+    assert query_dict.get('flag', 'missing') == 'missing'
+    assert query_dict['tag'] == ['a', 'b;c']
+
+
+def test_request_reads_body_only_when_data_is_used():
+    environ = make_environ('POST', 'page=2', b'name=alex')
+    request = HttpRequest(environ)
+
+    assert request.args.get('page') == '2'
+    assert environ['wsgi.input'].tell() == 0
+    assert request.data.get('name') == 'alex'
+
+
+def test_request_exposes_headers_and_environ_variables():
+    request = HttpRequest(make_environ(
+        HTTP_X_REQUEST_ID='42', CONTENT_TYPE='text/plain',
+        SERVER_NAME='example.com'
+    ))
+
+    assert request.headers['x-request-id'] == '42'
+    assert request.headers['content-type'] == 'text/plain'
+    assert request.server_name == 'example.com'
+    assert request.data == {}
+
+
+def test_request_parses_multipart_form_data():
+    body = (
+        b'--b\r\nContent-Disposition: form-data; name="name"\r\n\r\nalex\r\n'
+        b'--b\r\nContent-Disposition: form-data; name="avatar"; '
+        b'filename="me.png"\r\n\r\nPNG\r\n--b--\r\n'
+    )
+    request = HttpRequest(make_environ(
+        'POST', body=body, CONTENT_TYPE='multipart/form-data; boundary=b'
+    ))
+
+    assert request.data.get('name') == 'alex'
+    assert request.files.get('avatar').read() == b'PNG'
@@ -0,0 +1,54 @@
+import io
+
+import pytest
+
+from grin_wsgi.framework import exceptions as framework_exceptions
+from grin_wsgi.framework.multipart import MultipartParser, UploadedFile, \
+    header_params
+
+BODY = (
+    b'preamble\r\n'
+    b'--xYz\r\n'
+    b'Content-Disposition: form-data; name="title"\r\n\r\n'
+    b'Hello,\r\nworld\r\n'
+    b'--xYz\r\n'
+    b'Content-Disposition: form-data; name="upload"; filename="a b.txt"\r\n'
+    b'Content-Type: text/plain\r\n\r\n'
+    + b'0123456789' * 100 + b'\r\n--xY\r\n'
+    b'\r\n--xYz--\r\n'
+)
+
+
+def test_header_params():
+    assert header_params(
+        'form-data; name="upload"; filename="say \\"hi\\".txt"'
+    ) == {'name': 'upload', 'filename': 'say "hi".txt'}
+    assert header_params('multipart/form-data; boundary=xYz') == {
+        'boundary': 'xYz'
+    }
+
+
+@pytest.mark.parametrize('block_size', [1, 7, 65536])
+def test_multipart_parser_yields_fields_and_files(monkeypatch, block_size):
+    monkeypatch.setattr(MultipartParser, 'BLOCK_SIZE', block_size)
+    field, upload = MultipartParser(io.BytesIO(BODY), 'xYz')
+
+    assert field == ('title', 'Hello,\r\nworld')
+    assert isinstance(upload, UploadedFile)
+    assert (upload.name, upload.filename, upload.content_type) == \
+        ('upload', 'a b.txt', 'text/plain')
+    assert upload.read() == b'0123456789' * 100 + b'\r\n--xY\r\n'
+    assert upload.size == 1008
+
+
+@pytest.mark.parametrize('limits, error', [
+    ({'max_file_size': 1000}, framework_exceptions.RequestDataTooLarge),
+    ({'max_field_size': 5}, framework_exceptions.RequestDataTooLarge),
+    ({'max_data_size': 100}, framework_exceptions.RequestDataTooLarge),
+    ({}, framework_exceptions.MultipartError),
+])
+def test_multipart_parser_limits(limits, error):
+    body = BODY if limits else BODY[:-10]  # cut before the close delimiter
+
+    with pytest.raises(error):
+        list(MultipartParser(io.BytesIO(body), 'xYz', **limits))
@@ -0,0 +1,68 @@
+import pytest
+
+from grin_wsgi.framework.urls import Route, UrlRouter
+
+
+def view(request, *args, **kwargs):
+    return kwargs
+
+
+@pytest.fixture
+def router():
+    router = UrlRouter()
+    router.append(r'^$', lambda request: 'index')
+    router.append(r'hello/<str:name>/page<int:page>$', view)
+    router.append(r'hello/(.+)$', lambda request: 'hello')
+    router.append(r'users/<int:user_id>/', view)
+    router.append(r'(?P<year>\d{4})/(?P=year)$', view)
+    return router
+
+
+def test_dispatch_converts_typed_values(router):
+    dispatched_view, redirect = router.dispatch('hello/alex/page12')
+
+    assert not redirect
+    assert dispatched_view(None) == {'name': 'alex', 'page': 12}
+
+
+def test_dispatch_keeps_routes_order(router):
+    assert router.dispatch('')[0](None) == 'index'
+    assert router.dispatch('hello/?name=alex')[0](None) == 'hello'
+
+
+def test_dispatch_searches_patterns_anywhere_in_url(router):
+    dispatched_view, _ = router.dispatch('api/users/7/')
+
+    assert dispatched_view(None) == {'user_id': 7}
+
+
+def test_dispatch_redirects_to_url_with_trailing_slash(router):
+    assert router.dispatch('users/7') == (None, True)
+
+
+def test_dispatch_with_backreferences(router):
+    assert router.dispatch('2018/2018')[0](None) == {'year': '2018'}
+    assert router.dispatch('2018/2019') == (None, False)
+
+
+@pytest.mark.parametrize('pattern, prefix', [
+    (r'^hello/(.+)$', 'hello/'),
+    (r'^api/v1/<int:id>', 'api/v1/'),
+    (r'^files?/', 'file'),
+    (r'^$', ''),
+    (r'^a|b', None),
+    (r'hello/', None),
+])
+def test_route_literal_prefix(pattern, prefix):
+    assert Route(pattern, view).prefix == prefix
+
+
+def test_dispatch_tries_only_routes_with_url_prefix():
+    router = UrlRouter()
+    for i in range(100):
+        router.append(rf'^api/res{i}/<int:id>', view)
+    router.append(r'<int:id>$', lambda request, id: 'unanchored')
+
+    assert router._candidates('api/res42/5') == [42, 100]
+    assert router.dispatch('api/res42/5')[0](None) == {'id': 5}
+    assert router.dispatch('other/5')[0](None) == 'unanchored'
@@ -0,0 +1,195 @@
+import pytest
+
+from grin_wsgi.http import Request, Response, FileWrapper, send_all, \
+    headers as http_headers
+
+
+@pytest.mark.parametrize('version, connection, keep_alive', [
+    ('HTTP/1.1', None, True),
+    ('HTTP/1.1', 'close', False),
+    ('HTTP/1.0', None, False),
+    ('HTTP/1.0', 'Keep-Alive', True),
+])
+def test_request_keep_alive(version, connection, keep_alive):
+    headers = {'host': 'localhost:80'}
+    if connection is not None:
+        headers['connection'] = connection
+    request = Request('GET', '/', version, headers)
+
+    assert request.keep_alive is keep_alive
+
+
+@pytest.mark.parametrize('host_header, host, port', [
+    ('localhost:8051', 'localhost', '8051'),
+    ('localhost', 'localhost', '80'),
+    ('[::1]:8051', '[::1]', '8051'),
+    ('[::1]', '[::1]', '80'),
+])
+def test_request_host_and_port(host_header, host, port):
+    request = Request('GET', '/?a=1', 'HTTP/1.1', {'host': host_header})
+
+    assert (request.host, request.port) == (host, port)
+    assert request.query_string == 'a=1'
+
+
+def test_response_sets_content_length_and_connection():
+    response = Response()
+    response.status = '200 OK'
+    response.headers = [('Content-Type', 'text/plain')]
+    response.body = [b'Hello, ', b'world']
+    response.keep_alive = True
+
+    head, body = response.get_response().split(b'\r\n\r\n')
+    assert b'Content-Length: 12' in head
+    assert b'Connection: keep-alive' in head
+    assert body == b'Hello, world'
+
+
+
+def test_response_adds_server_headers_after_application_headers():
+    response = Response()
+    response.status = '404 Not Found'
+    response.headers = [('Content-Type', 'text/plain')]
+    response.server_headers = b'Server: test\r\n'
+    response.body = [b'']
+
+    assert response.get_response() == (
+        b'HTTP/1.1 404 Not Found\r\n'
+        b'Content-Type: text/plain\r\n'
+        b'Content-Length: 0\r\n'
+        b'Server: test\r\n'
+        b'Connection: close\r\n\r\n'
+    )
+
+
+def test_server_headers_are_formatted_once_per_second(monkeypatch):
+    now = [784111777.25]
+    monkeypatch.setattr(http_headers.time, 'time', lambda: now[0])
+    server_headers = http_headers.ServerHeaders('test')
+
+    block = server_headers.get()
+    assert block == (
+        b'Date: Sun, 06 Nov 1994 08:49:37 GMT\r\nServer: test\r\n'
+    )
+    now[0] += 0.5
+    assert server_headers.get() is block
+    now[0] += 0.5
+    assert server_headers.get() != block
+
+def test_response_to_head_request_has_no_body():
+    response = Response()
+    response.status = '200 OK'
+    response.headers = [('Content-Length', '5')]
+    response.body = [b'Hello']
+    response.head = True
+
+    assert response.get_response().endswith(b'Connection: close\r\n\r\n')
+
+
+class ClosingBody:
+
+    def __init__(self, chunks):
+        self.chunks = chunks
+        self.closed = False
+
+    def __iter__(self):
+        return iter(self.chunks)
+
+    def close(self):
+        self.closed = True
+
+
+def make_response(body, chunked=True):
+    response = Response()
+    response.status = '200 OK'
+    response.headers = [('Content-Type', 'application/octet-stream')]
+    response.body = body
+    response.keep_alive = True
+    response.chunked = chunked
+    return response
+
+
+def test_response_streams_iterable_with_chunked_coding():
+    body = ClosingBody([b'\xff\x00', b'', b'binary'])
+    response = make_response(body)
+
+    groups = list(response)
+    assert groups[0][0].endswith(b'Transfer-Encoding: chunked\r\n'
+                                 b'Connection: keep-alive\r\n\r\n')
+    assert groups[0][1:] == [b'2\r\n', b'\xff\x00', b'\r\n']
+    assert groups[1] == [b'6\r\n', b'binary', b'\r\n']
+    assert groups[2] == [b'0\r\n\r\n']
+    assert body.closed
+    assert response.keep_alive
+
+
+def test_response_without_length_closes_http_1_0_connection():
+    response = make_response(ClosingBody([b'a', b'b']), chunked=False)
+
+    head, body = response.get_response().split(b'\r\n\r\n')
+    assert b'Transfer-Encoding' not in head
+    assert b'Connection: close' in head
+    assert body == b'ab'
+    assert not response.keep_alive
+
+
+def test_send_all_writes_pieces_with_a_vectored_send():
+    import socket
+
+    server, client = socket.socketpair()
+    send_all(server, [b'head', b'', b'x' * 100000])
+    server.close()
+
+    data = b''
+    while True:
+        chunk = client.recv(65536)
+        if not chunk:
+            break
+        data += chunk
+    assert data == b'head' + b'x' * 100000
+
+
+@pytest.mark.parametrize('sendfile', [True, False])
+def test_file_wrapper_sends_part_of_a_file(tmpdir, sendfile):
+    import socket
+
+    path = tmpdir.join('data.bin')
+    path.write_binary(bytes(range(256)) * 100)
+    wrapper = FileWrapper(open(path.strpath, 'rb'), offset=10, length=1000)
+    wrapper._sendfile = sendfile
+
+    response = make_response(wrapper)
+    server, client = socket.socketpair()
+    response.send(server)
+    server.close()
+
+    data = b''
+    while True:
+        chunk = client.recv(65536)
+        if not chunk:
+            break
+        data += chunk
+    head, body = data.split(b'\r\n\r\n', 1)
+    assert b'Content-Length: 1000' in head
+    assert body == (bytes(range(256)) * 100)[10:1010]
+    assert wrapper.filelike.closed
+
+
+def test_file_wrapper_iterates_file_like_objects():
+    import io
+
+    wrapper = FileWrapper(io.BytesIO(b'x' * 20000), blksize=8192)
+    assert wrapper.fileno() is None
+    assert [len(chunk) for chunk in wrapper] == [8192, 8192, 3616]
+
+
+def test_status_line_keeps_the_phrase_of_the_status():
+    line = http_headers.status_line('404 NOT FOUND')
+    assert line == b'HTTP/1.1 404 NOT FOUND\r\n'
+    assert http_headers.status_line('404 NOT FOUND') is line  # cached
+    assert http_headers.status_line('500 SERVER Error') == (
+        b'HTTP/1.1 500 SERVER Error\r\n'
+    )
+    assert http_headers.status_line('404 Not Found') is (
+        http_headers.STATUS_LINES['404 Not Found']
+    )
@@ -0,0 +1,130 @@
+import io
+
+import pytest
+
+from grin_wsgi.http import exceptions as http_exceptions
+from grin_wsgi.http.parser import RequestParser
+
+
+def feed_bytewise(parser, data):
+    requests = []
+    for i in range(len(data)):
+        parser.feed(data[i:i + 1])
+        request = parser.next_request()
+        if request is not None:
+            requests.append(request)
+    return requests
+
+
+def test_parser_waits_for_a_complete_request():
+    parser = RequestParser()
+    request = (
+        b'POST /hello/?a=b HTTP/1.1\r\nHost: localhost:80\r\n'
+        b'Content-Length: 3\r\n\r\nabc'
+    )
+    parser.feed(request[:-1])
+    assert parser.next_request() is None
+
+    parser.feed(request[-1:])
+    request = parser.next_request()
+    assert request.method == 'POST'
+    assert request.uri == '/hello/?a=b'
+    assert request.query_string == 'a=b'
+    assert request.content_length == '3'
+    assert request.body.read() == b'abc'
+
+
+def test_parser_reads_large_body_and_pipelined_requests():
+    parser = RequestParser()
+    body = b'x' * 100000
+    parser.feed(
+        b'PUT / HTTP/1.1\r\nContent-Length: 100000\r\n\r\n' + body +
+        b'GET /next HTTP/1.1\r\nHost: localhost\r\n\r\n'
+    )
+
+    assert parser.next_request().body.read() == body
+    assert parser.next_request().uri == '/next'
+    assert parser.next_request() is None
+
+
+def test_parser_decodes_chunked_body():
+    parser = RequestParser()
+    requests = feed_bytewise(
+        parser,
+        b'POST / HTTP/1.1\r\nTransfer-Encoding: chunked\r\n\r\n'
+        b'5;ext=1\r\nHello\r\n7\r\n, world\r\n0\r\nX-Trailer: 1\r\n\r\n'
+    )
+
+    assert len(requests) == 1
+    assert requests[0].body.read() == b'Hello, world'
+    assert requests[0].content_length == '12'
+    assert 'transfer-encoding' not in requests[0].headers
+
+
+
+def test_parser_spools_large_body_to_a_file():
+    parser = RequestParser(body_spool_size=10)
+    parser.feed(b'PUT / HTTP/1.1\r\nContent-Length: 20\r\n\r\n')
+    parser.feed(b'x' * 8)
+    assert parser.next_request() is None
+    parser.feed(b'y' * 12)
+
+    body = parser.next_request().body
+    assert not isinstance(body, io.BytesIO)
+    assert body.read() == b'x' * 8 + b'y' * 12
+
+
+@pytest.mark.parametrize('head, body', [
+    (b'Content-Length: 12\r\n\r\n', b'Hello, world'),
+    (b'Transfer-Encoding: chunked\r\n\r\n',
+     b'5\r\nHello\r\n7\r\n, world\r\n0\r\n\r\n'),
+])
+def test_parser_reads_body_lazily_and_skips_unread_rest(head, body):
+    parser = RequestParser()
+    data = [body[i:i + 4] for i in range(0, len(body), 4)]
+    data.append(b'GET /next HTTP/1.1\r\n\r\n')
+    receive = lambda: data.pop(0)
+    parser.feed(b'POST / HTTP/1.1\r\n' + head)
+
+    request = parser.next_request(receive)
+    assert request.body.read(5) == b'Hello'
+    assert len(data) > 1  # the rest of the body is not received yet
+
+    assert parser.next_request(receive) is None  # the rest is skipped
+    parser.feed(receive())
+    assert parser.next_request(receive).uri == '/next'
+
+
+def test_parser_lazy_body_fails_if_connection_is_closed():
+    parser = RequestParser()
+    parser.feed(b'POST / HTTP/1.1\r\nContent-Length: 12\r\n\r\nHello')
+    request = parser.next_request(lambda: b'')
+
+    with pytest.raises(http_exceptions.BadRequest):
+        request.body.read()
+
+def test_parser_joins_repeated_headers():
+    parser = RequestParser()
+    parser.feed(b'GET / HTTP/1.1\r\nAccept: a\r\nAccept: b\r\n\r\n')
+
+    assert parser.next_request().headers['accept'] == 'a, b'
+
+
+@pytest.mark.parametrize('data, error', [
+    (b'GET /\r\n\r\n', http_exceptions.BadRequest),
+    (b'GET / HTTP/1.1\r\nHost localhost\r\n\r\n', http_exceptions.BadRequest),
+    (b'GET / HTTP/1.1\r\nContent-Length: -1\r\n\r\n',
+     http_exceptions.BadRequest),
+    (b'GET / HTTP/1.1\r\nTransfer-Encoding: gzip\r\n\r\n',
+     http_exceptions.TransferEncodingNotImplemented),
+    (b'GET / HTTP/1.1\r\nX-Long: ' + b'x' * 200,
+     http_exceptions.RequestHeaderFieldsTooLarge),
+    (b'POST / HTTP/1.1\r\nContent-Length: 101\r\n\r\n',
+     http_exceptions.PayloadTooLarge),
+])
+def test_parser_rejects_bad_requests(data, error):
+    parser = RequestParser(max_header_size=128, max_body_size=100)
+    parser.feed(data)
+
+    with pytest.raises(error):
+        parser.next_request()
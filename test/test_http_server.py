@@ -0,0 +1,526 @@
+import contextlib
+import os
+import select
+import signal
+import socket
+import threading
+import time
+
+import pytest
+
+from grin_wsgi.http import server as http_server
+
+
+def test_threaded_server_answers_503_when_queue_is_full():
+    server = http_server.ThreadedHTTPServer(
+        '127.0.0.1', 0, threads=1, queue_size=1, reverse_lookup=False
+    )
+    waiting, _ = socket.socketpair()
+    server._connections.put_nowait((waiting, None))
+    server._serversock.listen()
+
+    with socket.create_connection(
+        ('127.0.0.1', int(server.server_port))
+    ) as client:
+        client.settimeout(5)
+        server._accept(None)
+        response = b''.join(iter(lambda: client.recv(1024), b''))
+    assert response.startswith(b'HTTP/1.1 503 Service Unavailable\r\n')
+    assert server._connections.qsize() == 1
+
+
+def test_full_prefork_worker_leaves_connections_to_the_others():
+    server = http_server.PreforkHTTPServer(
+        '127.0.0.1', 0, workers=1, threads=1, queue_size=1,
+        reverse_lookup=False
+    )
+    waiting, _ = socket.socketpair()
+    server._connections.put_nowait((waiting, None))
+    server._serversock.listen()
+
+    with socket.create_connection(
+        ('127.0.0.1', int(server.server_port))
+    ) as client:
+        server._accept(None)
+        assert server._connections.qsize() == 1
+        client.settimeout(0.1)
+        with pytest.raises(socket.timeout):
+            client.recv(1024)  # not answered with 503
+        server._serversock.settimeout(1)
+        accepted, _ = server._serversock.accept()  # still in the backlog
+        accepted.close()
+
+
+def test_server_name_is_resolved_once_on_bind(monkeypatch):
+    lookups = []
+    monkeypatch.setattr(
+        http_server.socket, 'getfqdn',
+        lambda host: lookups.append(host) or 'server.example.com'
+    )
+    server = http_server.SimpleHTTPServer('127.0.0.1', 0)
+    assert server.server_name == 'server.example.com'
+    assert server.server_port != '0'
+    assert lookups == ['127.0.0.1']
+
+    server = http_server.SimpleHTTPServer(
+        '127.0.0.1', 0, reverse_lookup=False
+    )
+    assert server.server_name == '127.0.0.1'
+    assert len(lookups) == 1
+
+
+def test_threaded_server_reloads_handler_and_stops(monkeypatch):
+    monkeypatch.setattr(http_server.SimpleHTTPServer, 'POLL_INTERVAL', 0.05)
+    server = http_server.ThreadedHTTPServer(
+        '127.0.0.1', 0, threads=2, reverse_lookup=False
+    )
+
+    def make_handler(body):
+        def handler(request, keep_alive=False):
+            response = http_server.Response()
+            response.status = '200 OK'
+            response.body = [body]
+            return response
+        return handler
+
+    def connect():
+        for _ in range(100):  # until the server thread listens
+            try:
+                return socket.create_connection(
+                    ('127.0.0.1', int(server.server_port))
+                )
+            except ConnectionRefusedError:
+                http_server.time.sleep(0.01)
+
+    def get():
+        with connect() as client:
+            client.sendall(b'GET / HTTP/1.0\r\n\r\n')
+            return b''.join(iter(lambda: client.recv(1024), b''))
+
+    server.reload_handler = lambda: make_handler(b'new')
+    thread = http_server.threading.Thread(
+        target=server.process_request, args=(make_handler(b'old'),)
+    )
+    thread.start()
+    try:
+        assert get().endswith(b'old')
+        server.reload()
+        http_server.time.sleep(0.2)
+        assert get().endswith(b'new')
+    finally:
+        server.stop()
+        thread.join(5)
+    assert not thread.is_alive()
+    assert all(not worker.is_alive() for worker in server._threads)
+
+
+def test_server_answers_408_to_a_slow_request_head():
+    server = http_server.SimpleHTTPServer(
+        '127.0.0.1', 0, header_timeout=0.1, reverse_lookup=False
+    )
+    sock, client = socket.socketpair()
+    client.sendall(b'GET / HTTP/1.1\r\nHost: ')
+
+    assert not server._handle(sock, None)
+    response = client.recv(1024)
+    assert response.startswith(b'HTTP/1.1 408 Request Timeout\r\n')
+    assert client.recv(1024) == b''
+
+
+def test_eventloop_server_expires_slow_and_idle_connections():
+    server = http_server.EventLoopHTTPServer(
+        '127.0.0.1', 0, header_timeout=0.1, keepalive_timeout=0.1,
+        reverse_lookup=False
+    )
+    slow, slow_client = socket.socketpair()
+    idle, idle_client = socket.socketpair()
+    for sock in (slow, idle):
+        sock.setblocking(False)
+        connection = http_server._Connection(sock, server._make_parser())
+        server._selector.register(
+            sock, http_server.selectors.EVENT_READ, connection
+        )
+        server._await_request(connection)
+    slow_client.sendall(b'GET / HTTP/1.1\r\n')
+    server._on_read(server._selector.get_key(slow).data, None)
+    idle_connection = server._selector.get_key(idle).data
+    idle_connection.served = 1
+    server._await_request(idle_connection)
+    assert 0 <= server._select_timeout() <= 0.1
+
+    http_server.time.sleep(0.15)
+    for connection in server._timers.expired(http_server.time.monotonic()):
+        server._expire(connection)
+    assert slow_client.recv(1024).startswith(
+        b'HTTP/1.1 408 Request Timeout\r\n'
+    )
+    assert idle_client.recv(1024) == b''
+    assert not server._connections()
+
+
+def form_project():
+    from grin_wsgi.framework.app import Project
+    from grin_wsgi.framework.http import HttpResponse
+
+    project = Project()
+    app = project.register_app('app')
+
+    @app.route(r'^form$')
+    def form(request):
+        return HttpResponse(str(dict(request.data)))
+
+    return project
+
+
+def test_server_answers_a_body_error_once_with_its_status():
+    from grin_wsgi.wsgi import WSGIRequestHandler
+
+    server = http_server.SimpleHTTPServer(
+        '127.0.0.1', 0, max_body_size=10, reverse_lookup=False
+    )
+    sock, client = socket.socketpair()
+    client.sendall(
+        b'POST /form HTTP/1.1\r\nHost: x\r\n'
+        b'Content-Type: application/x-www-form-urlencoded\r\n'
+        b'Transfer-Encoding: chunked\r\n\r\n14\r\na=aaaaaaaaaaaaaaaaaa\r\n'
+        b'0\r\n\r\n'
+    )
+
+    assert not server._handle(sock, WSGIRequestHandler(form_project()))
+    response = b''.join(iter(lambda: client.recv(1024), b''))
+    assert response.startswith(b'HTTP/1.1 413 Payload Too Large\r\n')
+    assert response.count(b'HTTP/1.1') == 1
+
+
+def test_server_answers_408_once_to_a_stalled_body():
+    from grin_wsgi.wsgi import WSGIRequestHandler
+
+    server = http_server.SimpleHTTPServer(
+        '127.0.0.1', 0, body_timeout=0.1, reverse_lookup=False
+    )
+    sock, client = socket.socketpair()
+    client.sendall(
+        b'POST /form HTTP/1.1\r\nHost: x\r\n'
+        b'Content-Type: application/x-www-form-urlencoded\r\n'
+        b'Content-Length: 10\r\n\r\na=1'
+    )
+
+    assert not server._handle(sock, WSGIRequestHandler(form_project()))
+    response = b''.join(iter(lambda: client.recv(1024), b''))
+    assert response.startswith(b'HTTP/1.1 408 Request Timeout\r\n')
+    assert response.count(b'HTTP/1.1') == 1
+
+
+def serve_forked(server, request_handler):
+    """ Run a server in a child process, it is stopped with SIGTERM. """
+    pid = os.fork()
+    if not pid:
+        try:
+            signal.signal(signal.SIGHUP, lambda *args: server.reload())
+            server.process_request(request_handler)
+        finally:
+            os._exit(0)
+    return pid
+
+
+def connect(server):
+    for _ in range(200):  # until the server listens
+        try:
+            return socket.create_connection(
+                ('127.0.0.1', int(server.server_port))
+            )
+        except ConnectionRefusedError:
+            time.sleep(0.01)
+    raise ConnectionRefusedError(server.server_port)
+
+
+def get(server, path='/'):
+    with connect(server) as client:
+        client.sendall(f'GET {path} HTTP/1.0\r\n\r\n'.encode())
+        return b''.join(iter(lambda: client.recv(1024), b''))
+
+
+def test_async_views_overlap_inside_a_prefork_worker():
+    import asyncio
+
+    from grin_wsgi.framework.app import Project
+    from grin_wsgi.framework.http import HttpResponse
+    from grin_wsgi.wsgi import WSGIRequestHandler
+    from grin_wsgi.wsgi.async_runner import AsyncRunner
+
+    project = Project()
+    app = project.register_app('app')
+
+    @app.route(r'^slow$')
+    async def slow(request):
+        await asyncio.sleep(0.3)
+        return HttpResponse('slept')
+
+    server = http_server.PreforkHTTPServer(
+        '127.0.0.1', 0, workers=1, threads=4, reverse_lookup=False
+    )
+    pid = serve_forked(server, WSGIRequestHandler(
+        project, async_runner=AsyncRunner()
+    ))
+    try:
+        get(server, '/slow')  # the worker has started
+        responses = []
+        clients = [
+            threading.Thread(
+                target=lambda: responses.append(get(server, '/slow'))
+            ) for _ in range(3)
+        ]
+        started = time.monotonic()
+        for client in clients:
+            client.start()
+        for client in clients:
+            client.join(5)
+        assert time.monotonic() - started < 0.6
+        assert [response.endswith(b'slept') for response in responses] == \
+            [True] * 3
+    finally:
+        os.kill(pid, signal.SIGTERM)
+        os.waitpid(pid, 0)
+
+
+def test_simple_server_closes_an_idle_connection_for_a_waiting_one():
+    server = http_server.SimpleHTTPServer(
+        '127.0.0.1', 0, keepalive_timeout=5, reverse_lookup=False
+    )
+
+    def handler(request, keep_alive=False):
+        response = http_server.Response()
+        response.status = '200 OK'
+        response.body = [b'served']
+        response.keep_alive = keep_alive and request.keep_alive
+        return response
+
+    thread = threading.Thread(target=server.process_request, args=(handler,))
+    thread.start()
+    try:
+        for _ in range(200):  # until the server listens
+            try:
+                idle = socket.create_connection(
+                    ('127.0.0.1', int(server.server_port))
+                )
+                break
+            except ConnectionRefusedError:
+                time.sleep(0.01)
+        with idle:
+            idle.sendall(b'GET / HTTP/1.1\r\nHost: x\r\n\r\n')
+            assert idle.recv(1024).endswith(b'served')
+            started = time.monotonic()
+            assert get(server).endswith(b'served')
+            assert time.monotonic() - started < 1
+            assert idle.recv(1024) == b''  # closed for the waiting client
+    finally:
+        server.stop()
+        thread.join(5)
+
+
+def test_eventloop_server_closes_a_response_of_a_gone_client():
+    server = http_server.EventLoopHTTPServer(
+        '127.0.0.1', 0, reverse_lookup=False
+    )
+    sock, client = socket.socketpair()
+    connection = http_server._Connection(sock, server._make_parser())
+    sock.close()
+    closed = []
+
+    class Body(list):
+        def close(self):
+            closed.append('body')
+
+    response = http_server.Response()
+    response.body = Body([b'lost'])
+    response.on_close = lambda response, sent: closed.append(sent)
+    server._respond(connection, response, None)
+    assert closed == ['body', 0]
+
+
+def test_prefork_server_respawns_and_rolls_its_workers():
+    def handler(request, keep_alive=False):
+        response = http_server.Response()
+        response.status = '200 OK'
+        response.body = [str(os.getpid()).encode()]
+        return response
+
+    def worker_pid(other_than=None):
+        for _ in range(100):  # until a new worker serves
+            pid = int(get(server).rpartition(b'\n')[2])
+            if pid != other_than:
+                return pid
+            time.sleep(0.05)
+
+    server = http_server.PreforkHTTPServer(
+        '127.0.0.1', 0, workers=1, threads=1, reverse_lookup=False
+    )
+    pid = serve_forked(server, handler)
+    try:
+        worker = worker_pid(other_than=pid)
+        os.kill(worker, signal.SIGKILL)
+        respawned = worker_pid(other_than=worker)
+        assert respawned not in (pid, worker)
+
+        os.kill(pid, signal.SIGHUP)
+        rolled = worker_pid(other_than=respawned)
+        assert rolled not in (pid, worker, respawned)
+    finally:
+        os.kill(pid, signal.SIGTERM)
+        _, status = os.waitpid(pid, 0)
+    assert status == 0
+
+
+def echo_uri(request, keep_alive=False):
+    response = http_server.Response()
+    response.status = '200 OK'
+    response.headers = [('Content-Length', str(len(request.uri)))]
+    response.body = [request.uri.encode()]
+    response.keep_alive = keep_alive and request.keep_alive
+    return response
+
+
+@contextlib.contextmanager
+def serve_in_thread(server, handler):
+    thread = threading.Thread(target=server.process_request, args=(handler,))
+    thread.start()
+    try:
+        yield server
+    finally:
+        server.stop()
+        thread.join(5)
+    assert not thread.is_alive()
+
+
+@pytest.mark.parametrize('executor_threads', [0, 2])
+def test_eventloop_server_serves_pipelined_requests(executor_threads):
+    server = http_server.EventLoopHTTPServer(
+        '127.0.0.1', 0, executor_threads=executor_threads,
+        reverse_lookup=False
+    )
+    with serve_in_thread(server, echo_uri):
+        assert get(server, '/single').endswith(b'\r\n\r\n/single')
+        with socket.create_connection(
+            ('127.0.0.1', int(server.server_port))
+        ) as client:
+            client.sendall(
+                b'GET /first HTTP/1.1\r\nHost: x\r\n\r\n'
+                b'GET /second HTTP/1.1\r\nHost: x\r\nConnection: close\r\n\r\n'
+            )
+            responses = b''.join(iter(lambda: client.recv(1024), b''))
+        first, second = responses.split(b'HTTP/1.1 200 OK')[1:]
+        assert first.endswith(b'\r\n\r\n/first')
+        assert second.endswith(b'\r\n\r\n/second')
+
+
+def test_eventloop_server_serves_a_long_pipeline():
+    server = http_server.EventLoopHTTPServer(
+        '127.0.0.1', 0, max_requests=0, reverse_lookup=False
+    )
+    with serve_in_thread(server, echo_uri):
+        with connect(server) as client:
+            client.settimeout(10)
+            client.sendall(
+                b'GET /next HTTP/1.1\r\nHost: x\r\n\r\n' * 1500
+                + b'GET /last HTTP/1.1\r\nHost: x\r\nConnection: close\r\n\r\n'
+            )
+            responses = b''.join(iter(lambda: client.recv(65536), b''))
+        assert responses.count(b'HTTP/1.1 200 OK\r\n') == 1501
+        assert responses.endswith(b'\r\n\r\n/last')
+
+
+def test_eventloop_server_answers_a_client_gone_quiet():
+    released = threading.Event()
+
+    def handler(request, keep_alive=False):
+        released.wait(5)
+        return echo_uri(request, keep_alive)
+
+    server = http_server.EventLoopHTTPServer(
+        '127.0.0.1', 0, executor_threads=1, reverse_lookup=False
+    )
+    with serve_in_thread(server, handler):
+        with connect(server) as client:
+            client.sendall(
+                b'GET /first HTTP/1.1\r\nHost: x\r\n\r\n'
+                b'GET /second HTTP/1.1\r\nHost: x\r\n\r\n'
+            )
+            client.shutdown(socket.SHUT_WR)
+            time.sleep(0.1)  # the server reads the end of the stream
+            released.set()
+            client.settimeout(5)
+            responses = b''.join(iter(lambda: client.recv(1024), b''))
+    assert responses.count(b'HTTP/1.1 200 OK\r\n') == 2
+    assert responses.endswith(b'\r\n\r\n/second')
+
+
+def test_eventloop_server_does_not_read_a_busy_connection():
+    released = threading.Event()
+
+    def handler(request, keep_alive=False):
+        released.wait(5)
+        return echo_uri(request, keep_alive)
+
+    server = http_server.EventLoopHTTPServer(
+        '127.0.0.1', 0, executor_threads=1, reverse_lookup=False
+    )
+    with serve_in_thread(server, handler):
+        with connect(server) as client:
+            client.sendall(b'GET /busy HTTP/1.1\r\nHost: x\r\n\r\n')
+            client.setblocking(False)
+            sent = 0
+            # Until the socket buffers are full and the server reads none
+            while sent < 64 * 1024 * 1024:
+                if not select.select([], [client], [], 0.2)[1]:
+                    break
+                sent += client.send(b'x' * 65536)
+            released.set()
+            assert sent < 64 * 1024 * 1024
+            client.settimeout(5)
+            assert client.recv(1024).startswith(b'HTTP/1.1 200 OK\r\n')
+
+
+def test_eventloop_server_answers_a_pending_view_of_a_client_gone_quiet():
+    import asyncio
+
+    from grin_wsgi.framework.app import Project
+    from grin_wsgi.framework.http import HttpResponse
+    from grin_wsgi.wsgi import WSGIRequestHandler
+    from grin_wsgi.wsgi.async_runner import AsyncRunner
+
+    project = Project()
+    app = project.register_app('app')
+
+    @app.route(r'^slow$')
+    async def slow(request):
+        await asyncio.sleep(0.2)
+        return HttpResponse('slept')
+
+    server = http_server.EventLoopHTTPServer(
+        '127.0.0.1', 0, reverse_lookup=False
+    )
+    handler = WSGIRequestHandler(project, async_runner=AsyncRunner())
+    with serve_in_thread(server, handler):
+        with connect(server) as client:
+            client.sendall(b'GET /slow HTTP/1.1\r\nHost: x\r\n\r\n')
+            client.shutdown(socket.SHUT_WR)
+            client.settimeout(5)
+            response = b''.join(iter(lambda: client.recv(1024), b''))
+    assert response.startswith(b'HTTP/1.1 200 OK\r\n')
+    assert response.endswith(b'slept')
+
+
+@pytest.mark.skipif(
+    not hasattr(socket, 'SO_REUSEPORT'), reason='requires SO_REUSEPORT'
+)
+def test_prefork_workers_reuse_the_resolved_port():
+    server = http_server.PreforkHTTPServer(
+        '127.0.0.1', 0, workers=2, threads=1, reuse_port=True,
+        reverse_lookup=False
+    )
+    pid = serve_forked(server, echo_uri)
+    try:
+        assert get(server, '/reused').endswith(b'/reused')
+    finally:
+        os.kill(pid, signal.SIGTERM)
+        os.waitpid(pid, 0)
@@ -0,0 +1,33 @@
+from grin_wsgi.http.timers import TimerHeap
+
+
+class Item:
+    deadline = timer = None
+
+
+def test_timer_heap_pops_expired_deadlines_in_order():
+    timers = TimerHeap()
+    first, second, cancelled = Item(), Item(), Item()
+    timers.set(second, 2.0)
+    timers.set(first, 1.0)
+    timers.set(cancelled, 0.5)
+    timers.set(cancelled, None)
+    assert timers.next_deadline() == 0.5
+
+    assert timers.expired(0.9) == []
+    assert timers.expired(2.0) == [first, second]
+    assert first.deadline is None and len(timers) == 0
+
+
+def test_timer_heap_moves_later_deadlines_lazily():
+    timers = TimerHeap()
+    item = Item()
+    timers.set(item, 1.0)
+    timers.set(item, 3.0)  # only the attribute changes
+    assert len(timers) == 1
+
+    assert timers.expired(2.0) == []
+    assert timers.next_deadline() == 3.0
+    timers.set(item, 0.5)  # an earlier deadline is pushed
+    assert timers.expired(1.0) == [item]
+    assert timers.expired(3.0) == []
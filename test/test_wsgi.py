@@ -0,0 +1,74 @@
+from grin_wsgi import wsgi
+
+
+def test_host_name_cache_looks_up_a_host_once_per_ttl(monkeypatch):
+    lookups = []
+    monkeypatch.setattr(
+        wsgi.socket, 'getfqdn', lambda host: lookups.append(host) or host
+    )
+    now = [100.0]
+    monkeypatch.setattr(wsgi.time, 'monotonic', lambda: now[0])
+
+    host_names = wsgi.HostNameCache(ttl=10)
+    host_names.get('example.com')
+    host_names.get('example.com')
+    assert lookups == ['example.com']
+
+    now[0] += 10
+    host_names.get('example.com')
+    assert lookups == ['example.com', 'example.com']
+
+
+def test_request_handler_creates_a_response_per_request():
+    def application(environ, start_response):
+        start_response('200 OK', [('X-Path', environ['PATH_INFO'])])
+        return [b'']
+
+    handler = wsgi.WSGIRequestHandler(application)
+    first = handler(wsgi.Request('GET', '/first', 'HTTP/1.1', {}))
+    second = handler(wsgi.Request('GET', '/second', 'HTTP/1.1', {}))
+
+    assert first is not second
+    assert first.headers == [('X-Path', '/first')]
+    assert second.headers == [('X-Path', '/second')]
+
+
+def test_async_runner_limits_coroutines_run_at_once():
+    import asyncio
+
+    from grin_wsgi.wsgi.async_runner import AsyncRunner
+
+    running = []
+
+    async def view(result):
+        running.append(result)
+        await asyncio.sleep(0.01)
+        assert len(running) <= 2
+        running.remove(result)
+        return result
+
+    runner = AsyncRunner(concurrency=2)
+    futures = [runner.submit(view(i)) for i in range(5)]
+    assert [future.result(5) for future in futures] == list(range(5))
+    assert runner.run(view('last')) == 'last'
+
+
+def test_path_info_does_not_hold_the_query_string():
+    from grin_wsgi.framework.app import Project
+    from grin_wsgi.framework.http import HttpResponse
+
+    project = Project()
+    app = project.register_app('app')
+
+    @app.route(r'^echo/<str:name>$')
+    def echo(request, name):
+        return HttpResponse(f'{name} {request.args.get("q")}')
+
+    handler = wsgi.WSGIRequestHandler(project)
+    for query in ('1', '2'):
+        response = handler(wsgi.Request(
+            'GET', f'/echo/gr%69n?q={query}', 'HTTP/1.1', {}
+        ))
+        assert response.get_response().endswith(f'grin {query}'.encode())
+        assert response.status.startswith('200')
+    assert len(project.route_cache) == 1
@@ -0,0 +1,62 @@
+from grin_wsgi import wsgi
+from grin_wsgi.wsgi.access_log import AccessLog
+
+
+def application(environ, start_response):
+    status = '500 Internal Server Error' \
+        if environ['PATH_INFO'] == '/error' else '200 OK'
+    start_response(status, [('Content-Type', 'text/plain')])
+    return [b'logged']
+
+
+def test_access_log_writes_queued_records_on_flush(tmpdir):
+    log_file = tmpdir.join('access.log')
+    access_log = AccessLog(log_file.strpath)
+    handler = wsgi.WSGIRequestHandler(application, access_log=access_log)
+    handler(wsgi.Request('GET', '/hello?a=1', 'HTTP/1.1', {})).get_response()
+    assert log_file.read() == ''
+
+    access_log.flush()
+    line, = log_file.readlines()
+    request, status, sent, duration = line.rsplit(' ', 3)
+    assert request.endswith('Z "GET /hello?a=1 HTTP/1.1"')
+    assert status == '200'
+    assert int(sent) > 0 and float(duration) > 0
+
+
+def test_access_log_samples_all_but_server_errors(tmpdir):
+    log_file = tmpdir.join('access.log')
+    access_log = AccessLog(log_file.strpath, sample_rate=0.0,
+                           background=False)
+    handler = wsgi.WSGIRequestHandler(application, access_log=access_log)
+    handler(wsgi.Request('GET', '/hello', 'HTTP/1.1', {})).get_response()
+    handler(wsgi.Request('GET', '/error', 'HTTP/1.1', {})).get_response()
+
+    line, = log_file.readlines()
+    assert '"GET /error HTTP/1.1" 500 ' in line
+
+
+def test_access_log_dumps_the_last_requests(tmpdir):
+    log_file = tmpdir.join('access.log')
+    access_log = AccessLog(log_file.strpath, sample_rate=0.0, dumps=1)
+    handler = wsgi.WSGIRequestHandler(application, access_log=access_log)
+    for path in ('/first', '/error', '/last'):
+        handler(wsgi.Request(
+            'GET', path, 'HTTP/1.1', {'host': 'example.com'}
+        )).get_response()
+
+    access_log.dump()
+    text = log_file.read()
+    assert '/first' not in text and '/error' not in text
+    assert ' GET /last HTTP/1.1\nhost: example.com\n' in text
+    assert '--- 200 OK\nContent-Type: text/plain\n\nlogged\n' in text
+
+
+def test_access_log_writes_queued_records_on_close(tmpdir):
+    log_file = tmpdir.join('access.log')
+    access_log = AccessLog(log_file.strpath)
+    handler = wsgi.WSGIRequestHandler(application, access_log=access_log)
+    handler(wsgi.Request('GET', '/hello', 'HTTP/1.1', {})).get_response()
+
+    access_log.close()
+    assert len(log_file.readlines()) == 1
@@ -0,0 +1,113 @@
+import gzip
+import zlib
+
+import pytest
+
+from grin_wsgi.wsgi.compression import CompressionMiddleware
+
+TEXT = b'Hello, world! ' * 200
+
+
+def call(middleware, accept_encoding='gzip'):
+    started = []
+    body = middleware(
+        {'REQUEST_METHOD': 'GET', 'HTTP_ACCEPT_ENCODING': accept_encoding},
+        lambda status, headers, exc_info=None: started.append(headers)
+    )
+    body = b''.join(body)
+    return dict(started[0]), body
+
+
+def make_application(headers, body):
+    def application(environ, start_response):
+        start_response('200 OK', headers)
+        return body
+    return application
+
+
+@pytest.mark.parametrize('accept_encoding, encoding', [
+    ('gzip, deflate', 'gzip'),
+    ('deflate, gzip;q=0.5', 'deflate'),
+    ('gzip;q=0, *', 'deflate'),
+    ('identity', None),
+])
+def test_compression_negotiates_accept_encoding(accept_encoding, encoding):
+    middleware = CompressionMiddleware(None)
+
+    assert middleware._negotiate(accept_encoding) == encoding
+
+
+def test_compression_compresses_list_body():
+    headers, body = call(CompressionMiddleware(make_application(
+        [('Content-Type', 'text/html'), ('Content-Length', str(len(TEXT)))],
+        [TEXT]
+    )))
+
+    assert headers['Content-Encoding'] == 'gzip'
+    assert headers['Vary'] == 'Accept-Encoding'
+    assert 'Content-Length' not in headers
+    assert gzip.decompress(body) == TEXT
+
+
+def test_compression_compresses_streamed_body():
+    def stream():
+        yield TEXT
+        yield TEXT
+
+    headers, body = call(CompressionMiddleware(make_application(
+        [('Content-Type', 'application/json')], stream()
+    )), 'deflate')
+
+    assert headers['Content-Encoding'] == 'deflate'
+    assert zlib.decompress(body) == TEXT * 2
+
+
+@pytest.mark.parametrize('headers, body', [
+    ([('Content-Type', 'text/plain')], [b'short']),
+    ([('Content-Type', 'image/png')], [TEXT]),
+    ([('Content-Type', 'text/plain'), ('Content-Encoding', 'br')], [TEXT]),
+])
+def test_compression_skips_small_or_binary_bodies(headers, body):
+    headers, sent = call(CompressionMiddleware(
+        make_application(headers, body)
+    ))
+
+    assert headers.get('Content-Encoding', 'br') == 'br'
+    assert sent == body[0]
+
+
+def test_compression_caches_compressed_body_by_etag():
+    middleware = CompressionMiddleware(make_application(
+        [('Content-Type', 'text/css'), ('ETag', '"v1"')], [TEXT]
+    ))
+    compressor = middleware._compressor
+    compressed = []
+
+    def counting_compressor(encoding):
+        compressed.append(encoding)
+        return compressor(encoding)
+    middleware._compressor = counting_compressor
+
+    for _ in range(3):
+        headers, body = call(middleware)
+
+    assert headers['ETag'] == '"v1-gzip"'
+    assert gzip.decompress(body) == TEXT
+    assert compressed == ['gzip']
+
+
+def test_compression_keeps_the_etag_of_a_compressed_representation():
+    def application(environ, start_response):
+        start_response('304 NOT MODIFIED', [('ETag', '"v1"')])
+        return [b'']
+
+    started = []
+    body = CompressionMiddleware(application)(
+        {'REQUEST_METHOD': 'GET', 'HTTP_ACCEPT_ENCODING': 'gzip',
+         'HTTP_IF_NONE_MATCH': '"v1-gzip"'},
+        lambda status, headers, exc_info=None: started.append(headers)
+    )
+    assert b''.join(body) == b''
+    assert dict(started[0]) == {
+        'ETag': '"v1-gzip"', 'Vary': 'Accept-Encoding'
+    }
@@ -32,3 +32,20 @@ port={port}
     gwsgi_conf = config._parse_ini(ini.strpath)
     assert gwsgi_conf[2] == gwsgi_const.HOST
     assert gwsgi_conf[3] == port
+
+def test_parse_ini_reads_prefork_workers(tmpdir, config):
+    ini = tmpdir.join('conf.ini')
+    ini.write(
+"""
+[gwsgi]
+workers=4
+reuse_port=true
+""")
+
+    gwsgi_conf = dict(zip(
+        (name for name, _, _ in config.OPTIONS),
+        config._parse_ini(ini.strpath)
+    ))
+    assert gwsgi_conf['workers'] == 4
+    assert gwsgi_conf['reuse_port'] is True
+    assert gwsgi_conf['processing'] == gwsgi_const.PROCESSING
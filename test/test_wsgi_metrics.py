@@ -0,0 +1,83 @@
+import json
+import os
+import threading
+
+from grin_wsgi import wsgi
+from grin_wsgi.framework.app import Project
+from grin_wsgi.framework.http import HttpResponse
+from grin_wsgi.wsgi.metrics import Metrics
+
+
+def test_metrics_sum_up_counters_of_every_thread():
+    metrics = Metrics()
+    metrics.started()
+    metrics.finished('200', 'hello', 10, 100, 0.003)
+
+    def serve():
+        metrics.started()
+        metrics.finished('404', 'not_found', 0, 50, 0.2)
+    thread = threading.Thread(target=serve)
+    thread.start()
+    thread.join()
+
+    text = metrics.exposition().decode('utf-8')
+    assert 'grin_requests_total{status="200"} 1\n' in text
+    assert 'grin_requests_total{status="404"} 1\n' in text
+    assert 'grin_requests_in_flight 0\n' in text
+    assert 'grin_request_bytes_total 10\n' in text
+    assert 'grin_response_bytes_total 150\n' in text
+    assert 'grin_request_duration_seconds_bucket' \
+        '{route="hello",le="0.005"} 1\n' in text
+    assert 'grin_request_duration_seconds_bucket' \
+        '{route="not_found",le="0.1"} 0\n' in text
+    assert 'grin_request_duration_seconds_bucket' \
+        '{route="not_found",le="+Inf"} 1\n' in text
+    assert 'grin_request_duration_seconds_count{route="hello"} 1\n' in text
+
+
+def test_metrics_archive_counters_of_exited_processes(tmpdir):
+    metrics = Metrics(tmpdir.strpath, dump_interval=0)
+    metrics.started()
+    metrics.finished('200', 'hello', 0, 100, 0.01)
+    assert os.path.exists(metrics._file)
+
+    exited = Metrics()
+    exited.started()
+    exited.started()
+    exited.finished('500', 'hello', 0, 10, 0.01)
+    exited_file = tmpdir.join('999999999-abcdef12.json')
+    exited_file.write(json.dumps(exited.snapshot()))
+
+    for _ in range(2):  # the second time from the archive
+        snapshot = metrics.collect()
+        assert snapshot['requests'] == {'200': 1, '500': 1}
+        assert snapshot['in_flight'] == 0
+        assert snapshot['bytes_out'] == 110
+        assert snapshot['durations']['hello'][-1] == 0.02
+        assert not exited_file.exists()
+
+
+def test_request_handler_serves_metrics_labelled_by_route():
+    project = Project()
+    app = project.register_app('metrics')
+
+    @app.route(r'^hello$')
+    def hello(request):
+        return HttpResponse('hello')
+
+    handler = wsgi.WSGIRequestHandler(
+        project, metrics=Metrics(), metrics_path='/metrics'
+    )
+    assert handler(wsgi.Request('GET', '/hello', 'HTTP/1.1', {})) \
+        .get_response().endswith(b'hello')
+    handler(wsgi.Request('GET', '/missing', 'HTTP/1.1', {})).get_response()
+
+    response = handler(wsgi.Request('GET', '/metrics', 'HTTP/1.1', {}))
+    text = response.get_response().decode('utf-8')
+    assert 'grin_requests_total{status="200"} 1\n' in text
+    assert 'grin_requests_total{status="404"} 1\n' in text
+    assert 'grin_request_duration_seconds_count' \
+        '{route="test_request_handler_serves_metrics_labelled_by_route' \
+        '.<locals>.hello"} 1\n' in text
+    assert 'grin_request_duration_seconds_count' \
+        '{route="not_found"} 1\n' in text
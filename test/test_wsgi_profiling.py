@@ -0,0 +1,74 @@
+import json
+import pstats
+
+from grin_wsgi import wsgi
+from grin_wsgi.wsgi import profiling
+
+
+def application(environ, start_response):
+    start_response('200 OK', [])
+    return [b'profiled']
+
+
+def environ(path='/hello'):
+    return {'PATH_INFO': path, 'REQUEST_METHOD': 'GET'}
+
+
+def test_profiler_dumps_sampled_requests(tmpdir):
+    profiler = profiling.Profiler(tmpdir.strpath, sample_rate=1.0)
+    env = dict(environ(), **{'grin_wsgi.route': 'hello'})
+    assert profiler.call(env, application, env, lambda *args: None) == \
+        [b'profiled']
+
+    prof, = tmpdir.listdir('*.prof')
+    assert '-hello-' in prof.basename
+    assert pstats.Stats(prof.strpath).total_calls > 0
+    metadata = json.loads(tmpdir.listdir('*.json')[0].read())
+    assert metadata['route'] == 'hello'
+    assert metadata['reason'] == 'sampled'
+
+
+def test_profiler_profiles_the_next_request_to_a_slow_path(
+    tmpdir, monkeypatch
+):
+    now = [0.0]
+    monkeypatch.setattr(profiling.time, 'perf_counter', lambda: now[0])
+
+    def slow_application(environ, start_response):
+        now[0] += 1.0
+        return []
+
+    profiler = profiling.Profiler(tmpdir.strpath, slow_threshold=0.5)
+    profiler.call(environ(), slow_application, environ(), None)
+    assert tmpdir.listdir('*.prof') == []
+
+    profiler.call(environ('/other'), slow_application, environ(), None)
+    profiler.call(environ(), slow_application, environ(), None)
+    prof, = tmpdir.listdir('*.prof')
+    assert '-hello-1000ms' in prof.basename
+    # Not profiled again before SLOW_PROFILE_INTERVAL
+    profiler.call(environ(), slow_application, environ(), None)
+    profiler.call(environ(), slow_application, environ(), None)
+    assert len(tmpdir.listdir('*.prof')) == 1
+
+
+def test_request_handler_configures_the_profiler_at_profile_path(tmpdir):
+    profiler = profiling.Profiler(tmpdir.strpath)
+    assert not profiler.enabled
+    handler = wsgi.WSGIRequestHandler(
+        application, profiler=profiler, profile_path='/_profile'
+    )
+
+    response = handler(wsgi.Request(
+        'GET', '/_profile?enable=1&sample_rate=1', 'HTTP/1.1', {}
+    ))
+    assert response.get_response().endswith(
+        b'enabled=1 sample_rate=1.0 slow_threshold=0.0\n'
+    )
+    handler(wsgi.Request('GET', '/hello', 'HTTP/1.1', {})).get_response()
+    assert len(tmpdir.listdir('*.prof')) == 1
+
+    response = handler(wsgi.Request(
+        'GET', '/_profile?sample_rate=x', 'HTTP/1.1', {}
+    ))
+    assert response.status == '400 Bad Request'